@@ -0,0 +1,138 @@
+"""
+Compare the JSON backends available to omnibot_receiver.codec, decoding
+events and encoding responses shaped like the ones omnibot sends and
+receives, and routing raw events through OmnibotRouter.handle_raw.
+
+Usage::
+
+    python benchmarks/json_backends.py
+"""
+import timeit
+
+from omnibot_receiver import codec
+from omnibot_receiver.router import OmnibotMessageRouter, OmnibotRouter
+
+
+def make_user(i):
+    return {
+        'id': 'U{:08d}'.format(i),
+        'name': 'user{}'.format(i),
+        'real_name': 'User Number {}'.format(i),
+        'tz': 'America/Los_Angeles',
+        'is_bot': False,
+        'profile': {
+            'display_name': 'user{}'.format(i),
+            'email': 'user{}@example.com'.format(i),
+            'image_48': 'https://example.com/avatars/{}_48.png'.format(i),
+            'title': 'Software Engineer',
+        },
+    }
+
+
+def make_message(mentions):
+    users = [make_user(i) for i in range(mentions)]
+    return {
+        'omnibot_payload_type': 'message',
+        'match_type': 'command',
+        'args': 'report 1234',
+        'text': '<@UBOT> report 1234 ' + ' '.join(
+            '<@{}>'.format(user['id']) for user in users
+        ),
+        'parsed_text': '@bot report 1234 ' + ' '.join(
+            '@{}'.format(user['name']) for user in users
+        ),
+        'ts': '1709149728.078244',
+        'thread_ts': None,
+        'team': {'name': 'example', 'team_id': 'T123456'},
+        'bot': {'name': 'bot', 'bot_id': 'A123456'},
+        'channel_id': 'C123456',
+        'channel': {
+            'id': 'C123456',
+            'name': 'general',
+            'is_channel': True,
+            'topic': {'value': 'General discussion', 'creator': 'U00000000'},
+            'num_members': 1500,
+        },
+        'user': 'U00000000',
+        'parsed_user': make_user(0),
+        'users': {user['id']: user for user in users},
+        'channels': {},
+        'emoji_reactions': [],
+        'directed': True,
+        'mentioned': True,
+    }
+
+
+def make_response(fields):
+    return {'actions': [{
+        'action': 'chat.postMessage',
+        'kwargs': {
+            'channel': 'C123456',
+            'thread_ts': '1709149728.078244',
+            'text': 'Report 1234',
+            'attachments': [{
+                'title': 'Report 1234',
+                'fields': [
+                    {
+                        'title': 'Field {}'.format(i),
+                        'value': 'Value of field {} ✓'.format(i),
+                        'short': True,
+                    }
+                    for i in range(fields)
+                ],
+            }],
+        },
+    }]}
+
+
+# (name, event, response)
+CORPUS = (
+    ('small', make_message(1), make_response(2)),
+    ('medium', make_message(10), make_response(20)),
+    ('large', make_message(100), make_response(200)),
+)
+
+
+def time_call(func):
+    func()
+    number, elapsed = timeit.Timer(func).autorange()
+    return elapsed / number * 1e6
+
+
+def build_router(response):
+    message_router = OmnibotMessageRouter()
+    message_router.add_message_rule(
+        'report <id>',
+        'command',
+        lambda message, id: response
+    )
+    return OmnibotRouter(message_router=message_router)
+
+
+def main():
+    row = '{:>8} {:>8} {:>10} {:>12.2f} {:>12.2f} {:>16.2f}'
+    print('{:>8} {:>8} {:>10} {:>12} {:>12} {:>16}'.format(
+        'payload', 'backend', 'bytes', 'loads (us)', 'dumps (us)',
+        'handle_raw (us)'
+    ))
+    default_backend = codec.backend
+    try:
+        for name, event, response in CORPUS:
+            router = build_router(response)
+            body = codec.get_backend('json').dumps(event)
+            for backend in codec.BACKENDS.values():
+                codec.backend = backend
+                print(row.format(
+                    name,
+                    backend.name,
+                    len(body),
+                    time_call(lambda: backend.loads(body)),
+                    time_call(lambda: backend.dumps(response)),
+                    time_call(lambda: router.handle_raw(body)),
+                ))
+    finally:
+        codec.backend = default_backend
+
+
+if __name__ == '__main__':
+    main()
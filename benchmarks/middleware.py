@@ -0,0 +1,76 @@
+"""
+Measure the cost of middleware hooks in OmnibotRouter.handle_event, from a
+router without hooks (whose routes are called directly, as the empty chain
+composes to the route function itself) to routers with a few no-op hooks of
+each kind, and routes that opt out of them.
+
+Usage::
+
+    python benchmarks/middleware.py
+"""
+import timeit
+
+from omnibot_receiver.router import OmnibotMessageRouter, OmnibotRouter
+
+EVENT = {
+    'omnibot_payload_type': 'message',
+    'match_type': 'command',
+    'args': 'ping',
+}
+
+
+def before(message):
+    pass
+
+
+def after(message, response):
+    return response
+
+
+def around(call_next, message, **kwargs):
+    return call_next(message, **kwargs)
+
+
+def build_router(hook_count, opt_out=False):
+    message_router = OmnibotMessageRouter()
+    message_router.add_message_rule(
+        'ping',
+        'command',
+        lambda message: {'actions': []},
+        middleware=not opt_out
+    )
+    for _ in range(hook_count):
+        message_router.before(before)
+        message_router.after(after)
+        message_router.around(around)
+    router = OmnibotRouter(message_router=message_router)
+    router.freeze()
+    return router
+
+
+def time_event(router):
+    router.handle_event(EVENT)
+    timer = timeit.Timer(lambda: router.handle_event(EVENT))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=5, number=number)) / number * 1e6
+
+
+def main():
+    baseline = time_event(build_router(0))
+    print('{:>32} {:>10} {:>10}'.format('chain', 'us/event', 'overhead'))
+    for name, router in (
+        ('empty', build_router(0)),
+        ('1 of each hook, route opted out', build_router(1, opt_out=True)),
+        ('1 of each hook', build_router(1)),
+        ('3 of each hook', build_router(3)),
+    ):
+        elapsed = time_event(router)
+        print('{:>32} {:>10.2f} {:>+9.1f}%'.format(
+            name,
+            elapsed,
+            (elapsed / baseline - 1) * 100,
+        ))
+
+
+if __name__ == '__main__':
+    main()
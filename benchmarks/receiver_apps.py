@@ -0,0 +1,132 @@
+"""
+Compare the per-request cost of the WSGI and ASGI apps of
+omnibot_receiver.app against the Flask glue from the OmnibotRouter docs, for
+a POST of a message event. Flask is only benchmarked if it's installed.
+
+Usage::
+
+    python benchmarks/receiver_apps.py
+"""
+import asyncio
+import io
+import json
+import timeit
+
+from omnibot_receiver.app import ASGIApp, WSGIApp
+from omnibot_receiver.router import OmnibotMessageRouter, OmnibotRouter
+
+try:
+    import flask
+except ImportError:
+    flask = None
+
+BODY = json.dumps({
+    'omnibot_payload_type': 'message',
+    'match_type': 'command',
+    'args': 'ping',
+    'text': '<@UBOT> ping',
+    'channel_id': 'C123456',
+    'channel': {'id': 'C123456', 'name': 'general'},
+    'user': 'U123456',
+    'parsed_user': {'id': 'U123456', 'name': 'user'},
+    'ts': '1709149728.078244',
+}).encode('utf-8')
+
+
+def build_router():
+    message_router = OmnibotMessageRouter()
+
+    @message_router.route('ping')
+    def ping(message):
+        return {'actions': [{
+            'action': 'chat.postMessage',
+            'kwargs': {'channel': message['channel_id'], 'text': 'pong'},
+        }]}
+
+    return OmnibotRouter(message_router=message_router)
+
+
+def build_flask_app(router):
+    app = flask.Flask(__name__)
+
+    @app.route('/api/v1/bot', methods=['POST'])
+    def bot():
+        return flask.jsonify(router.handle_event(flask.request.get_json()))
+
+    return app
+
+
+def wsgi_request(app):
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': '/api/v1/bot',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(BODY)),
+        'wsgi.input': io.BytesIO(BODY),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    return b''.join(app(environ, lambda status, headers: None))
+
+
+def asgi_requests(app, number):
+    scope = {
+        'type': 'http',
+        'method': 'POST',
+        'path': '/api/v1/bot',
+        'headers': [(b'content-length', str(len(BODY)).encode('ascii'))],
+    }
+    message = {'type': 'http.request', 'body': BODY}
+
+    async def receive():
+        return message
+
+    async def send(message):
+        pass
+
+    async def run():
+        for _ in range(number):
+            await app(scope, receive, send)
+
+    asyncio.run(run())
+
+
+def time_per_request(func):
+    func()
+    number, elapsed = timeit.Timer(func).autorange()
+    return elapsed / number * 1e6
+
+
+def time_asgi(app):
+    number = 10000
+    elapsed = timeit.timeit(lambda: asgi_requests(app, number), number=1)
+    return elapsed / number * 1e6
+
+
+def main():
+    router = build_router()
+    wsgi_app = WSGIApp(router)
+    print('{:>12} {:>16}'.format('app', 'request (us)'))
+    print('{:>12} {:>16.2f}'.format(
+        'WSGIApp',
+        time_per_request(lambda: wsgi_request(wsgi_app))
+    ))
+    print('{:>12} {:>16.2f}'.format('ASGIApp', time_asgi(ASGIApp(router))))
+    if flask is None:
+        print('{:>12} {:>16}'.format('flask', 'not installed'))
+    else:
+        flask_app = build_flask_app(router)
+        print('{:>12} {:>16.2f}'.format(
+            'flask',
+            time_per_request(lambda: wsgi_request(flask_app))
+        ))
+
+
+if __name__ == '__main__':
+    main()
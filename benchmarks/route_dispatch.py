@@ -0,0 +1,75 @@
+"""
+Compare route lookup cost of linear and compiled dispatch in
+OmnibotMessageRouter, and of the literal prefilter of regex routes, as the
+number of registered routes grows. Command and reaction routes are indexed
+by their literal text in every mode.
+
+Usage::
+
+    python benchmarks/route_dispatch.py
+"""
+import timeit
+
+from omnibot_receiver.router import OmnibotMessageRouter
+
+ROUTE_COUNTS = (10, 100, 1000, 5000)
+# (match type, rule template, text matching the last route, missed text)
+ROUTE_SHAPES = (
+    ('command', 'verb{}', 'verb{}', 'unknown'),
+    ('command', 'command{} <arg>', 'command{} value', 'unknown value'),
+    ('reaction', 'emoji_{}', 'emoji_{}', 'unknown'),
+    ('regex', '.*keyword{}!.*', 'some keyword{}! text', 'some other text'),
+)
+# The literal prefilter only applies to regex routes.
+MODES = (
+    ('linear', {}),
+    ('compiled', {'compiled_dispatch': True}),
+    ('prefilter', {'literal_prefilter': True}),
+)
+
+
+def build_router(match_type, rule, route_count, **options):
+    router = OmnibotMessageRouter(help_as_default=False, **options)
+    for i in range(route_count):
+        router.add_message_rule(
+            rule.format(i),
+            match_type,
+            lambda message, **kwargs: kwargs
+        )
+    return router
+
+
+def time_lookup(router, text, match_type):
+    router._get_route_match(text, match_type)
+    timer = timeit.Timer(lambda: router._get_route_match(text, match_type))
+    number, elapsed = timer.autorange()
+    return elapsed / number * 1e6
+
+
+def main():
+    print('{:>8} {:>8} {:>10} {:>14} {:>14}'.format(
+        'type', 'routes', 'mode', 'last hit (us)', 'miss (us)'
+    ))
+    for match_type, rule, hit, miss in ROUTE_SHAPES:
+        for route_count in ROUTE_COUNTS:
+            for mode, options in MODES:
+                if mode == 'prefilter' and match_type != 'regex':
+                    continue
+                router = build_router(
+                    match_type,
+                    rule,
+                    route_count,
+                    **options
+                )
+                print('{:>8} {:>8} {:>10} {:>14.2f} {:>14.2f}'.format(
+                    match_type,
+                    route_count,
+                    mode,
+                    time_lookup(router, hit.format(route_count - 1),
+                                match_type),
+                    time_lookup(router, miss, match_type),
+                ))
+
+
+if __name__ == '__main__':
+    main()
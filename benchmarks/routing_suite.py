@@ -0,0 +1,274 @@
+"""
+Measure OmnibotRouter.handle_event over synthetic route tables of 10 to 10k
+command, regex, reaction and interactive routes, replaying a seeded mix of
+events that hit a route, miss every route (and fall back to the help or
+default route), or ask for help. Reports throughput, p50/p99 latency, and
+the peak memory allocated while replaying (traced with tracemalloc, in a
+separate pass, so tracing doesn't skew timings).
+
+Results can be saved, and compared against a saved baseline; the comparison
+exits with status 1 if throughput drops, or p99 latency grows, by more than
+the threshold.
+
+Usage::
+
+    python benchmarks/routing_suite.py
+    python benchmarks/routing_suite.py --sizes 10 100 --output baseline.json
+    python benchmarks/routing_suite.py --sizes 10 100 \\
+        --baseline baseline.json --threshold 0.2
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from omnibot_receiver.router import (
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+    OmnibotRouter,
+)
+
+KINDS = ('command', 'regex', 'reaction', 'interactive')
+SIZES = (10, 100, 1000, 10000)
+# Shares of events hitting a route, missing every route, and asking for
+# help; the rest of the events are hits.
+MISS_SHARE = 0.15
+HELP_SHARE = 0.05
+ROW_FORMAT = '{:>12} {:>8} {:>12.0f} {:>10.2f} {:>10.2f} {:>12.1f}'
+
+
+def respond(event, **kwargs):
+    return {'actions': [{
+        'action': 'chat.postMessage',
+        'kwargs': {'channel': event.get('channel_id'), 'text': 'ok'},
+    }]}
+
+
+def build_router(kind, size, compiled_dispatch=False):
+    """
+    Build a frozen router with size routes of the given kind. Message
+    routers fall back to the help route, interactive routers to a default
+    route.
+    """
+    if kind == 'interactive':
+        interactive_router = OmnibotInteractiveRouter()
+        for i in range(size):
+            interactive_router.add_event_callback(
+                'callback_{}'.format(i),
+                respond,
+                event_type='block_actions' if i % 2 else None
+            )
+        interactive_router.set_default()(respond)
+        router = OmnibotRouter(interactive_router=interactive_router)
+        router.freeze()
+        return router
+    message_router = OmnibotMessageRouter(
+        help='Synthetic routes.',
+        compiled_dispatch=compiled_dispatch
+    )
+    for i in range(size):
+        if kind == 'command' and i % 2:
+            rule = 'command{} <arg>'.format(i)
+        elif kind == 'command':
+            rule = 'verb{}'.format(i)
+        elif kind == 'regex':
+            rule = '.*keyword{}!.*'.format(i)
+        else:
+            rule = 'emoji_{}'.format(i)
+        message_router.add_message_rule(rule, kind, respond, help=rule)
+    if kind == 'command':
+        message_router.add_message_rule(
+            'help',
+            'command',
+            message_router.get_help
+        )
+    router = OmnibotRouter(message_router=message_router)
+    router.freeze()
+    return router
+
+
+def get_hit_text(kind, i):
+    if kind == 'command':
+        return 'command{} value'.format(i) if i % 2 else 'verb{}'.format(i)
+    elif kind == 'regex':
+        return 'some keyword{}! text'.format(i)
+    elif kind == 'reaction':
+        return 'emoji_{}'.format(i)
+    return 'callback_{}'.format(i)
+
+
+def build_events(kind, size, count, seed):
+    """
+    Build a seeded corpus of events for a route table.
+    """
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < MISS_SHARE:
+            text = 'unknown {}'.format(rng.randrange(size))
+        elif roll < MISS_SHARE + HELP_SHARE and kind == 'command':
+            text = 'help'
+        else:
+            text = get_hit_text(kind, rng.randrange(size))
+        events.append(build_event(kind, text))
+    return events
+
+
+def build_event(kind, text):
+    if kind == 'interactive':
+        return {
+            'omnibot_payload_type': 'interactive_component',
+            'type': 'block_actions',
+            'callback_id': text,
+            'channel_id': 'C123456',
+        }
+    if kind == 'reaction':
+        payload_type = 'reaction'
+    else:
+        payload_type = 'message'
+    return {
+        'omnibot_payload_type': payload_type,
+        'match_type': kind,
+        'args': text,
+        'text': text,
+        'channel_id': 'C123456',
+        'user': 'U123456',
+        'ts': '1709149728.078244',
+    }
+
+
+def run_scenario(kind, size, count, seed, compiled_dispatch=False):
+    router = build_router(kind, size, compiled_dispatch)
+    events = build_events(kind, size, count, seed)
+    handle_event = router.handle_event
+    # Warm up matchers and caches.
+    for event in events[:100]:
+        handle_event(event)
+    latencies = []
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for event in events:
+        event_start = perf_counter()
+        handle_event(event)
+        latencies.append(perf_counter() - event_start)
+    elapsed = perf_counter() - start
+    latencies.sort()
+    tracemalloc.start()
+    for event in events:
+        handle_event(event)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'kind': kind,
+        'routes': size,
+        'events_per_second': count / elapsed,
+        'p50_us': latencies[len(latencies) // 2] * 1e6,
+        'p99_us': latencies[min(int(len(latencies) * 0.99),
+                                len(latencies) - 1)] * 1e6,
+        'peak_alloc_kib': peak / 1024,
+    }
+
+
+def get_key(result):
+    return '{}/{}'.format(result['kind'], result['routes'])
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results against a baseline.
+
+    Returns:
+
+        A list of descriptions of regressions.
+    """
+    regressions = []
+    baseline = {get_key(result): result for result in baseline}
+    for result in results:
+        base = baseline.get(get_key(result))
+        if base is None:
+            continue
+        if result['events_per_second'] < (
+            base['events_per_second'] * (1 - threshold)
+        ):
+            regressions.append('{}: {:.0f} events/s, baseline {:.0f}'.format(
+                get_key(result),
+                result['events_per_second'],
+                base['events_per_second']
+            ))
+        if result['p99_us'] > base['p99_us'] * (1 + threshold):
+            regressions.append('{}: p99 {:.1f}us, baseline {:.1f}us'.format(
+                get_key(result),
+                result['p99_us'],
+                base['p99_us']
+            ))
+    return regressions
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=KINDS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument(
+        '--events',
+        type=int,
+        default=2000,
+        help='The number of events to replay per route table.'
+    )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compiled-dispatch', action='store_true')
+    parser.add_argument('--output', help='Save results as JSON to a file.')
+    parser.add_argument(
+        '--baseline',
+        help='Compare results against the JSON results in a file.'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='The share by which results may regress from the baseline.'
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    print('{:>12} {:>8} {:>12} {:>10} {:>10} {:>12}'.format(
+        'kind', 'routes', 'events/s', 'p50 (us)', 'p99 (us)', 'peak (KiB)'
+    ))
+    results = []
+    for kind in args.kinds:
+        for size in args.sizes:
+            result = run_scenario(
+                kind,
+                size,
+                args.events,
+                args.seed,
+                args.compiled_dispatch
+            )
+            results.append(result)
+            print(ROW_FORMAT.format(
+                kind,
+                size,
+                result['events_per_second'],
+                result['p50_us'],
+                result['p99_us'],
+                result['peak_alloc_kib'],
+            ))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print('Regression: {}'.format(regression))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+.. module:: app
+   :synopsis: WSGI and ASGI applications that receive events from omnibot.
+
+These applications accept POSTs of omnibot events on any path, route them
+through an :class:`omnibot_receiver.router.OmnibotRouter`, and respond with
+the route's response, without depending on a web framework:
+
+.. code-block:: python
+
+    from omnibot_receiver.app import WSGIApp
+
+    from bot_location import router
+
+    # Serve with any WSGI server, e.g. gunicorn bot_app:app
+    app = WSGIApp(router)
+
+Errors are returned as JSON, with an ``error`` key: 400 for invalid JSON or
+an unsupported payload type, 404 when no route matches the event, 405 for
+methods other than POST, 411 for requests without a Content-Length (WSGI
+only), and 413 for bodies larger than max_body_size. The ASGI application
+rejects websocket connections.
+"""
+from omnibot_receiver import codec
+from omnibot_receiver.router import (
+    NoMatchedRouteError,
+    UnsupportedPayloadError,
+)
+
+DEFAULT_MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+def _error(status, message):
+    body = codec.dumps({'error': message})
+    return status, body
+
+
+_METHOD_NOT_ALLOWED = _error('405 Method Not Allowed', 'Method not allowed.')
+_LENGTH_REQUIRED = _error('411 Length Required', 'Length required.')
+_TOO_LARGE = _error('413 Payload Too Large', 'Payload too large.')
+_INVALID_JSON = _error('400 Bad Request', 'Invalid JSON.')
+_UNSUPPORTED_PAYLOAD = _error('400 Bad Request', 'Unsupported payload type.')
+_NO_MATCHED_ROUTE = _error('404 Not Found', 'No matched route.')
+
+
+def _decode(body):
+    try:
+        return codec.loads(body)
+    except ValueError:
+        return None
+
+
+class WSGIApp(object):
+
+    """
+    A WSGI application that routes events through an
+    :class:`omnibot_receiver.router.OmnibotRouter`.
+    """
+
+    def __init__(self, router, max_body_size=DEFAULT_MAX_BODY_SIZE):
+        """
+        Init function for WSGIApp.
+
+        Args:
+
+            router (OmnibotRouter): The router to route events through.
+            max_body_size (int): The largest request body to accept, in
+            bytes.
+
+        Returns:
+
+            An instance of WSGIApp
+        """
+        self.router = router
+        self.max_body_size = max_body_size
+
+    def __call__(self, environ, start_response):
+        status, body = self._handle(environ)
+        start_response(status, [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+        ])
+        return [body]
+
+    def _handle(self, environ):
+        if environ['REQUEST_METHOD'] != 'POST':
+            return _METHOD_NOT_ALLOWED
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or '')
+        except ValueError:
+            return _LENGTH_REQUIRED
+        if length < 0:
+            return _LENGTH_REQUIRED
+        if length > self.max_body_size:
+            return _TOO_LARGE
+        event = _decode(_read_body(environ['wsgi.input'], length))
+        if not isinstance(event, dict):
+            return _INVALID_JSON
+        try:
+            return '200 OK', codec.dumps(self.router.handle_event(event))
+        except UnsupportedPayloadError:
+            return _UNSUPPORTED_PAYLOAD
+        except NoMatchedRouteError:
+            return _NO_MATCHED_ROUTE
+
+
+def _read_body(stream, length):
+    """
+    Read a request body of a known length into a single buffer.
+    """
+    body = bytearray(length)
+    view = memoryview(body)
+    readinto = getattr(stream, 'readinto', None)
+    pos = 0
+    while pos < length:
+        if readinto is not None:
+            read = readinto(view[pos:])
+        else:
+            chunk = stream.read(length - pos)
+            read = len(chunk)
+            view[pos:pos + read] = chunk
+        if not read:
+            # The client sent less than its Content-Length.
+            return bytes(view[:pos])
+        pos += read
+    return body
+
+
+class ASGIApp(object):
+
+    """
+    An ASGI application that routes events through an
+    :class:`omnibot_receiver.router.OmnibotRouter`, awaiting async routes;
+    see :func:`omnibot_receiver.router.OmnibotRouter.handle_event_async()`.
+
+    .. code-block:: python
+
+        from omnibot_receiver.app import ASGIApp
+
+        # Serve with any ASGI server, e.g. uvicorn bot_app:app
+        app = ASGIApp(router)
+    """
+
+    def __init__(self, router, max_body_size=DEFAULT_MAX_BODY_SIZE):
+        """
+        Init function for ASGIApp.
+
+        Args:
+
+            router (OmnibotRouter): The router to route events through.
+            max_body_size (int): The largest request body to accept, in
+            bytes.
+
+        Returns:
+
+            An instance of ASGIApp
+        """
+        self.router = router
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await _lifespan(receive, send)
+            return
+        if scope['type'] == 'websocket':
+            await _reject_websocket(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(
+                'Unsupported ASGI scope type {!r}.'.format(scope['type'])
+            )
+        status, body = await self._handle(scope, receive)
+        await send({
+            'type': 'http.response.start',
+            'status': int(status[:3]),
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('ascii')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _handle(self, scope, receive):
+        if scope['method'] != 'POST':
+            return _METHOD_NOT_ALLOWED
+        body = await self._read_body(scope, receive)
+        if body is None:
+            return _TOO_LARGE
+        event = _decode(body)
+        if not isinstance(event, dict):
+            return _INVALID_JSON
+        try:
+            response = await self.router.handle_event_async(event)
+        except UnsupportedPayloadError:
+            return _UNSUPPORTED_PAYLOAD
+        except NoMatchedRouteError:
+            return _NO_MATCHED_ROUTE
+        return '200 OK', codec.dumps(response)
+
+    async def _read_body(self, scope, receive):
+        """
+        Read the body chunks of a request into a single buffer, preallocated
+        when the request has a Content-Length. Returns None if the body is
+        larger than max_body_size.
+        """
+        length = _get_content_length(scope)
+        if length is not None and length > self.max_body_size:
+            return None
+        body = bytearray(length or 0)
+        pos = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunk = message.get('body', b'')
+            end = pos + len(chunk)
+            if end > self.max_body_size:
+                return None
+            body[pos:end] = chunk
+            pos = end
+            more_body = message.get('more_body', False)
+        if pos < len(body):
+            del body[pos:]
+        return body
+
+
+def _get_content_length(scope):
+    for name, value in scope.get('headers', ()):
+        if name == b'content-length':
+            try:
+                length = int(value)
+            except ValueError:
+                return None
+            if length < 0:
+                return None
+            return length
+    return None
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _reject_websocket(receive, send):
+    # Closing a websocket before accepting it rejects the connection.
+    message = await receive()
+    if message['type'] == 'websocket.connect':
+        await send({'type': 'websocket.close', 'code': 1008})
@@ -0,0 +1,150 @@
+"""
+.. module:: batch
+   :synopsis: Concurrent handling of batches of omnibot events.
+"""
+from collections import namedtuple
+import concurrent.futures
+import functools
+import inspect
+
+from omnibot_receiver.deferred import DeferredRoute
+from omnibot_receiver.executor import (
+    ExecutorRoute,
+    WrappedRoute,
+    call_route_async,
+    call_to_completion,
+)
+
+EventResult = namedtuple(
+    'EventResult',
+    ['index', 'event', 'response', 'error']
+)
+EventResult.__doc__ = """
+The outcome of handling one event of a batch.
+
+Attributes:
+
+    index (int): The position of the event in the batch.
+    event (dict): The event.
+    response (dict): The response of the route, or None if it failed.
+    error (Exception): The exception raised while resolving or running the
+    route, or None if it succeeded.
+"""
+
+
+def handle_events(
+    router,
+    events,
+    executor=None,
+    max_workers=None,
+    as_completed=False,
+):
+    """
+    Route a batch of events through an
+    :class:`omnibot_receiver.router.OmnibotRouter`; see its handle_events
+    function.
+    """
+    owns_executor = executor is None
+    if owns_executor:
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers
+        )
+    try:
+        resolved = [
+            _resolve(router, index, event)
+            for index, event in enumerate(events)
+        ]
+        pending = [_submit(executor, item) for item in resolved]
+    except BaseException:
+        if owns_executor:
+            executor.shutdown(wait=False)
+        raise
+    if as_completed:
+        return _iter_completed(pending, executor if owns_executor else None)
+    try:
+        return [_get_result(item) for item in pending]
+    finally:
+        if owns_executor:
+            executor.shutdown()
+
+
+def _resolve(router, index, event):
+    handler = getattr(router, '_handler', None)
+    try:
+        view_function, kwargs = router.resolve_event(event)
+    except Exception as e:
+        if handler is None:
+            return EventResult(index, event, None, e)
+        # The hooks still run, and the error is raised again within them,
+        # as it is by handle_event.
+        view_function, kwargs = None, {}
+    asynchronous = _is_async_route(view_function)
+    if handler is not None:
+        # Hooks of the router run around the routing of every event, so the
+        # event is routed again, through them, as by handle_event.
+        view_function, kwargs = handler, {}
+    if asynchronous:
+        # Async routes are run to completion on an event loop of their
+        # worker thread.
+        call = functools.partial(
+            call_to_completion,
+            call_route_async,
+            view_function,
+            **kwargs
+        )
+    else:
+        call = functools.partial(view_function, **kwargs)
+    deduplicator = getattr(router, 'deduplicator', None)
+    if deduplicator is not None:
+        # Redeliveries, within the batch or of earlier events, are answered
+        # by the deduplicator rather than run again.
+        return index, event, functools.partial(
+            deduplicator.handle,
+            event,
+            call
+        )
+    return index, event, functools.partial(call, event)
+
+
+def _is_async_route(view_function):
+    """
+    Whether a route function is defined with ``async def``, under the layers
+    that wrap it. Routes run on an executor or deferred are run to completion
+    by their wrapper.
+    """
+    while (isinstance(view_function, WrappedRoute) and
+           not isinstance(view_function, (ExecutorRoute, DeferredRoute))):
+        view_function = view_function.view_function
+    return inspect.iscoroutinefunction(view_function)
+
+
+def _submit(executor, item):
+    if isinstance(item, EventResult):
+        return item
+    index, event, call = item
+    return index, event, executor.submit(call)
+
+
+def _get_result(item):
+    if isinstance(item, EventResult):
+        return item
+    index, event, future = item
+    try:
+        return EventResult(index, event, future.result(), None)
+    except Exception as e:
+        return EventResult(index, event, None, e)
+
+
+def _iter_completed(pending, executor):
+    try:
+        by_future = {}
+        for item in pending:
+            if isinstance(item, EventResult):
+                yield item
+            else:
+                by_future[item[2]] = item
+        for future in concurrent.futures.as_completed(by_future):
+            yield _get_result(by_future[future])
+    finally:
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,160 @@
+"""
+.. module:: cache
+   :synopsis: Caches used by the omnibot routers.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache(object):
+
+    """
+    A thread-safe, size-bounded, least recently used cache, which keeps
+    counters of its hits, misses, evictions and expirations, so that it can
+    be sized. Entries can optionally expire after a time to live.
+
+    .. code-block:: python
+
+        from omnibot_receiver.cache import LRUCache
+
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.stats()
+        # {'hits': 1, 'misses': 0, 'evictions': 0, 'expirations': 0,
+        #  'size': 1, 'maxsize': 2}
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, timer=time.monotonic):
+        """
+        Init function for LRUCache.
+
+        Args:
+
+            maxsize (int): The maximum number of entries to keep. Once the
+            cache is full, the least recently used entry is evicted.
+            ttl (float): If set, the number of seconds after which an entry
+            expires, from when it was set.
+            timer (callable): The clock that ttl is measured with.
+
+        Returns:
+
+            An instance of LRUCache
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1.')
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._timer = timer
+        self._data = OrderedDict()
+        # The expiry time of each entry, if entries have a ttl.
+        self._expires = {} if ttl is not None else None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        if self._expires is not None:
+            return self._expires.get(key, 0) > self._timer()
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Get a cached value, and mark it as the most recently used.
+
+        Args:
+
+            key (hashable): The key of the entry.
+            default (object): The value to return if the key isn't cached.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if (self._expires is not None and
+                    self._expires[key] <= self._timer()):
+                del self._data[key]
+                del self._expires[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """
+        Cache a value, evicting the least recently used entry if the cache is
+        full.
+
+        Args:
+
+            key (hashable): The key of the entry.
+            value (object): The value to cache.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if self._expires is not None:
+                self._expires[key] = self._timer() + self.ttl
+            if len(self._data) > self.maxsize:
+                evicted, _ = self._data.popitem(last=False)
+                if self._expires is not None:
+                    del self._expires[evicted]
+                self.evictions += 1
+
+    def delete(self, key):
+        """
+        Remove an entry from the cache, if it's cached.
+
+        Args:
+
+            key (hashable): The key of the entry.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            if self._expires is not None:
+                self._expires.pop(key, None)
+
+    def keys(self):
+        """
+        Get a snapshot of the keys of the cache, from the least to the most
+        recently used.
+        """
+        with self._lock:
+            return list(self._data)
+
+    def clear(self):
+        """
+        Remove every entry from the cache. Counters are kept.
+        """
+        with self._lock:
+            self._data.clear()
+            if self._expires is not None:
+                self._expires.clear()
+
+    def stats(self):
+        """
+        Get the counters of this cache.
+
+        Returns:
+
+            A dict with hits, misses, evictions, expirations, size and
+            maxsize keys.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
@@ -0,0 +1,155 @@
+"""
+.. module:: coalesce
+   :synopsis: Coalescing of identical concurrent route calls.
+"""
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+from omnibot_receiver.event import get_channel_id
+from omnibot_receiver.executor import WrappedRoute, call_route_async
+
+
+def _get_reply_thread_ts(message):
+    return message.get('thread_ts') or message.get('ts')
+
+
+# Action kwargs that refer to the message a response was built for, and how
+# to get their value from a message.
+PATCHED_FIELDS = (
+    ('channel', get_channel_id),
+    ('thread_ts', _get_reply_thread_ts),
+)
+
+
+def patch_response(response, leader, follower):
+    """
+    Adapt the response a route built for one message to another message,
+    by replacing the action kwargs that refer to the leader message (its
+    channel and thread) with the ones of the follower message.
+
+    Args:
+
+        response (dict): A copy of the response built for the leader
+        message, which is patched in place.
+        leader (dict): The message the response was built for.
+        follower (dict): The message to adapt the response to.
+    """
+    if not isinstance(response, dict):
+        return response
+    for action in response.get('actions') or ():
+        kwargs = action.get('kwargs') if isinstance(action, dict) else None
+        if not kwargs:
+            continue
+        for field, get_value in PATCHED_FIELDS:
+            value = get_value(leader)
+            if value is not None and kwargs.get(field) == value:
+                kwargs[field] = get_value(follower)
+    return response
+
+
+class CoalescedRoute(WrappedRoute):
+
+    """
+    A route function whose concurrent calls with the same arguments are
+    coalesced: one call runs the route, and the calls that arrive while it
+    runs wait for it, and get a copy of its response, adapted to their
+    message with :func:`omnibot_receiver.coalesce.patch_response`.
+    """
+
+    __slots__ = ('view_function', 'key', 'collapsed', '_in_flight', '_lock')
+
+    def __init__(self, view_function, key=None):
+        """
+        Init function for CoalescedRoute.
+
+        Args:
+
+            view_function (function): The route function.
+            key (callable): If set, called with the message, to get a value
+            that must also be equal for calls to be coalesced (for instance,
+            the channel id, to only coalesce calls within a channel).
+
+        Returns:
+
+            An instance of CoalescedRoute
+        """
+        self.view_function = view_function
+        self.key = key
+        self.collapsed = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, message, **kwargs):
+        key = self._get_key(message, kwargs)
+        leader = self._join(key, message)
+        if leader is not None:
+            leader_message, future = leader
+            return self._follow(future.result(), leader_message, message)
+        try:
+            response = self.view_function(message, **kwargs)
+        except BaseException as e:
+            self._finish(key, exception=e)
+            raise
+        self._finish(key, response=response)
+        return response
+
+    async def call_async(self, message, **kwargs):
+        key = self._get_key(message, kwargs)
+        leader = self._join(key, message)
+        if leader is not None:
+            leader_message, future = leader
+            response = await asyncio.wrap_future(future)
+            return self._follow(response, leader_message, message)
+        try:
+            response = await call_route_async(
+                self.view_function,
+                message,
+                **kwargs
+            )
+        except BaseException as e:
+            self._finish(key, exception=e)
+            raise
+        self._finish(key, response=response)
+        return response
+
+    def _get_key(self, message, kwargs):
+        key = tuple(sorted(kwargs.items()))
+        if self.key is not None:
+            key = (key, self.key(message))
+        return key
+
+    def _join(self, key, message):
+        """
+        Join the running call with the given key, returning its message and
+        future, or register this call as the running one, returning None.
+        """
+        with self._lock:
+            leader = self._in_flight.get(key)
+            if leader is not None:
+                self.collapsed += 1
+                leader[2] = True
+                return leader[0], leader[1]
+            # The message, future and whether the call has followers.
+            self._in_flight[key] = [
+                message,
+                concurrent.futures.Future(),
+                False,
+            ]
+        return None
+
+    def _follow(self, response, leader_message, message):
+        return patch_response(copy.deepcopy(response), leader_message, message)
+
+    def _finish(self, key, response=None, exception=None):
+        with self._lock:
+            _, future, has_followers = self._in_flight.pop(key)
+        if exception is None:
+            if has_followers:
+                # Followers copy the response once they wake up, by which
+                # time the leader's caller may have changed it.
+                response = copy.deepcopy(response)
+            future.set_result(response)
+        else:
+            future.set_exception(exception)
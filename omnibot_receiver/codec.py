@@ -0,0 +1,107 @@
+"""
+.. module:: codec
+   :synopsis: JSON decoding and encoding of omnibot events and responses.
+
+The fastest available JSON library is used: orjson, then ujson, then the
+standard library's json module. Install the ``orjson`` extra of this package
+to get the fastest backend.
+"""
+from collections import namedtuple
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+JSONBackend = namedtuple('JSONBackend', ['name', 'loads', 'dumps'])
+JSONBackend.__doc__ = """
+A JSON library. ``loads`` decodes bytes, bytearray or str, and ``dumps``
+encodes to compact UTF-8 bytes.
+"""
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode('utf-8')
+
+
+def _ujson_loads(body):
+    if isinstance(body, bytearray):
+        body = bytes(body)
+    return ujson.loads(body)
+
+
+def _ujson_dumps(obj):
+    return ujson.dumps(
+        obj,
+        ensure_ascii=False,
+        escape_forward_slashes=False
+    ).encode('utf-8')
+
+
+def _get_backends():
+    backends = {}
+    if orjson is not None:
+        backends['orjson'] = JSONBackend('orjson', orjson.loads, orjson.dumps)
+    if ujson is not None:
+        backends['ujson'] = JSONBackend('ujson', _ujson_loads, _ujson_dumps)
+    backends['json'] = JSONBackend('json', json.loads, _stdlib_dumps)
+    return backends
+
+
+BACKENDS = _get_backends()
+# Dicts keep their insertion order, so this is the fastest available backend.
+backend = next(iter(BACKENDS.values()))
+
+
+def get_backend(name=None):
+    """
+    Get a JSON backend.
+
+    Args:
+
+        name (str): orjson, ujson or json. By default, the fastest available
+        backend is returned.
+
+    Returns:
+
+        A :class:`omnibot_receiver.codec.JSONBackend`
+    """
+    if name is None:
+        return backend
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            'JSON backend {} is not available.'.format(name)
+        ) from None
+
+
+def loads(body):
+    """
+    Decode a JSON document, such as the body of a request from omnibot.
+
+    Args:
+
+        body (bytes): The JSON document, as bytes, bytearray or str.
+    """
+    return backend.loads(body)
+
+
+def dumps(obj):
+    """
+    Encode an object as compact JSON, such as a response to omnibot.
+
+    Returns:
+
+        UTF-8 encoded bytes.
+    """
+    return backend.dumps(obj)
@@ -0,0 +1,205 @@
+"""
+.. module:: dedup
+   :synopsis: Deduplication of events redelivered by omnibot.
+"""
+import asyncio
+import concurrent.futures
+import copy
+import threading
+
+from omnibot_receiver.cache import LRUCache
+from omnibot_receiver.event import get_channel_id
+
+_MISSING = object()
+
+
+def get_event_key(event):
+    """
+    The default deduplication key of an event: its event_id or trigger_id if
+    it has one, or else a fingerprint of its payload type, channel,
+    timestamp, user and args. Events without any of these are not
+    deduplicated.
+
+    Args:
+
+        event (dict): An event sent by omnibot.
+
+    Returns:
+
+        A str key, or None.
+    """
+    event_id = event.get('event_id') or event.get('trigger_id')
+    if event_id:
+        return event_id
+    ts = event.get('ts')
+    if not ts:
+        return None
+    return '{}:{}:{}:{}:{}'.format(
+        event.get('omnibot_payload_type'),
+        get_channel_id(event),
+        ts,
+        event.get('user'),
+        event.get('args'),
+    )
+
+
+class Deduplicator(object):
+
+    """
+    Deduplicates events redelivered by omnibot, so that a route runs once per
+    event. The response of the first delivery of an event is stored, and
+    copies of it are returned for later deliveries, until it expires.
+    Deliveries that arrive while the first one is still running wait for it,
+    rather than running the route again. Errors are not stored, so failed
+    events run again when redelivered.
+
+    .. code-block:: python
+
+        from omnibot_receiver.dedup import Deduplicator
+
+        router = OmnibotRouter(
+            message_router=message_router,
+            deduplicator=Deduplicator(ttl=300)
+        )
+
+    The store is any object with ``get(key, default)`` and ``set(key,
+    value)`` functions, so a store shared by every worker (backed by redis,
+    for instance) can be used in place of the default in-memory
+    :class:`omnibot_receiver.cache.LRUCache`; such stores must expire
+    entries themselves.
+    """
+
+    def __init__(self, store=None, key=get_event_key, ttl=300, maxsize=10000):
+        """
+        Init function for Deduplicator.
+
+        Args:
+
+            store (object): The store of responses. Defaults to an
+            :class:`omnibot_receiver.cache.LRUCache` of maxsize entries that
+            expire after ttl seconds.
+            key (callable): Called with an event, to get its deduplication
+            key, or None if the event shouldn't be deduplicated. See
+            :func:`omnibot_receiver.dedup.get_event_key`.
+            ttl (float): The number of seconds to keep responses for, in the
+            default store.
+            maxsize (int): The number of responses to keep in the default
+            store.
+
+        Returns:
+
+            An instance of Deduplicator
+        """
+        if store is None:
+            store = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.store = store
+        self.key = key
+        self.duplicates = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def handle(self, event, handler):
+        """
+        Handle an event with the given function, unless it is a duplicate.
+
+        Args:
+
+            event (dict): An event sent by omnibot.
+            handler (callable): Called with the event to get its response.
+        """
+        key = self.key(event)
+        if key is None:
+            return handler(event)
+        response, future = self._claim(key)
+        if response is not _MISSING:
+            return response
+        if future is not None:
+            return copy.deepcopy(future.result())
+        try:
+            response = handler(event)
+        except BaseException as e:
+            self._finish(key, exception=e)
+            raise
+        self._finish(key, response=response)
+        return response
+
+    async def handle_async(self, event, handler):
+        """
+        Handle an event with the given coroutine function, unless it is a
+        duplicate; see :func:`omnibot_receiver.dedup.Deduplicator.handle`.
+        """
+        key = self.key(event)
+        if key is None:
+            return await handler(event)
+        response, future = self._claim(key)
+        if response is not _MISSING:
+            return response
+        if future is not None:
+            return copy.deepcopy(await asyncio.wrap_future(future))
+        try:
+            response = await handler(event)
+        except BaseException as e:
+            self._finish(key, exception=e)
+            raise
+        self._finish(key, response=response)
+        return response
+
+    def stats(self):
+        """
+        Get the counters of this deduplicator.
+
+        Returns:
+
+            A dict with duplicates (deliveries answered from the store) and
+            coalesced (deliveries that joined a running delivery) keys.
+        """
+        return {'duplicates': self.duplicates, 'coalesced': self.coalesced}
+
+    def _claim(self, key):
+        """
+        Get the stored response for the key, or the future of its running
+        delivery, or claim the key for this delivery.
+
+        Returns:
+
+            A tuple of (response, future), where response is _MISSING unless
+            it was stored, and future is None if this delivery should run.
+        """
+        response = self._get_stored(key)
+        if response is not _MISSING:
+            return response, None
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return _MISSING, future
+            self._in_flight[key] = concurrent.futures.Future()
+        # The running delivery may have finished since the store was read.
+        response = self._get_stored(key)
+        if response is not _MISSING:
+            with self._lock:
+                future = self._in_flight.pop(key)
+            future.set_result(response)
+        return response, None
+
+    def _get_stored(self, key):
+        response = self.store.get(key, _MISSING)
+        if response is not _MISSING:
+            with self._lock:
+                self.duplicates += 1
+            response = copy.deepcopy(response)
+        return response
+
+    def _finish(self, key, response=None, exception=None):
+        if exception is None:
+            # Keep a copy, so callers can't change the response of later
+            # deliveries.
+            response = copy.deepcopy(response)
+            self.store.set(key, response)
+        with self._lock:
+            future = self._in_flight.pop(key)
+        if exception is None:
+            future.set_result(response)
+        else:
+            future.set_exception(exception)
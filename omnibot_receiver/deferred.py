@@ -0,0 +1,312 @@
+"""
+.. module:: deferred
+   :synopsis: Running routes in the background, after acknowledging events.
+"""
+import asyncio
+import concurrent.futures
+import copy
+import json
+import logging
+import os
+import threading
+import urllib.request
+
+from omnibot_receiver.executor import (
+    WrappedRoute,
+    call_to_completion,
+)
+
+DEFAULT_ACK_RESPONSE = {'actions': []}
+
+logger = logging.getLogger(__name__)
+
+
+class DeferredPool(object):
+
+    """
+    A bounded pool of threads that runs deferred routes, and delivers their
+    responses to a sink.
+
+    At most max_workers routes run at once, and at most max_pending more wait
+    for a worker; once the pool is full, submitting a route blocks until a
+    slot frees up (or raises a DeferredPoolFullError, if a submit_timeout is
+    set), so that a burst of events slows the receiver down, rather than
+    growing an unbounded backlog.
+
+    .. code-block:: python
+
+        from omnibot_receiver.deferred import DeferredPool, HTTPSink
+
+        pool = DeferredPool(
+            sink=HTTPSink('http://localhost:8080/api/v1/actions'),
+            max_workers=8
+        )
+
+        @message_router.route('report <id>', deferred=pool)
+        def report(message, id):
+            # build a report; the returned actions are posted to the sink
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        error_sink=None,
+        max_workers=None,
+        max_pending=100,
+        submit_timeout=None,
+    ):
+        """
+        Init function for DeferredPool.
+
+        Args:
+
+            sink (callable): Called as ``sink(event, response)`` with the
+            response of every deferred route. A callable, a
+            :class:`omnibot_receiver.deferred.QueueSink` or a
+            :class:`omnibot_receiver.deferred.HTTPSink`. By default, responses
+            are dropped.
+            error_sink (callable): Called as ``error_sink(event, exception)``
+            when a deferred route, or the sink, raises. By default, errors are
+            logged.
+            max_workers (int): The number of routes to run at once. Defaults
+            to the default of ThreadPoolExecutor.
+            max_pending (int): The number of routes that can wait for a
+            worker.
+            submit_timeout (float): If set, the number of seconds to wait for
+            a slot in a full pool, before raising a DeferredPoolFullError.
+
+        Returns:
+
+            An instance of DeferredPool
+        """
+        self.sink = sink
+        self.error_sink = error_sink
+        self.submit_timeout = submit_timeout
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 1) + 4)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='omnibot-deferred'
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def submit(self, view_function, event, kwargs):
+        """
+        Run a route in the background, blocking while the pool is full.
+
+        Args:
+
+            view_function (function): The route function.
+            event (dict): The event to call the route with.
+            kwargs (dict): The keyword arguments to call the route with.
+
+        Returns:
+
+            A concurrent.futures.Future of the route's response.
+        """
+        self._acquire_slot()
+        return self._submit(view_function, event, kwargs)
+
+    async def submit_async(self, view_function, event, kwargs):
+        """
+        Run a route in the background; see
+        :func:`omnibot_receiver.deferred.DeferredPool.submit`. While the pool
+        is full, the caller waits for a slot without blocking the event loop.
+        """
+        if not self._slots.acquire(blocking=False):
+            acquired = asyncio.get_running_loop().run_in_executor(
+                None,
+                self._acquire_slot
+            )
+            try:
+                await asyncio.shield(acquired)
+            except asyncio.CancelledError:
+                # The worker still takes a slot; give it back once it does.
+                acquired.add_done_callback(self._release_unused_slot)
+                raise
+        return self._submit(view_function, event, kwargs)
+
+    def _acquire_slot(self):
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            raise DeferredPoolFullError(
+                'The deferred pool is full; could not defer the route.'
+            )
+
+    def _release_unused_slot(self, acquired):
+        if not acquired.cancelled() and acquired.exception() is None:
+            self._slots.release()
+
+    def _submit(self, view_function, event, kwargs):
+        try:
+            future = self._executor.submit(
+                self._run,
+                view_function,
+                event,
+                kwargs
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def _run(self, view_function, event, kwargs):
+        try:
+            response = call_to_completion(view_function, event, **kwargs)
+            if self.sink is not None:
+                self.sink(event, response)
+            return response
+        except Exception as e:
+            if self.error_sink is not None:
+                self.error_sink(event, e)
+            else:
+                logger.exception('Deferred route failed.')
+            raise
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting routes, waiting for the submitted ones to finish if
+        wait is set.
+        """
+        self._executor.shutdown(wait=wait)
+
+
+_deferred_pool = None
+_deferred_pool_lock = threading.Lock()
+
+
+def get_deferred_pool():
+    """
+    Get the pool that routes registered with ``deferred=True`` run on,
+    creating a :class:`omnibot_receiver.deferred.DeferredPool` without a sink
+    if no pool has been set.
+    """
+    global _deferred_pool
+    with _deferred_pool_lock:
+        if _deferred_pool is None:
+            _deferred_pool = DeferredPool()
+        return _deferred_pool
+
+
+def set_deferred_pool(pool):
+    """
+    Set the pool that routes registered with ``deferred=True`` run on. The
+    previous pool is not shut down.
+
+    Args:
+
+        pool (DeferredPool): The pool to use, or None to create a default
+        pool on next use.
+    """
+    global _deferred_pool
+    with _deferred_pool_lock:
+        _deferred_pool = pool
+
+
+class DeferredRoute(WrappedRoute):
+
+    """
+    A route function that is run on a
+    :class:`omnibot_receiver.deferred.DeferredPool`, with a copy of the
+    acknowledgement response returned to the router right away.
+    """
+
+    __slots__ = ('view_function', 'pool', 'ack_response')
+
+    def __init__(self, view_function, pool=None, ack_response=None):
+        """
+        Init function for DeferredRoute.
+
+        Args:
+
+            view_function (function): The route function.
+            pool (DeferredPool): The pool to run the route on. Defaults to
+            the shared pool; see
+            :func:`omnibot_receiver.deferred.get_deferred_pool`.
+            ack_response (dict): The response to return right away. Defaults
+            to an empty list of actions.
+
+        Returns:
+
+            An instance of DeferredRoute
+        """
+        if ack_response is None:
+            ack_response = DEFAULT_ACK_RESPONSE
+        self.view_function = view_function
+        self.pool = pool
+        self.ack_response = ack_response
+
+    def __call__(self, event, **kwargs):
+        self._get_pool().submit(self.view_function, event, kwargs)
+        return copy.deepcopy(self.ack_response)
+
+    async def call_async(self, event, **kwargs):
+        await self._get_pool().submit_async(self.view_function, event, kwargs)
+        return copy.deepcopy(self.ack_response)
+
+    def _get_pool(self):
+        if self.pool is None:
+            return get_deferred_pool()
+        return self.pool
+
+
+class QueueSink(object):
+
+    """
+    A sink that puts (event, response) tuples on a queue, such as a
+    queue.Queue, for a consumer of the application to deliver.
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+
+    def __call__(self, event, response):
+        self.queue.put((event, response))
+
+
+class HTTPSink(object):
+
+    """
+    A sink that posts responses as JSON to a URL.
+    """
+
+    def __init__(self, url, headers=None, timeout=10, get_body=None):
+        """
+        Init function for HTTPSink.
+
+        Args:
+
+            url (str): The URL to post responses to.
+            headers (dict): Extra headers to send.
+            timeout (float): The timeout of each post, in seconds.
+            get_body (callable): Called as ``get_body(event, response)`` to
+            build the JSON body. By default, the response is posted as is.
+
+        Returns:
+
+            An instance of HTTPSink
+        """
+        self.url = url
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.get_body = get_body
+
+    def __call__(self, event, response):
+        if self.get_body is not None:
+            body = self.get_body(event, response)
+        else:
+            body = response
+        headers = {'Content-Type': 'application/json'}
+        headers.update(self.headers)
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(body).encode('utf-8'),
+            headers=headers,
+            method='POST'
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+            resp.read()
+
+
+class DeferredPoolFullError(Exception):
+    pass
@@ -0,0 +1,805 @@
+"""
+.. module:: dispatch
+   :synopsis: Route lookup structures used by the omnibot routers.
+"""
+from collections import deque
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # pragma: no cover (python < 3.11)
+    import sre_parse
+
+
+_GROUP_DEFINITION = '(?P<{}>'
+_ROUTE_GROUP = '_r{}'
+_ROUTE_ARG_GROUP = '_r{}_{}'
+# The regex engine saves and restores the capture state of every branch
+# tried, so very long alternations get slower per branch; alternations are
+# split into chunks of at most this many routes.
+MAX_ALTERNATION_SIZE = 200
+
+
+class Matcher(object):
+
+    """
+    Base class for route matchers. A matcher is built from a list of
+    (compiled pattern, view function) tuples, in order of precedence, and
+    finds the first of those routes that matches a given text.
+    """
+
+    def match(self, text):
+        """
+        Find the first route that matches the given text.
+
+        Args:
+
+            text (str): The text to match against.
+
+        Returns:
+
+            A tuple of (kwargs, view_function) for the matched route, or None
+            if no route matched.
+        """
+        route_match = self.match_index(text)
+        if route_match is None:
+            return None
+        return route_match[1:]
+
+    def match_index(self, text):
+        """
+        Find the first route that matches the given text.
+
+        Args:
+
+            text (str): The text to match against.
+
+        Returns:
+
+            A tuple of (index, kwargs, view_function) for the matched route,
+            where index is the position of the route in the list the matcher
+            was built from, or None if no route matched.
+        """
+        raise NotImplementedError()
+
+
+class LinearMatcher(Matcher):
+
+    """
+    Match text against a list of routes by trying every route pattern in
+    registration order. This is the default matcher for
+    :class:`omnibot_receiver.router.OmnibotMessageRouter`.
+    """
+
+    def __init__(self, routes):
+        """
+        Init function for LinearMatcher.
+
+        Args:
+
+            routes (list): A list of (compiled pattern, view function) tuples,
+            in order of precedence.
+        """
+        self.routes = list(routes)
+
+    def match_index(self, text):
+        for index, (route_pattern, view_function) in enumerate(self.routes):
+            m = route_pattern.match(text)
+            if m:
+                return index, m.groupdict(), view_function
+        return None
+
+
+class CombinedMatcher(Matcher):
+
+    """
+    Match text against a list of routes with a single regex call, by merging
+    every route pattern into one alternation. Each route is followed by its
+    own empty marker group and its captured variables are renamed into a
+    per-route namespace, so the winning route and its arguments can be read
+    back from the match object. Alternation is tried left to right, so the
+    first registered route that matches still wins.
+
+    Patterns that can't be safely merged (patterns with backreferences or
+    global inline flags) are kept as standalone patterns, splitting the
+    alternation into chunks that are tried in order. Alternations are also
+    capped at MAX_ALTERNATION_SIZE routes each.
+
+    This removes the per-route Python overhead of matching, but not the
+    per-route regex work: a lookup makes one regex call per chunk (about
+    n / MAX_ALTERNATION_SIZE calls), and the regex engine still tries every
+    branch of each alternation, so lookup cost keeps growing linearly with
+    the number of routes, at roughly a quarter of the cost of linear
+    matching (see ``benchmarks/route_dispatch.py``).
+    """
+
+    def __init__(self, routes):
+        """
+        Init function for CombinedMatcher.
+
+        Args:
+
+            routes (list): A list of (compiled pattern, view function) tuples,
+            in order of precedence.
+        """
+        self.chunks = []
+        pending = []
+        for index, (route_pattern, view_function) in enumerate(routes):
+            namespaced = _namespace_pattern(route_pattern, index)
+            if namespaced is None:
+                self._flush(pending)
+                pending = []
+                self.chunks.append(
+                    _Standalone(index, route_pattern, view_function)
+                )
+            else:
+                pending.append(namespaced + (index, view_function))
+                if len(pending) == MAX_ALTERNATION_SIZE:
+                    self._flush(pending)
+                    pending = []
+        self._flush(pending)
+
+    def _flush(self, pending):
+        if pending:
+            self.chunks.append(_Alternation(pending))
+
+    def match_index(self, text):
+        for chunk in self.chunks:
+            route_match = chunk.match_index(text)
+            if route_match:
+                return route_match
+        return None
+
+
+class AdaptiveMatcher(Matcher):
+
+    """
+    Match text against a list of routes one pattern at a time, like
+    :class:`omnibot_receiver.dispatch.LinearMatcher`, but periodically
+    reorder the routes that are disjoint from every other route (no text
+    matches both) by how often they matched, so the hottest routes are tried
+    first.
+
+    Routes are disjoint if they're marked as such, or if the matcher can
+    prove it: routes whose patterns start with literal prefixes, none of
+    which is a prefix of another, can't match the same text. Since a text
+    matched by a disjoint route matches no other route, where it's tried
+    doesn't change which route wins. All other routes keep their
+    registration order relative to each other, so precedence between
+    overlapping routes is kept.
+
+    Hit counts are halved on every reorder, so the order follows changes in
+    traffic. Counts are updated without locking, so they're approximate
+    when several threads match at once.
+    """
+
+    def __init__(self, routes, disjoint=None, reorder_interval=1000):
+        """
+        Init function for AdaptiveMatcher.
+
+        Args:
+
+            routes (list): A list of (compiled pattern, view function) tuples,
+            in order of precedence.
+            disjoint (list): A bool per route, True for routes marked as
+            disjoint from every other route.
+            reorder_interval (int): The number of lookups between reorders.
+        """
+        self.routes = [
+            (index, route_pattern, view_function)
+            for index, (route_pattern, view_function) in enumerate(routes)
+        ]
+        proven = _find_disjoint(
+            [route_pattern for route_pattern, _ in routes]
+        )
+        if disjoint is None:
+            disjoint = proven
+        self.disjoint = [
+            marked or found for marked, found in zip(disjoint, proven)
+        ]
+        self.reorder_interval = reorder_interval
+        self.hits = [0] * len(self.routes)
+        self.order = tuple(self.routes)
+        self._lookups = 0
+
+    def match_index(self, text):
+        self._lookups += 1
+        if self._lookups >= self.reorder_interval:
+            self.reorder()
+        for index, route_pattern, view_function in self.order:
+            m = route_pattern.match(text)
+            if m:
+                self.hits[index] += 1
+                return index, m.groupdict(), view_function
+        return None
+
+    def reorder(self):
+        """
+        Reorder the routes by their hit counts, and halve the counts.
+        """
+        self._lookups = 0
+        hits = self.hits
+        fixed = [
+            index for index, disjoint in enumerate(self.disjoint)
+            if not disjoint
+        ]
+        free = sorted(
+            (index for index, disjoint in enumerate(self.disjoint)
+             if disjoint),
+            key=lambda index: -hits[index]
+        )
+        order = []
+        # Merge the disjoint routes, hottest first, into the overlapping
+        # routes, which keep their order.
+        while fixed and free:
+            if (hits[free[0]], -free[0]) > (hits[fixed[0]], -fixed[0]):
+                order.append(free.pop(0))
+            else:
+                order.append(fixed.pop(0))
+        order.extend(fixed)
+        order.extend(free)
+        self.order = tuple(self.routes[index] for index in order)
+        self.hits = [count // 2 for count in hits]
+
+
+class _IndexedMatcher(Matcher):
+
+    def _set_fallback(self, fallback_class, routes, indexes, route_count):
+        self.fallback = fallback_class(routes)
+        self.fallback_indexes = indexes
+        self.first_fallback = _index_or_last(
+            indexes[0] if indexes else None,
+            route_count
+        )
+
+    def _literal_candidates(self, text):
+        candidates = []
+        literal = self.literals.get(text)
+        if literal:
+            candidates.append(literal)
+        # $ also matches right before a trailing newline.
+        if text.endswith('\n'):
+            literal = self.literals.get(text[:-1])
+            if literal:
+                candidates.append(literal)
+        return candidates
+
+    def _match_fallback(self, text):
+        route_match = self.fallback.match_index(text)
+        if route_match is None:
+            return None
+        return (self.fallback_indexes[route_match[0]],) + route_match[1:]
+
+    def _match_candidates(self, candidates, text):
+        """
+        Match the candidates, sorted by index, and the fallback routes, in
+        registration order.
+        """
+        fallback_checked = False
+        fallback_match = None
+        for candidate in candidates:
+            if not fallback_checked and candidate[0] > self.first_fallback:
+                fallback_match = self._match_fallback(text)
+                fallback_checked = True
+            if fallback_match and fallback_match[0] < candidate[0]:
+                return fallback_match
+            route_match = _match_candidate(candidate, text)
+            if route_match:
+                return route_match
+        if not fallback_checked:
+            fallback_match = self._match_fallback(text)
+        return fallback_match
+
+
+class LiteralMatcher(_IndexedMatcher):
+
+    """
+    Match text against a list of routes, finding purely literal routes
+    (``white_check_mark``) with a single dict lookup. All other routes are
+    kept in a fallback matcher, which is only tried if no literal route
+    matched, or if a fallback route was registered before the literal route
+    that matched.
+    """
+
+    def __init__(self, routes, fallback_class=LinearMatcher):
+        """
+        Init function for LiteralMatcher.
+
+        Args:
+
+            routes (list): A list of (compiled pattern, view function) tuples,
+            in order of precedence.
+            fallback_class (class): The matcher class used for routes that
+            aren't purely literal.
+        """
+        self.literals = {}
+        fallback_routes = []
+        fallback_indexes = []
+        for index, (route_pattern, view_function) in enumerate(routes):
+            literal, is_literal = _literal_prefix(route_pattern)
+            if is_literal:
+                self.literals.setdefault(
+                    literal,
+                    (index, None, view_function)
+                )
+            else:
+                fallback_routes.append((route_pattern, view_function))
+                fallback_indexes.append(index)
+        self._set_fallback(
+            fallback_class,
+            fallback_routes,
+            fallback_indexes,
+            len(routes)
+        )
+
+    def match_index(self, text):
+        literal = self.literals.get(text)
+        if (literal and literal[0] < self.first_fallback and
+                not text.endswith('\n')):
+            return literal[0], {}, literal[2]
+        candidates = self._literal_candidates(text)
+        literal = min(candidates, key=_by_index) if candidates else None
+        if literal is None or literal[0] > self.first_fallback:
+            fallback_match = self._match_fallback(text)
+            if literal is None or (fallback_match and
+                                   fallback_match[0] < literal[0]):
+                return fallback_match
+        return literal[0], {}, literal[2]
+
+
+class LiteralPrefixMatcher(_IndexedMatcher):
+
+    """
+    Match text against a list of routes, using the literal parts of the
+    route patterns to avoid running most of them. Every route is analysed
+    when the matcher is built:
+
+    * Purely literal routes (``ping``) are stored in a dict, and are found
+      with a single lookup.
+    * Routes that start with a literal prefix (``deploy <service>``) are
+      stored in a trie of space separated words, so only the routes whose
+      prefix matches the start of the text are tried.
+    * All other routes are tried with a fallback matcher.
+
+    Candidates are resolved in registration order, so the first registered
+    route that matches still wins.
+    """
+
+    def __init__(self, routes, fallback_class=LinearMatcher):
+        """
+        Init function for LiteralPrefixMatcher.
+
+        Args:
+
+            routes (list): A list of (compiled pattern, view function) tuples,
+            in order of precedence.
+            fallback_class (class): The matcher class used for routes without
+            a literal prefix.
+        """
+        self.literals = {}
+        self.trie = _TrieNode()
+        self.depth = 0
+        fallback_routes = []
+        fallback_indexes = []
+        first_non_literal = None
+        for index, (route_pattern, view_function) in enumerate(routes):
+            prefix, is_literal = _literal_prefix(route_pattern)
+            if is_literal:
+                self.literals.setdefault(prefix, (index, None, view_function))
+                continue
+            if first_non_literal is None:
+                first_non_literal = index
+            if prefix:
+                self._insert(prefix, (index, route_pattern, view_function))
+            else:
+                fallback_routes.append((route_pattern, view_function))
+                fallback_indexes.append(index)
+        self._set_fallback(
+            fallback_class,
+            fallback_routes,
+            fallback_indexes,
+            len(routes)
+        )
+        self.first_non_literal = _index_or_last(
+            first_non_literal,
+            len(routes)
+        )
+
+    def _insert(self, prefix, route):
+        words = prefix.split(' ')
+        node = self.trie
+        for word in words[:-1]:
+            node = node.children.setdefault(word, _TrieNode())
+        node.routes.append((words[-1],) + route)
+        self.depth = max(self.depth, len(words) - 1)
+
+    def match_index(self, text):
+        literal = self.literals.get(text)
+        if (literal and literal[0] < self.first_non_literal and
+                not text.endswith('\n')):
+            return literal[0], {}, literal[2]
+        candidates = self._literal_candidates(text)
+        candidates.extend(self._prefix_candidates(text))
+        candidates.sort(key=_by_index)
+        return self._match_candidates(candidates, text)
+
+    def _prefix_candidates(self, text):
+        candidates = []
+        node = self.trie
+        offset = 0
+        # Routes are only checked at nodes reached through words that are
+        # followed by a space in the text, so the last word is never walked.
+        for word in text.split(' ', self.depth):
+            for remainder, index, route_pattern, view_function in node.routes:
+                if text.startswith(remainder, offset):
+                    candidates.append((index, route_pattern, view_function))
+            node = node.children.get(word)
+            if node is None:
+                break
+            offset += len(word) + 1
+        return candidates
+
+
+class SubstringFilterMatcher(_IndexedMatcher):
+
+    """
+    Match text against a list of routes, only trying the routes whose
+    required literal text appears in it. Every route pattern is analysed
+    when the matcher is built, for the longest run of literal text that
+    every match has to contain (``deploy`` for ``.*deploy <service>.*``),
+    and a single Aho-Corasick scan of the text finds the routes whose
+    literal it contains. Texts that contain none of the literals are only
+    matched against the routes without one, which are kept in a fallback
+    matcher.
+
+    Candidates are resolved in registration order, so the first registered
+    route that matches still wins.
+    """
+
+    def __init__(self, routes, fallback_class=LinearMatcher):
+        """
+        Init function for SubstringFilterMatcher.
+
+        Args:
+
+            routes (list): A list of (compiled pattern, view function) tuples,
+            in order of precedence.
+            fallback_class (class): The matcher class used for routes without
+            a required literal.
+        """
+        literals = {}
+        fallback_routes = []
+        fallback_indexes = []
+        for index, (route_pattern, view_function) in enumerate(routes):
+            literal = _required_literal(route_pattern)
+            if literal:
+                literals.setdefault(literal, []).append(
+                    (index, route_pattern, view_function)
+                )
+            else:
+                fallback_routes.append((route_pattern, view_function))
+                fallback_indexes.append(index)
+        self.automaton = _Automaton(literals)
+        self._set_fallback(
+            fallback_class,
+            fallback_routes,
+            fallback_indexes,
+            len(routes)
+        )
+
+    def match_index(self, text):
+        candidates = self.automaton.scan(text)
+        if len(candidates) > 1:
+            candidates.sort(key=_by_index)
+        return self._match_candidates(candidates, text)
+
+
+class _Automaton(object):
+
+    """
+    An Aho-Corasick automaton, which finds every given literal that appears
+    in a text in a single pass over it.
+    """
+
+    __slots__ = ('goto', 'fail', 'outputs')
+
+    def __init__(self, literals):
+        """
+        Init function for _Automaton.
+
+        Args:
+
+            literals (dict): Literals, mapped to a list of values to output
+            when they appear in a text.
+        """
+        goto = [{}]
+        outputs = [()]
+        for literal, values in literals.items():
+            state = 0
+            for char in literal:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append(())
+                state = next_state
+            outputs[state] += tuple(values)
+        fail = [0] * len(goto)
+        # Breadth first, so the failure state of every state is built before
+        # the states it leads to.
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fallback = goto[fallback].get(char, 0)
+                if fallback == next_state:
+                    fallback = 0
+                fail[next_state] = fallback
+                outputs[next_state] += outputs[fallback]
+        self.goto = goto
+        self.fail = fail
+        self.outputs = outputs
+
+    def scan(self, text):
+        """
+        Find the values of the literals that appear in the text.
+
+        Returns:
+
+            A list of the values, without duplicates.
+        """
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        found = {}
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                for value in outputs[state]:
+                    found[value[0]] = value
+        return list(found.values())
+
+
+class _TrieNode(object):
+
+    __slots__ = ('children', 'routes')
+
+    def __init__(self):
+        self.children = {}
+        self.routes = []
+
+
+def _by_index(candidate):
+    return candidate[0]
+
+
+def _index_or_last(index, route_count):
+    if index is None:
+        return route_count
+    return index
+
+
+def _match_candidate(candidate, text):
+    index, route_pattern, view_function = candidate
+    if route_pattern is None:
+        # A literal route, which has already been matched exactly.
+        return index, {}, view_function
+    m = route_pattern.match(text)
+    if not m:
+        return None
+    return index, m.groupdict(), view_function
+
+
+class _Standalone(object):
+
+    def __init__(self, index, route_pattern, view_function):
+        self.index = index
+        self.pattern = route_pattern
+        self.view_function = view_function
+
+    def match_index(self, text):
+        m = self.pattern.match(text)
+        if not m:
+            return None
+        return self.index, m.groupdict(), self.view_function
+
+
+class _Alternation(object):
+
+    def __init__(self, pending):
+        self.pattern = re.compile(
+            '|'.join(branch for branch, _, _, _, _ in pending)
+        )
+        self.routes = {}
+        for _, group_name, arg_groups, index, view_function in pending:
+            group_index = self.pattern.groupindex[group_name]
+            self.routes[group_index] = (index, arg_groups, view_function)
+
+    def match_index(self, text):
+        m = self.pattern.match(text)
+        if not m:
+            return None
+        # The marker group ends its branch, so it's the last group to be
+        # closed.
+        index, arg_groups, view_function = self.routes[m.lastindex]
+        kwargs = {}
+        for name, group_name in arg_groups:
+            kwargs[name] = m.group(group_name)
+        return index, kwargs, view_function
+
+
+def _namespace_pattern(route_pattern, index):
+    """
+    Rewrite a route pattern into a branch of a combined alternation, with the
+    route followed by its own marker group and its named groups renamed with
+    a per-route prefix.
+
+    Returns:
+
+        A tuple of (branch regex, route group name, ((arg name, arg group
+        name), ...)), or None if the pattern can't be merged.
+    """
+    if route_pattern.flags & ~re.UNICODE:
+        # Global inline flags would leak into every other branch.
+        return None
+    if _has_group_references(route_pattern.pattern):
+        # Renumbering groups would break backreferences and conditionals.
+        return None
+    branch = route_pattern.pattern
+    arg_groups = []
+    for name in route_pattern.groupindex:
+        group_name = _ROUTE_ARG_GROUP.format(index, name)
+        branch = branch.replace(
+            _GROUP_DEFINITION.format(name),
+            _GROUP_DEFINITION.format(group_name),
+        )
+        arg_groups.append((name, group_name))
+    group_name = _ROUTE_GROUP.format(index)
+    branch = '(?:{}){})'.format(branch, _GROUP_DEFINITION.format(group_name))
+    try:
+        compiled = re.compile(branch)
+    except re.error:
+        return None
+    if compiled.groups != route_pattern.groups + 1:
+        return None
+    return branch, group_name, tuple(arg_groups)
+
+
+def _has_group_references(pattern):
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return True
+    return _contains_op(
+        parsed,
+        (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS)
+    )
+
+
+def _contains_op(items, ops):
+    for op, av in items:
+        if op in ops:
+            return True
+        for sub in _subpatterns(op, av):
+            if _contains_op(sub, ops):
+                return True
+    return False
+
+
+def _subpatterns(op, av):
+    if op == sre_parse.BRANCH:
+        return av[1]
+    if op == sre_parse.SUBPATTERN:
+        return [av[-1]]
+    if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT,
+              getattr(sre_parse, 'POSSESSIVE_REPEAT', None)):
+        return [av[2]]
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [av[1]]
+    if op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+        return [av]
+    return []
+
+
+def _literal_prefix(route_pattern):
+    """
+    Find the literal text every match of a route pattern has to start with.
+
+    Returns:
+
+        A tuple of (prefix, is_literal), where is_literal is True if the
+        pattern matches nothing but the prefix itself.
+    """
+    if route_pattern.flags & ~re.UNICODE:
+        return '', False
+    try:
+        items = list(sre_parse.parse(route_pattern.pattern))
+    except re.error:
+        return '', False
+    if not items or items[0] != (sre_parse.AT, sre_parse.AT_BEGINNING):
+        return '', False
+    chars = []
+    for op, av in items[1:]:
+        if op != sre_parse.LITERAL:
+            break
+        chars.append(chr(av))
+    rest = items[len(chars) + 1:]
+    is_literal = rest == [(sre_parse.AT, sre_parse.AT_END)]
+    return ''.join(chars), is_literal
+
+
+def _find_disjoint(route_patterns):
+    """
+    Find the route patterns that can't match the same text as any other
+    pattern of the list: patterns with a literal prefix, when every pattern
+    has one and none of them is a prefix of another.
+
+    Returns:
+
+        A list of bools, True for each pattern proven disjoint.
+    """
+    prefixes = [
+        _literal_prefix(route_pattern)[0]
+        for route_pattern in route_patterns
+    ]
+    disjoint = [False] * len(prefixes)
+    if not all(prefixes):
+        # A pattern without a literal prefix may match anything.
+        return disjoint
+    disjoint = [True] * len(prefixes)
+    # In sorted order, the prefixes that start with a given prefix directly
+    # follow it, so a stack of the prefixes being extended finds them all.
+    stack = []
+    for index in sorted(range(len(prefixes)), key=prefixes.__getitem__):
+        while stack and not prefixes[index].startswith(prefixes[stack[-1]]):
+            stack.pop()
+        if stack:
+            disjoint[index] = False
+            disjoint[stack[-1]] = False
+        stack.append(index)
+    return disjoint
+
+
+def _required_literal(route_pattern):
+    """
+    Find the longest run of literal text that every match of a route
+    pattern has to contain.
+
+    Returns:
+
+        The literal, or an empty string if there's none.
+    """
+    if route_pattern.flags & ~re.UNICODE:
+        # Case insensitive and other global flags change what matches.
+        return ''
+    try:
+        items = sre_parse.parse(route_pattern.pattern)
+    except re.error:
+        return ''
+    runs = ['']
+    _collect_literal_runs(items, runs)
+    return max(runs, key=len)
+
+
+def _collect_literal_runs(items, runs):
+    """
+    Collect the runs of consecutive literal characters of a parsed pattern
+    in runs, whose last item is the run in progress. Plain groups are
+    concatenated with their surroundings; any other item ends the run.
+    """
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            runs[-1] += chr(av)
+        elif op == sre_parse.SUBPATTERN and not av[1] and not av[2]:
+            # A group without inline flags.
+            _collect_literal_runs(av[-1], runs)
+        else:
+            runs.append('')
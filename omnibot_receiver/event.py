@@ -0,0 +1,265 @@
+"""
+.. module:: event
+   :synopsis: Read-only wrappers of the events sent by omnibot.
+"""
+from collections.abc import Mapping
+import re
+
+_MENTION_RE = re.compile(r'<@([UW][A-Z0-9]+)(?:\|[^>]*)?>')
+
+
+def get_channel_id(payload):
+    """
+    Get the id of the channel an event happened in, from its channel_id, or
+    from the id of its channel object.
+
+    Args:
+
+        payload (dict): An event sent by omnibot.
+
+    Returns:
+
+        The channel id, or None.
+    """
+    channel_id = payload.get('channel_id')
+    if channel_id is None:
+        channel = payload.get('channel')
+        if isinstance(channel, Mapping):
+            channel_id = channel.get('id')
+    return channel_id
+
+
+class _memoized(object):
+
+    """
+    A property that is computed on first access and stored in the given
+    slot of the instance.
+    """
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __call__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+        return self
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        try:
+            return getattr(instance, self.slot)
+        except AttributeError:
+            value = self.func(instance)
+            setattr(instance, self.slot, value)
+            return value
+
+
+class OmnibotEvent(Mapping):
+
+    """
+    A read-only wrapper of an event sent by omnibot, with properties for the
+    fields routes commonly need, computed once per event. It is a mapping of
+    the event's fields, so it can be passed to the routers, and to routes
+    written for plain dicts, in place of the event.
+
+    .. code-block:: python
+
+        from omnibot_receiver.event import OmnibotEvent
+
+        event = OmnibotEvent.from_payload(request.get_json())
+        ret = router.handle_event(event)
+
+    Use :func:`omnibot_receiver.event.OmnibotEvent.from_payload` to get an
+    instance of the class matching the event's payload type.
+    """
+
+    __slots__ = ('payload', '_channel_id', '_user_id')
+
+    def __init__(self, payload):
+        """
+        Init function for OmnibotEvent.
+
+        Args:
+
+            payload (dict): The decoded event sent by omnibot.
+
+        Returns:
+
+            An instance of OmnibotEvent
+        """
+        self.payload = payload
+
+    @staticmethod
+    def from_payload(payload):
+        """
+        Wrap a decoded event in the class matching its payload type; events
+        that are already wrapped are returned as is.
+
+        Args:
+
+            payload (dict): The decoded event sent by omnibot.
+
+        Returns:
+
+            An instance of :class:`omnibot_receiver.event.OmnibotMessage`,
+            :class:`omnibot_receiver.event.OmnibotInteractiveComponent` or
+            :class:`omnibot_receiver.event.OmnibotEvent`.
+        """
+        if isinstance(payload, OmnibotEvent):
+            return payload
+        event_class = _EVENT_CLASSES.get(
+            payload.get('omnibot_payload_type'),
+            OmnibotEvent
+        )
+        return event_class(payload)
+
+    def __getitem__(self, key):
+        return self.payload[key]
+
+    def __iter__(self):
+        return iter(self.payload)
+
+    def __len__(self):
+        return len(self.payload)
+
+    def __contains__(self, key):
+        return key in self.payload
+
+    def get(self, key, default=None):
+        return self.payload.get(key, default)
+
+    def __eq__(self, other):
+        if isinstance(other, OmnibotEvent):
+            other = other.payload
+        return self.payload == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.payload)
+
+    def __reduce__(self):
+        return (type(self), (self.payload,))
+
+    @property
+    def payload_type(self):
+        """
+        The omnibot_payload_type of the event.
+        """
+        return self.payload.get('omnibot_payload_type')
+
+    @_memoized('_channel_id')
+    def channel_id(self):
+        """
+        The id of the channel the event happened in, or None.
+        """
+        return get_channel_id(self.payload)
+
+    @_memoized('_user_id')
+    def user_id(self):
+        """
+        The id of the user that triggered the event, or None.
+        """
+        user = self.payload.get('user')
+        if isinstance(user, Mapping):
+            return user.get('id')
+        return user
+
+
+class OmnibotMessage(OmnibotEvent):
+
+    """
+    A message or reaction event sent by omnibot; see
+    :class:`omnibot_receiver.event.OmnibotEvent`.
+    """
+
+    __slots__ = ('_mentioned_user_ids',)
+
+    @property
+    def match_type(self):
+        """
+        The match type of the message: command, regex or reaction.
+        """
+        return self.payload.get('match_type')
+
+    @property
+    def args(self):
+        """
+        The text the message is routed on.
+        """
+        return self.payload.get('args', '')
+
+    @property
+    def text(self):
+        """
+        The text of the message, as sent by slack.
+        """
+        return self.payload.get('text', '')
+
+    @property
+    def ts(self):
+        """
+        The timestamp of the message.
+        """
+        return self.payload.get('ts')
+
+    @property
+    def thread_ts(self):
+        """
+        The timestamp of the thread the message was sent in, or None.
+        """
+        return self.payload.get('thread_ts')
+
+    @property
+    def reply_thread_ts(self):
+        """
+        The timestamp to reply to the message in a thread with: the message's
+        thread, or the message itself if it isn't in a thread.
+        """
+        return self.payload.get('thread_ts') or self.payload.get('ts')
+
+    @_memoized('_mentioned_user_ids')
+    def mentioned_user_ids(self):
+        """
+        The ids of the users mentioned in the text of the message, in order.
+        """
+        return tuple(_MENTION_RE.findall(self.text or ''))
+
+
+class OmnibotInteractiveComponent(OmnibotEvent):
+
+    """
+    An interactive component event sent by omnibot; see
+    :class:`omnibot_receiver.event.OmnibotEvent`.
+    """
+
+    __slots__ = ()
+
+    @property
+    def callback_id(self):
+        """
+        The callback_id of the interactive component.
+        """
+        return self.payload.get('callback_id')
+
+    @property
+    def type(self):
+        """
+        The event type of the interactive component.
+        """
+        return self.payload.get('type')
+
+    @property
+    def actions(self):
+        """
+        The actions the user took on the interactive component.
+        """
+        return self.payload.get('actions', [])
+
+
+_EVENT_CLASSES = {
+    'message': OmnibotMessage,
+    'reaction': OmnibotMessage,
+    'interactive_component': OmnibotInteractiveComponent,
+}
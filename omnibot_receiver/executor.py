@@ -0,0 +1,415 @@
+"""
+.. module:: executor
+   :synopsis: Running routes outside of the router's process.
+"""
+import asyncio
+import concurrent.futures
+import copy
+import importlib
+import inspect
+import logging
+import threading
+
+DEFAULT_TIMEOUT_RESPONSE = {'actions': []}
+
+logger = logging.getLogger(__name__)
+
+
+class TimeoutResponse(dict):
+
+    """
+    A timeout response returned in place of the response of a route that
+    exceeded its timeout, marked so that it isn't mistaken for (and cached
+    as) the route's response.
+    """
+
+    __slots__ = ()
+
+
+class _SharedPool(object):
+
+    """
+    A lazily created executor, shared by the routes of every router.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._factory()
+            return self._pool
+
+    def set(self, pool):
+        with self._lock:
+            self._pool = pool
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+_process_pool = _SharedPool(concurrent.futures.ProcessPoolExecutor)
+_thread_pool = _SharedPool(concurrent.futures.ThreadPoolExecutor)
+
+
+def get_process_pool():
+    """
+    Get the process pool that routes registered with ``executor='process'``
+    run on, creating a ProcessPoolExecutor with a worker per CPU if no pool
+    has been set.
+    """
+    return _process_pool.get()
+
+
+def set_process_pool(pool):
+    """
+    Set the process pool that routes registered with ``executor='process'``
+    run on. The previous pool is not shut down.
+
+    Args:
+
+        pool (concurrent.futures.Executor): The pool to use, or None to
+        create a default pool on next use.
+    """
+    _process_pool.set(pool)
+
+
+def shutdown_process_pool(wait=True):
+    """
+    Shut down the process pool that routes registered with
+    ``executor='process'`` run on, if it has been created.
+    """
+    _process_pool.shutdown(wait=wait)
+
+
+def get_thread_pool():
+    """
+    Get the thread pool that routes with a timeout run on, unless their
+    router has a timeout pool of its own, creating a ThreadPoolExecutor if no
+    pool has been set. Routes that exceed their timeout keep a thread of this
+    pool until they finish, so size it for the number of events handled at
+    once, plus the routes expected to overrun.
+    """
+    return _thread_pool.get()
+
+
+def set_thread_pool(pool):
+    """
+    Set the thread pool that routes with a timeout run on. The previous pool
+    is not shut down.
+
+    Args:
+
+        pool (concurrent.futures.Executor): The pool to use, or None to
+        create a default pool on next use.
+    """
+    _thread_pool.set(pool)
+
+
+def shutdown_thread_pool(wait=True):
+    """
+    Shut down the thread pool that routes with a timeout run on, if it has
+    been created.
+    """
+    _thread_pool.shutdown(wait=wait)
+
+
+def wrap_route(view_function, executor=None, timeout=None,
+               timeout_response=None, timeout_pool=None):
+    """
+    Wrap a route function so that it runs on the given executor, within the
+    given time budget.
+
+    Args:
+
+        view_function (function): The route function.
+        executor: None to call the route in the router's thread, ``'process'``
+        to run it on the shared process pool (see
+        :func:`omnibot_receiver.executor.get_process_pool`), or an instance of
+        concurrent.futures.Executor.
+        timeout (float): If set, the number of seconds the router waits for
+        the route; see :class:`omnibot_receiver.executor.DeadlineRoute`.
+        timeout_response (dict): The response to return when the route
+        exceeds its timeout. Defaults to an empty list of actions.
+        timeout_pool (concurrent.futures.Executor): The thread pool to run
+        the route on, if it has a timeout. Defaults to the shared pool; see
+        :func:`omnibot_receiver.executor.get_thread_pool`.
+    """
+    if executor is None:
+        pass
+    elif executor == 'process':
+        view_function = ExecutorRoute(view_function)
+    elif isinstance(executor, concurrent.futures.Executor):
+        view_function = ExecutorRoute(view_function, executor)
+    else:
+        raise ValueError(
+            "executor must be None, 'process' or an Executor, "
+            "not {!r}.".format(executor)
+        )
+    if timeout is not None:
+        view_function = DeadlineRoute(
+            view_function,
+            timeout,
+            timeout_response,
+            timeout_pool
+        )
+    return view_function
+
+
+class WrappedRoute(object):
+
+    """
+    Base class of route functions wrapped by
+    :func:`omnibot_receiver.executor.wrap_route`, which the router's async
+    entry points await through ``call_async``.
+    """
+
+    __slots__ = ()
+
+    def __call__(self, *args, **kwargs):
+        raise NotImplementedError()
+
+    async def call_async(self, *args, **kwargs):
+        raise NotImplementedError()
+
+
+class ExecutorRoute(WrappedRoute):
+
+    """
+    A route function run on an executor, and waited for by the router. The
+    function is sent to the executor by import path, so it must be defined
+    at the top level of a module; the message and arguments must be
+    picklable.
+    """
+
+    __slots__ = ('view_function', 'import_path', 'executor')
+
+    def __init__(self, view_function, executor=None):
+        """
+        Init function for ExecutorRoute.
+
+        Args:
+
+            view_function (function): The route function.
+            executor (concurrent.futures.Executor): The executor to run the
+            route on. By default, the shared process pool is used.
+
+        Returns:
+
+            An instance of ExecutorRoute
+        """
+        self.view_function = view_function
+        self.import_path = _get_import_path(view_function)
+        self.executor = executor
+
+    def __call__(self, *args, **kwargs):
+        return self.submit(*args, **kwargs).result()
+
+    async def call_async(self, *args, **kwargs):
+        """
+        Run the route, waiting for its result without blocking the event
+        loop.
+        """
+        return await asyncio.wrap_future(self.submit(*args, **kwargs))
+
+    def submit(self, *args, **kwargs):
+        """
+        Submit the route to its executor.
+
+        Returns:
+
+            A concurrent.futures.Future of the route's response.
+        """
+        executor = self.executor
+        if executor is None:
+            executor = get_process_pool()
+        return executor.submit(
+            call_by_import_path,
+            self.import_path,
+            args,
+            kwargs
+        )
+
+
+class DeadlineRoute(WrappedRoute):
+
+    """
+    A route function with a time budget. If the route doesn't respond within
+    its timeout, the router returns a copy of the timeout response instead,
+    and counts the timeout. Regular routes are run on a thread pool (by
+    default, the shared pool; see
+    :func:`omnibot_receiver.executor.get_thread_pool`) and finish in the
+    background, with their errors logged; async routes are cancelled.
+
+    The time budget of routes run on a thread pool starts when a thread
+    picks them up, so that time spent waiting for a free thread doesn't
+    count against it; routes run on an executor of their own are timed from
+    when they are submitted.
+    """
+
+    __slots__ = (
+        'view_function',
+        'timeout',
+        'timeout_response',
+        'pool',
+        'timeouts',
+        '_lock',
+    )
+
+    def __init__(self, view_function, timeout, timeout_response=None,
+                 pool=None):
+        """
+        Init function for DeadlineRoute.
+
+        Args:
+
+            view_function (function): The route function.
+            timeout (float): The number of seconds to wait for the route.
+            timeout_response (dict): The response to return when the route
+            exceeds its timeout. Defaults to an empty list of actions.
+            pool (concurrent.futures.Executor): The thread pool to run the
+            route on. Defaults to the shared pool.
+
+        Returns:
+
+            An instance of DeadlineRoute
+        """
+        if timeout_response is None:
+            timeout_response = DEFAULT_TIMEOUT_RESPONSE
+        self.view_function = view_function
+        self.timeout = timeout
+        self.timeout_response = timeout_response
+        self.pool = pool
+        self.timeouts = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        started = threading.Event()
+        future = self._submit(started.set, args, kwargs)
+        started.wait()
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.add_done_callback(_log_late_error)
+            return self._timed_out()
+
+    async def call_async(self, *args, **kwargs):
+        future = None
+        if inspect.iscoroutinefunction(self.view_function):
+            awaitable = self.view_function(*args, **kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            started = loop.create_future()
+            future = self._submit(
+                lambda: loop.call_soon_threadsafe(_set_started, started),
+                args,
+                kwargs
+            )
+            await started
+            awaitable = asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(awaitable, self.timeout)
+        except asyncio.TimeoutError:
+            if future is not None:
+                future.add_done_callback(_log_late_error)
+            return self._timed_out()
+
+    def _submit(self, on_start, args, kwargs):
+        if isinstance(self.view_function, ExecutorRoute):
+            on_start()
+            return self.view_function.submit(*args, **kwargs)
+        pool = self.pool
+        if pool is None:
+            pool = get_thread_pool()
+        return pool.submit(self._run, on_start, args, kwargs)
+
+    def _run(self, on_start, args, kwargs):
+        on_start()
+        return self.view_function(*args, **kwargs)
+
+    def _timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+        response = copy.deepcopy(self.timeout_response)
+        if isinstance(response, dict):
+            response = TimeoutResponse(response)
+        return response
+
+
+def _set_started(started):
+    if not started.done():
+        started.set_result(None)
+
+
+def _log_late_error(future):
+    """
+    Log the error of a route that raised after exceeding its timeout, as
+    nobody waits for it anymore.
+    """
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(
+            'Route failed after exceeding its timeout.',
+            exc_info=future.exception()
+        )
+
+
+async def call_route_async(view_function, *args, **kwargs):
+    """
+    Call a route function, and await its result if it's awaitable, so that
+    async and regular functions can be routed to alike. Wrapped routes are
+    awaited through their call_async function, so that routes run on an
+    executor are waited for without blocking the event loop.
+    """
+    if isinstance(view_function, WrappedRoute):
+        return await view_function.call_async(*args, **kwargs)
+    ret = view_function(*args, **kwargs)
+    if inspect.isawaitable(ret):
+        ret = await ret
+    return ret
+
+
+def call_by_import_path(import_path, args, kwargs):
+    """
+    Import a function from a ``module:qualified.name`` path and call it,
+    running it to completion if it's a coroutine function.
+    """
+    module_name, _, qualname = import_path.partition(':')
+    view_function = importlib.import_module(module_name)
+    for name in qualname.split('.'):
+        view_function = getattr(view_function, name)
+    while isinstance(view_function, WrappedRoute):
+        view_function = view_function.view_function
+    return call_to_completion(view_function, *args, **kwargs)
+
+
+def call_to_completion(view_function, *args, **kwargs):
+    """
+    Call a route function outside of an event loop, running its result on a
+    new event loop if it's awaitable.
+    """
+    ret = view_function(*args, **kwargs)
+    if inspect.isawaitable(ret):
+        loop = asyncio.new_event_loop()
+        try:
+            ret = loop.run_until_complete(ret)
+        finally:
+            loop.close()
+    return ret
+
+
+def _get_import_path(view_function):
+    module_name = getattr(view_function, '__module__', None)
+    qualname = getattr(view_function, '__qualname__', None)
+    if not module_name or not qualname or '<' in qualname:
+        raise ValueError(
+            '{!r} can not be run on an executor, as it can not be imported; '
+            'routes run on an executor must be defined at the top level of '
+            'a module.'.format(view_function)
+        )
+    return '{}:{}'.format(module_name, qualname)
@@ -0,0 +1,226 @@
+"""
+.. module:: explain
+   :synopsis: Explanation and profiling of route matching.
+"""
+from collections import namedtuple
+import random
+import threading
+import time
+
+PatternAttempt = namedtuple('PatternAttempt', ['rule', 'matched', 'seconds'])
+PatternAttempt.__doc__ = """
+The match of a route pattern against a message.
+
+Attributes:
+
+    rule (str): The rule of the route.
+    matched (bool): Whether the pattern matched.
+    seconds (float): The time spent in the pattern's match().
+"""
+
+MatchExplanation = namedtuple(
+    'MatchExplanation',
+    ['text', 'match_type', 'attempts', 'winner']
+)
+MatchExplanation.__doc__ = """
+How the routes of a match type matched a message.
+
+Attributes:
+
+    text (str): The text that was matched.
+    match_type (str): The match type of the routes.
+    attempts (tuple): A :class:`omnibot_receiver.explain.PatternAttempt` per
+    route, in registration order.
+    winner (str): The rule of the route the message is routed to, or None if
+    no route matched.
+"""
+
+PatternStats = namedtuple(
+    'PatternStats',
+    ['match_type', 'rule', 'tries', 'matches', 'wins', 'total_seconds',
+     'max_seconds']
+)
+PatternStats.__doc__ = """
+The profile of a route pattern over a sampling window.
+
+Attributes:
+
+    match_type (str): The match type of the route.
+    rule (str): The rule of the route.
+    tries (int): The number of sampled messages it was matched against.
+    matches (int): The number of those it matched.
+    wins (int): The number of those routed to it; a pattern that matches but
+    never wins is shadowed by an earlier route.
+    total_seconds (float): The time spent in its match().
+    max_seconds (float): The longest time spent in a single match().
+"""
+
+ProfileReport = namedtuple(
+    'ProfileReport',
+    ['messages', 'most_expensive', 'never_matched']
+)
+ProfileReport.__doc__ = """
+A report of a :class:`omnibot_receiver.explain.MatchProfiler`.
+
+Attributes:
+
+    messages (int): The number of sampled messages.
+    most_expensive (list): The PatternStats of the patterns that took the
+    most time, most expensive first.
+    never_matched (list): The PatternStats of the patterns that matched no
+    sampled message, most tried first.
+"""
+
+
+def explain_match(routes, text, match_type):
+    """
+    Match a message against every route of a match type, one pattern at a
+    time, timing each pattern.
+
+    Every pattern is tried, including those registered after the route that
+    wins, which dispatch doesn't try, so that patterns shadowed by earlier
+    routes are found too. Patterns are matched one by one, whatever the
+    matcher of the router, so timings are those of linear dispatch.
+
+    Args:
+
+        routes (list): The :class:`omnibot_receiver.router.MessageRoute`
+        tuples of the match type, in registration order.
+        text (str): The text to match.
+        match_type (str): The match type of the routes.
+
+    Returns:
+
+        A :class:`omnibot_receiver.explain.MatchExplanation`.
+    """
+    attempts = []
+    winner = None
+    for route in routes:
+        start = time.perf_counter()
+        matched = route.pattern.match(text) is not None
+        seconds = time.perf_counter() - start
+        attempts.append(PatternAttempt(route.help.title, matched, seconds))
+        if matched and winner is None:
+            winner = route.help.title
+    return MatchExplanation(text, match_type, tuple(attempts), winner)
+
+
+class MatchProfiler(object):
+
+    """
+    A profiler of the route patterns of an
+    :class:`omnibot_receiver.router.OmnibotMessageRouter`. A sample of the
+    messages the router resolves is explained (see
+    :func:`omnibot_receiver.explain.explain_match`), and the timings of each
+    pattern are aggregated until the profiler is reset, to find the patterns
+    to reorder or rewrite.
+
+    .. code-block:: python
+
+        from omnibot_receiver.explain import MatchProfiler
+
+        profiler = MatchProfiler(sample_rate=0.01)
+        message_router = OmnibotMessageRouter(profiler=profiler)
+
+        # Every few minutes:
+        report = profiler.report(top=5, reset=True)
+        for stats in report.most_expensive:
+            logger.info('%s took %.3fs', stats.rule, stats.total_seconds)
+
+    Explaining a message tries every pattern of its match type once more, so
+    keep the sample rate low on busy routers.
+    """
+
+    def __init__(self, sample_rate=1.0, random=random.random):
+        """
+        Init function for MatchProfiler.
+
+        Args:
+
+            sample_rate (float): The share of messages to explain, between 0
+            and 1.
+            random (callable): Returns a random float in [0, 1), to sample
+            messages with.
+
+        Returns:
+
+            An instance of MatchProfiler
+        """
+        self.sample_rate = sample_rate
+        self.random = random
+        self._lock = threading.Lock()
+        self.reset()
+
+    def sample(self):
+        """
+        Decide whether to explain a message.
+        """
+        return self.random() < self.sample_rate
+
+    def record(self, explanation):
+        """
+        Add the timings of an explained message to the window.
+
+        Args:
+
+            explanation (MatchExplanation): The explanation to record.
+        """
+        with self._lock:
+            self._messages += 1
+            for attempt in explanation.attempts:
+                key = (explanation.match_type, attempt.rule)
+                stats = self._patterns.get(key)
+                if stats is None:
+                    stats = [0, 0, 0, 0.0, 0.0]
+                    self._patterns[key] = stats
+                stats[0] += 1
+                stats[1] += attempt.matched
+                stats[2] += attempt.rule == explanation.winner
+                stats[3] += attempt.seconds
+                stats[4] = max(stats[4], attempt.seconds)
+
+    def report(self, top=10, reset=False):
+        """
+        Report on the patterns of the messages sampled since the profiler was
+        last reset.
+
+        Args:
+
+            top (int): The number of most expensive patterns to report.
+            reset (bool): Whether to start a new window.
+
+        Returns:
+
+            A :class:`omnibot_receiver.explain.ProfileReport`.
+        """
+        with self._lock:
+            messages = self._messages
+            patterns = [
+                PatternStats(match_type, rule, *stats)
+                for (match_type, rule), stats in self._patterns.items()
+            ]
+            if reset:
+                self._reset()
+        most_expensive = sorted(
+            patterns,
+            key=lambda stats: stats.total_seconds,
+            reverse=True
+        )[:top]
+        never_matched = sorted(
+            (stats for stats in patterns if not stats.matches),
+            key=lambda stats: stats.tries,
+            reverse=True
+        )
+        return ProfileReport(messages, most_expensive, never_matched)
+
+    def reset(self):
+        """
+        Start a new sampling window.
+        """
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._messages = 0
+        # (match_type, rule) to [tries, matches, wins, total, max]
+        self._patterns = {}
@@ -0,0 +1,163 @@
+"""
+.. module:: memoize
+   :synopsis: Caching of the responses of idempotent routes.
+"""
+import copy
+
+from omnibot_receiver.cache import LRUCache
+from omnibot_receiver.executor import (
+    TimeoutResponse,
+    WrappedRoute,
+    call_route_async,
+)
+
+_MISSING = object()
+
+
+class ResultCache(object):
+
+    """
+    A cache of the responses of a route, keyed by the arguments parsed from
+    the message (and optionally by a key function of the message), whose
+    entries expire after a time to live, and are evicted least recently used
+    first once the cache is full.
+
+    .. code-block:: python
+
+        from omnibot_receiver.memoize import ResultCache
+
+        runbook_cache = ResultCache(ttl=300, maxsize=256)
+
+        @message_router.route('runbook <service>', cache=runbook_cache)
+        def runbook(message, service):
+            # return some actions
+
+        # Once the runbook of the api service changes:
+        runbook_cache.invalidate(service='api')
+    """
+
+    def __init__(self, ttl=60, maxsize=256, key=None):
+        """
+        Init function for ResultCache.
+
+        Args:
+
+            ttl (float): The number of seconds to keep responses for.
+            maxsize (int): The number of responses to keep.
+            key (callable): If set, called with the message, to get a value
+            that is part of the cache key (for instance, the channel id, for
+            routes whose response depends on the channel).
+
+        Returns:
+
+            An instance of ResultCache
+        """
+        self.key = key
+        self.responses = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get_key(self, message, kwargs):
+        """
+        Get the cache key of a call of the route.
+        """
+        key = tuple(sorted(kwargs.items()))
+        if self.key is not None:
+            key = (key, self.key(message))
+        return key
+
+    def invalidate(self, **kwargs):
+        """
+        Remove cached responses. With no arguments, every response is
+        removed; otherwise, only the responses of calls with the given
+        arguments are.
+        """
+        if not kwargs:
+            self.responses.clear()
+            return
+        items = set(kwargs.items())
+        for key in self.responses.keys():
+            route_kwargs = key[0] if self.key is not None else key
+            if items.issubset(route_kwargs):
+                self.responses.delete(key)
+
+    def stats(self):
+        """
+        Get the counters of this cache.
+
+        Returns:
+
+            The counters of :func:`omnibot_receiver.cache.LRUCache.stats`,
+            and a hit_rate key, the share of lookups that were hits.
+        """
+        stats = self.responses.stats()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class MemoizedRoute(WrappedRoute):
+
+    """
+    A route function whose responses are cached in a
+    :class:`omnibot_receiver.memoize.ResultCache`. Copies of cached responses
+    are returned, so callers can change them. Errors and timeout responses
+    are not cached.
+    """
+
+    __slots__ = ('view_function', 'cache')
+
+    def __init__(self, view_function, cache):
+        """
+        Init function for MemoizedRoute.
+
+        Args:
+
+            view_function (function): The route function.
+            cache (ResultCache): The cache of the route's responses.
+
+        Returns:
+
+            An instance of MemoizedRoute
+        """
+        self.view_function = view_function
+        self.cache = cache
+
+    def __call__(self, message, **kwargs):
+        key = self.cache.get_key(message, kwargs)
+        response = self.cache.responses.get(key, _MISSING)
+        if response is not _MISSING:
+            return copy.deepcopy(response)
+        response = self.view_function(message, **kwargs)
+        self._set(key, response)
+        return response
+
+    async def call_async(self, message, **kwargs):
+        key = self.cache.get_key(message, kwargs)
+        response = self.cache.responses.get(key, _MISSING)
+        if response is not _MISSING:
+            return copy.deepcopy(response)
+        response = await call_route_async(
+            self.view_function,
+            message,
+            **kwargs
+        )
+        self._set(key, response)
+        return response
+
+    def _set(self, key, response):
+        if not isinstance(response, TimeoutResponse):
+            self.cache.responses.set(key, copy.deepcopy(response))
+
+
+def get_result_cache(cache):
+    """
+    Get the ResultCache for the cache option of a route: a ResultCache, or
+    a number of seconds to keep responses for.
+    """
+    if isinstance(cache, ResultCache):
+        return cache
+    if isinstance(cache, bool) or not isinstance(cache, (int, float)):
+        raise ValueError(
+            'cache must be a ResultCache or a ttl in seconds, '
+            'not {!r}.'.format(cache)
+        )
+    return ResultCache(ttl=cache)
@@ -0,0 +1,618 @@
+"""
+.. module:: metrics
+   :synopsis: Per-route latency, throughput and error instrumentation.
+"""
+import bisect
+from collections import namedtuple
+import re
+import socket
+import threading
+import time
+import weakref
+
+from omnibot_receiver import codec
+from omnibot_receiver.executor import WrappedRoute, call_route_async
+
+# Upper bounds of the buckets of latency histograms, in seconds.
+TIME_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+    0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0,
+)
+# Upper bounds of the buckets of response size histograms, in bytes.
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+FALLBACKS = ('default', 'help', 'no_match')
+
+MetricsSnapshot = namedtuple('MetricsSnapshot', ['routes', 'fallbacks'])
+MetricsSnapshot.__doc__ = """
+The metrics of a router, aggregated over every thread.
+
+Attributes:
+
+    routes (dict): The :class:`omnibot_receiver.metrics.RouteStats` of each
+    route that was called, keyed like the router's ``get_timeout_counts()``.
+    fallbacks (dict): The number of messages that fell back to the default
+    route, to the help route, or that matched no route (``no_match``).
+"""
+
+
+class Histogram(object):
+
+    """
+    A histogram of observed values, counted in buckets of fixed upper
+    bounds, plus a bucket for values above the last bound.
+    """
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        """
+        Init function for Histogram.
+
+        Args:
+
+            bounds (tuple): The sorted upper bounds of the buckets.
+
+        Returns:
+
+            An instance of Histogram
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        """
+        Add the observations of another histogram with the same bounds.
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+
+    def quantile(self, q):
+        """
+        Estimate a quantile of the observed values, as the upper bound of
+        the bucket it falls in.
+
+        Args:
+
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+
+            The upper bound, infinity for values above the last bound, or
+            None if nothing was observed.
+        """
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                if i < len(self.bounds):
+                    return self.bounds[i]
+                return float('inf')
+        return None
+
+
+class RouteStats(object):
+
+    """
+    The counters and histograms of a route.
+
+    Attributes:
+
+        calls (int): The number of calls of the route.
+        errors (int): The number of calls that raised.
+        match_time (Histogram): The time spent finding the route, in seconds.
+        handler_time (Histogram): The time spent in the route, in seconds.
+        response_bytes (Histogram): The JSON encoded size of responses.
+    """
+
+    __slots__ = (
+        'calls',
+        'errors',
+        'match_time',
+        'handler_time',
+        'response_bytes',
+    )
+
+    def __init__(self, time_buckets=TIME_BUCKETS, size_buckets=SIZE_BUCKETS):
+        self.calls = 0
+        self.errors = 0
+        self.match_time = Histogram(time_buckets)
+        self.handler_time = Histogram(time_buckets)
+        self.response_bytes = Histogram(size_buckets)
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.match_time.merge(other.match_time)
+        self.handler_time.merge(other.handler_time)
+        self.response_bytes.merge(other.response_bytes)
+
+
+class _ThreadStats(object):
+
+    __slots__ = ('routes', 'fallbacks')
+
+    def __init__(self):
+        self.routes = {}
+        self.fallbacks = dict.fromkeys(FALLBACKS, 0)
+
+    def merge_into(self, routes, fallbacks, time_buckets, size_buckets):
+        # Copying the items is atomic, so it's safe while other threads
+        # record.
+        for key, route_stats in list(self.routes.items()):
+            if key not in routes:
+                routes[key] = RouteStats(time_buckets, size_buckets)
+            routes[key].merge(route_stats)
+        for kind, count in list(self.fallbacks.items()):
+            fallbacks[kind] += count
+
+
+class _ThreadToken(object):
+
+    """
+    An object only referenced by the thread local storage of a thread, so
+    that it's collected when the thread ends.
+    """
+
+    __slots__ = ('__weakref__',)
+
+
+class RouteMetrics(object):
+
+    """
+    Instrumentation of the routes of a router. Each thread records to
+    counters and histograms of its own, without locking; they're aggregated
+    when read, by :func:`omnibot_receiver.metrics.RouteMetrics.snapshot()`.
+    When a thread ends, its metrics are merged into a total of ended
+    threads, so that threads coming and going don't grow the metrics.
+    Use a RouteMetrics per router.
+
+    .. code-block:: python
+
+        from omnibot_receiver.metrics import RouteMetrics, StatsdSink
+
+        metrics = RouteMetrics(sink=StatsdSink('localhost', 8125))
+        message_router = OmnibotMessageRouter(metrics=metrics)
+
+        # Periodically, for instance from a background thread:
+        metrics.flush()
+    """
+
+    def __init__(
+        self,
+        sink=None,
+        response_sizes=True,
+        time_buckets=TIME_BUCKETS,
+        size_buckets=SIZE_BUCKETS,
+    ):
+        """
+        Init function for RouteMetrics.
+
+        Args:
+
+            sink (callable): Called as ``sink(snapshot)`` with a
+            :class:`omnibot_receiver.metrics.MetricsSnapshot` on every
+            flush; for instance, a
+            :class:`omnibot_receiver.metrics.StatsdSink`.
+            response_sizes (bool): Whether to record the JSON encoded size of
+            responses, which encodes every response once more.
+            time_buckets (tuple): The upper bounds of the buckets of latency
+            histograms, in seconds.
+            size_buckets (tuple): The upper bounds of the buckets of response
+            size histograms, in bytes.
+
+        Returns:
+
+            An instance of RouteMetrics
+        """
+        self.sink = sink
+        self.response_sizes = response_sizes
+        self.time_buckets = time_buckets
+        self.size_buckets = size_buckets
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread_stats = []
+        self._retired = _ThreadStats()
+
+    def call(self, route, match_time, event, kwargs):
+        """
+        Call an instrumented route, and record its metrics.
+
+        Args:
+
+            route (InstrumentedRoute): The route.
+            match_time (float): The time spent finding the route, in
+            seconds, or None if it wasn't measured.
+            event (dict): The event to call the route with.
+            kwargs (dict): The arguments parsed for the route.
+        """
+        stats = self._start(route, match_time)
+        start = time.perf_counter()
+        try:
+            response = route.view_function(event, **kwargs)
+        except Exception:
+            self._fail(stats, start)
+            raise
+        self._finish(stats, start, response)
+        return response
+
+    async def call_async(self, route, match_time, event, kwargs):
+        """
+        Call an instrumented route, awaiting it if it's async, and record its
+        metrics; see :func:`omnibot_receiver.metrics.RouteMetrics.call()`.
+        """
+        stats = self._start(route, match_time)
+        start = time.perf_counter()
+        try:
+            response = await call_route_async(
+                route.view_function,
+                event,
+                **kwargs
+            )
+        except Exception:
+            self._fail(stats, start)
+            raise
+        self._finish(stats, start, response)
+        return response
+
+    def record_no_match(self):
+        """
+        Count an event that matched no route, and had no fallback.
+        """
+        self._get_thread_stats().fallbacks['no_match'] += 1
+
+    def snapshot(self):
+        """
+        Aggregate the metrics recorded by every thread.
+
+        Returns:
+
+            A :class:`omnibot_receiver.metrics.MetricsSnapshot`.
+        """
+        routes = {}
+        fallbacks = dict.fromkeys(FALLBACKS, 0)
+        with self._lock:
+            # Ended threads are merged under the lock, so that a thread
+            # ending during the snapshot is counted once.
+            self._retired.merge_into(
+                routes,
+                fallbacks,
+                self.time_buckets,
+                self.size_buckets
+            )
+            thread_stats = list(self._thread_stats)
+        for stats in thread_stats:
+            stats.merge_into(
+                routes,
+                fallbacks,
+                self.time_buckets,
+                self.size_buckets
+            )
+        return MetricsSnapshot(routes, fallbacks)
+
+    def flush(self):
+        """
+        Send a snapshot of the metrics to the sink, if set.
+
+        Returns:
+
+            The :class:`omnibot_receiver.metrics.MetricsSnapshot` sent.
+        """
+        snapshot = self.snapshot()
+        if self.sink is not None:
+            self.sink(snapshot)
+        return snapshot
+
+    def _get_thread_stats(self):
+        try:
+            return self._local.stats
+        except AttributeError:
+            stats = _ThreadStats()
+            token = _ThreadToken()
+            with self._lock:
+                self._thread_stats.append(stats)
+            self._local.stats = stats
+            self._local.token = token
+            weakref.finalize(
+                token,
+                _retire_thread_stats,
+                weakref.ref(self),
+                stats
+            )
+            return stats
+
+    def _retire(self, stats):
+        with self._lock:
+            self._thread_stats.remove(stats)
+            stats.merge_into(
+                self._retired.routes,
+                self._retired.fallbacks,
+                self.time_buckets,
+                self.size_buckets
+            )
+
+    def _start(self, route, match_time):
+        thread_stats = self._get_thread_stats()
+        stats = thread_stats.routes.get(route.key)
+        if stats is None:
+            stats = RouteStats(self.time_buckets, self.size_buckets)
+            thread_stats.routes[route.key] = stats
+        stats.calls += 1
+        if match_time is not None:
+            stats.match_time.observe(match_time)
+        if route.fallback is not None:
+            thread_stats.fallbacks[route.fallback] += 1
+        return stats
+
+    def _fail(self, stats, start):
+        stats.handler_time.observe(time.perf_counter() - start)
+        stats.errors += 1
+
+    def _finish(self, stats, start, response):
+        stats.handler_time.observe(time.perf_counter() - start)
+        if self.response_sizes and response is not None:
+            try:
+                stats.response_bytes.observe(len(codec.dumps(response)))
+            except (TypeError, ValueError, OverflowError):
+                # Responses that can't be encoded aren't sized.
+                pass
+
+
+def _retire_thread_stats(metrics_ref, stats):
+    metrics = metrics_ref()
+    if metrics is not None:
+        metrics._retire(stats)
+
+
+class InstrumentedRoute(WrappedRoute):
+
+    """
+    A route function whose calls are recorded by a
+    :class:`omnibot_receiver.metrics.RouteMetrics`. Dispatch plans call it
+    through ``call_matched``, with the time spent finding it.
+    """
+
+    __slots__ = ('view_function', 'key', 'metrics', 'fallback')
+
+    def __init__(self, view_function, key, metrics, fallback=None):
+        """
+        Init function for InstrumentedRoute.
+
+        Args:
+
+            view_function (function): The route function.
+            key (tuple): The key to record the route's metrics under.
+            metrics (RouteMetrics): The metrics to record to.
+            fallback (str): ``'default'`` or ``'help'``, if the route is the
+            fallback of unmatched events.
+
+        Returns:
+
+            An instance of InstrumentedRoute
+        """
+        self.view_function = view_function
+        self.key = key
+        self.metrics = metrics
+        self.fallback = fallback
+
+    def __call__(self, event, **kwargs):
+        return self.metrics.call(self, None, event, kwargs)
+
+    async def call_async(self, event, **kwargs):
+        return await self.metrics.call_async(self, None, event, kwargs)
+
+    def call_matched(self, match_time, event, kwargs):
+        return self.metrics.call(self, match_time, event, kwargs)
+
+    async def call_matched_async(self, match_time, event, kwargs):
+        return await self.metrics.call_async(self, match_time, event, kwargs)
+
+
+def format_statsd(snapshot, previous=None, prefix='omnibot_receiver'):
+    """
+    Format a snapshot as statsd lines: counters of the calls, errors and
+    fallbacks since the previous snapshot, and the mean latencies (as
+    timers, in milliseconds) and response sizes (as gauges) of the calls
+    since then.
+
+    Args:
+
+        snapshot (MetricsSnapshot): The metrics to format.
+        previous (MetricsSnapshot): The previously sent snapshot, if any.
+        prefix (str): The prefix of metric names.
+
+    Returns:
+
+        A list of statsd lines.
+    """
+    lines = []
+    previous_routes = previous.routes if previous is not None else {}
+    for key, stats in sorted(snapshot.routes.items(), key=_sort_key):
+        name = '{}.route.{}'.format(prefix, _get_statsd_name(key))
+        last = previous_routes.get(key)
+        if last is None:
+            last = RouteStats(
+                stats.match_time.bounds,
+                stats.response_bytes.bounds
+            )
+        lines.append('{}.calls:{}|c'.format(name, stats.calls - last.calls))
+        lines.append(
+            '{}.errors:{}|c'.format(name, stats.errors - last.errors)
+        )
+        for attr, scale, kind in (
+            ('match_time', 1000, 'ms'),
+            ('handler_time', 1000, 'ms'),
+            ('response_bytes', 1, 'g'),
+        ):
+            histogram = getattr(stats, attr)
+            last_histogram = getattr(last, attr)
+            count = histogram.count - last_histogram.count
+            if count:
+                mean = (histogram.sum - last_histogram.sum) / count * scale
+                lines.append(
+                    '{}.{}:{:.3f}|{}'.format(name, attr, mean, kind)
+                )
+    for kind, count in sorted(snapshot.fallbacks.items()):
+        if previous is not None:
+            count -= previous.fallbacks.get(kind, 0)
+        lines.append('{}.fallback.{}:{}|c'.format(prefix, kind, count))
+    return lines
+
+
+def format_prometheus(snapshot, prefix='omnibot_receiver'):
+    """
+    Format a snapshot in the Prometheus text exposition format, with the
+    route's key as ``type`` and ``route`` labels, to serve from a metrics
+    endpoint.
+
+    Args:
+
+        snapshot (MetricsSnapshot): The metrics to format.
+        prefix (str): The prefix of metric names.
+
+    Returns:
+
+        The metrics, as a str.
+    """
+    routes = sorted(snapshot.routes.items(), key=_sort_key)
+    lines = []
+    for attr, help in (
+        ('calls', 'Calls of each route.'),
+        ('errors', 'Calls of each route that raised.'),
+    ):
+        name = '{}_route_{}_total'.format(prefix, attr)
+        lines.append('# HELP {} {}'.format(name, help))
+        lines.append('# TYPE {} counter'.format(name))
+        for key, stats in routes:
+            lines.append('{}{{{}}} {}'.format(
+                name,
+                _get_labels(key),
+                getattr(stats, attr)
+            ))
+    for attr, name, help in (
+        ('match_time', 'match_seconds', 'Time spent finding each route.'),
+        ('handler_time', 'handler_seconds', 'Time spent in each route.'),
+        ('response_bytes', 'response_bytes', 'Size of route responses.'),
+    ):
+        name = '{}_route_{}'.format(prefix, name)
+        lines.append('# HELP {} {}'.format(name, help))
+        lines.append('# TYPE {} histogram'.format(name))
+        for key, stats in routes:
+            lines.extend(
+                _format_histogram(name, _get_labels(key), getattr(stats, attr))
+            )
+    name = '{}_fallbacks_total'.format(prefix)
+    lines.append(
+        '# HELP {} Events that fell back to the default or help route, or '
+        'matched no route.'.format(name)
+    )
+    lines.append('# TYPE {} counter'.format(name))
+    for kind, count in sorted(snapshot.fallbacks.items()):
+        lines.append('{}{{kind="{}"}} {}'.format(name, kind, count))
+    return '\n'.join(lines) + '\n'
+
+
+def _format_histogram(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append('{}_bucket{{{},le="{}"}} {}'.format(
+            name,
+            labels,
+            bound,
+            cumulative
+        ))
+    lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(
+        name,
+        labels,
+        histogram.count
+    ))
+    lines.append('{}_sum{{{}}} {}'.format(name, labels, histogram.sum))
+    lines.append('{}_count{{{}}} {}'.format(name, labels, histogram.count))
+    return lines
+
+
+def _sort_key(item):
+    return tuple('' if part is None else str(part) for part in item[0])
+
+
+def _get_labels(key):
+    route_type, route = ('' if part is None else part for part in key)
+    return 'type="{}",route="{}"'.format(
+        _escape_label(route_type),
+        _escape_label(route)
+    )
+
+
+def _escape_label(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+def _get_statsd_name(key):
+    return '.'.join(
+        re.sub(r'\W+', '_', 'all' if part is None else str(part)).strip('_')
+        or '_'
+        for part in key
+    )
+
+
+class StatsdSink(object):
+
+    """
+    A sink that sends metrics to a statsd server over UDP; see
+    :func:`omnibot_receiver.metrics.format_statsd`.
+    """
+
+    # Keep packets under the common safe UDP payload size.
+    MAX_PACKET_SIZE = 512
+
+    def __init__(self, host='localhost', port=8125, prefix='omnibot_receiver'):
+        """
+        Init function for StatsdSink.
+
+        Args:
+
+            host (str): The host of the statsd server.
+            port (int): The port of the statsd server.
+            prefix (str): The prefix of metric names.
+
+        Returns:
+
+            An instance of StatsdSink
+        """
+        self.address = (host, port)
+        self.prefix = prefix
+        self._previous = None
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, snapshot):
+        lines = format_statsd(snapshot, self._previous, self.prefix)
+        self._previous = snapshot
+        packet = ''
+        for line in lines:
+            if packet and len(packet) + len(line) + 1 > self.MAX_PACKET_SIZE:
+                self._send(packet)
+                packet = ''
+            packet = '{}\n{}'.format(packet, line) if packet else line
+        if packet:
+            self._send(packet)
+
+    def _send(self, packet):
+        self._socket.sendto(packet.encode('utf-8'), self.address)
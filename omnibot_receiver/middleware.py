@@ -0,0 +1,159 @@
+"""
+.. module:: middleware
+   :synopsis: Before, after and around hooks of routes.
+"""
+import functools
+import inspect
+
+from omnibot_receiver.executor import WrappedRoute, call_route_async
+
+
+class Middleware(object):
+
+    """
+    The hooks registered with a router, which run around its routes:
+
+    * before hooks are called with the event, before the route. If one
+      returns anything other than None, it's used as the response, and the
+      around hooks and the route are skipped.
+    * around hooks are called with a ``call_next`` function, the event and
+      the arguments of the route, and return the response; they continue
+      the chain with ``call_next(event, **kwargs)``.
+    * after hooks are called with the event and the response, and return the
+      response to use.
+
+    Hooks of each kind run in registration order; the first around hook
+    registered is the outermost one. Through the async entry points of the
+    routers, hooks defined with ``async def`` are awaited, and ``call_next``
+    returns an awaitable, which around hooks must await to get the
+    response.
+
+    .. code-block:: python
+
+        @message_router.before
+        def only_employees(message):
+            if message['user'] in CONTRACTORS:
+                return get_simple_response('Sorry, employees only.')
+
+        @message_router.around
+        def timed(call_next, message, **kwargs):
+            start = time.monotonic()
+            try:
+                return call_next(message, **kwargs)
+            finally:
+                statsd.timing('route', time.monotonic() - start)
+    """
+
+    __slots__ = ('before_hooks', 'after_hooks', 'around_hooks')
+
+    def __init__(self):
+        """
+        Init function for Middleware.
+
+        Returns:
+
+            An instance of Middleware
+        """
+        self.before_hooks = []
+        self.after_hooks = []
+        self.around_hooks = []
+
+    def __bool__(self):
+        return bool(self.before_hooks or self.after_hooks or self.around_hooks)
+
+    def compose(self, view_function):
+        """
+        Compose the hooks and a route function into a single function. With
+        no hooks, the route function itself is returned, so routes of
+        routers without middleware are called as before.
+
+        Args:
+
+            view_function (function): The route function.
+
+        Returns:
+
+            The route function, or a
+            :class:`omnibot_receiver.middleware.MiddlewareRoute` of it.
+        """
+        if not self:
+            return view_function
+        return MiddlewareRoute(
+            view_function,
+            before=self.before_hooks,
+            after=self.after_hooks,
+            around=self.around_hooks,
+        )
+
+
+class MiddlewareRoute(WrappedRoute):
+
+    """
+    A route function wrapped by middleware hooks; see
+    :class:`omnibot_receiver.middleware.Middleware`. The chain of around
+    hooks is built once, when the route is wrapped.
+    """
+
+    __slots__ = ('view_function', 'before', 'after', '_call', '_call_async')
+
+    def __init__(self, view_function, before=(), after=(), around=()):
+        """
+        Init function for MiddlewareRoute.
+
+        Args:
+
+            view_function (function): The route function.
+            before (list): The before hooks.
+            after (list): The after hooks.
+            around (list): The around hooks, outermost first.
+
+        Returns:
+
+            An instance of MiddlewareRoute
+        """
+        self.view_function = view_function
+        self.before = tuple(before)
+        self.after = tuple(after)
+        call = view_function
+        call_async = functools.partial(call_route_async, view_function)
+        for hook in reversed(around):
+            call = functools.partial(hook, call)
+            call_async = functools.partial(
+                _call_around_async,
+                hook,
+                call_async
+            )
+        self._call = call
+        self._call_async = call_async
+
+    def __call__(self, event, **kwargs):
+        for hook in self.before:
+            response = hook(event)
+            if response is not None:
+                break
+        else:
+            response = self._call(event, **kwargs)
+        for hook in self.after:
+            response = hook(event, response)
+        return response
+
+    async def call_async(self, event, **kwargs):
+        for hook in self.before:
+            response = await _resolve(hook(event))
+            if response is not None:
+                break
+        else:
+            response = await self._call_async(event, **kwargs)
+        for hook in self.after:
+            response = await _resolve(hook(event, response))
+        return response
+
+
+async def _call_around_async(hook, call_next, event, **kwargs):
+    return await _resolve(hook(call_next, event, **kwargs))
+
+
+async def _resolve(ret):
+    if inspect.isawaitable(ret):
+        ret = await ret
+    return ret
@@ -0,0 +1,312 @@
+"""
+.. module:: replay
+   :synopsis: Replay of captured omnibot events through a router.
+
+Replay a JSONL capture of omnibot events (one event per line) through an
+:class:`omnibot_receiver.router.OmnibotRouter`, to load test a bot, or to
+reprocess events after an outage. Events are streamed from the capture, and
+the response (or error) and latency of each event are written to an output
+JSONL, in the order of the capture.
+
+.. code-block:: bash
+
+    python -m omnibot_receiver.replay mybot.app:router events.jsonl \\
+        --output results.jsonl --mode thread --concurrency 8 --rate 200
+"""
+import argparse
+import asyncio
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import importlib
+import sys
+import time
+
+from omnibot_receiver import codec
+
+MODES = ('thread', 'process', 'asyncio')
+
+# The router of each process of the process mode.
+_process_router = None
+
+
+def load_router(path):
+    """
+    Import a router from a ``module:name`` or ``module.name`` path.
+    """
+    if ':' in path:
+        module_name, _, name = path.partition(':')
+    else:
+        module_name, _, name = path.rpartition('.')
+    if not module_name or not name:
+        raise ValueError(
+            '{!r} is not a module:name path of a router.'.format(path)
+        )
+    router = importlib.import_module(module_name)
+    for attr in name.split('.'):
+        router = getattr(router, attr)
+    return router
+
+
+def iter_lines(f):
+    """
+    Stream the events of a JSONL file, skipping blank lines. Lines are
+    decoded by the workers that route them.
+
+    Args:
+
+        f (file): The file, opened in binary mode.
+
+    Yields:
+
+        A tuple of (index, line) for each event, with index counting events
+        from 0.
+    """
+    index = 0
+    for line in f:
+        if line.strip():
+            yield index, line
+            index += 1
+
+
+def handle_line(router, index, line):
+    """
+    Decode an event and route it through the router, timing it.
+
+    Returns:
+
+        A dict of the index of the event, and its response, error and
+        latency in milliseconds; the error is None when the event was routed,
+        and the response is None when it wasn't.
+    """
+    start = time.perf_counter()
+    try:
+        response = router.handle_event(codec.loads(line))
+    except Exception as e:
+        return _get_result(index, None, e, start)
+    return _get_result(index, response, None, start)
+
+
+async def handle_line_async(router, index, line):
+    """
+    Decode an event and route it through the router, awaiting async routes;
+    see :func:`omnibot_receiver.replay.handle_line`.
+    """
+    start = time.perf_counter()
+    try:
+        response = await router.handle_event_async(codec.loads(line))
+    except Exception as e:
+        return _get_result(index, None, e, start)
+    return _get_result(index, response, None, start)
+
+
+def _get_result(index, response, error, start):
+    if error is not None:
+        error = '{}: {}'.format(type(error).__name__, error)
+    return {
+        'index': index,
+        'response': response,
+        'error': error,
+        'latency_ms': (time.perf_counter() - start) * 1000,
+    }
+
+
+def replay(
+    router_path,
+    lines,
+    write,
+    mode='thread',
+    concurrency=1,
+    rate=None,
+):
+    """
+    Replay events through a router.
+
+    Args:
+
+        router_path (str): The import path of the router; see
+        :func:`omnibot_receiver.replay.load_router`.
+        lines (iterable): (index, line) tuples of events; see
+        :func:`omnibot_receiver.replay.iter_lines`.
+        write (callable): Called with the result of each event (see
+        :func:`omnibot_receiver.replay.handle_line`), in the order of the
+        events.
+
+    Keyword Args:
+
+        mode (str): How to run events concurrently: on a pool of
+        ``concurrency`` threads or processes, or as ``concurrency``
+        concurrent tasks of an asyncio event loop, through
+        handle_event_async. Processes import the router themselves.
+        concurrency (int): The number of events to route at once.
+        rate (float): If set, the number of events to start per second, at
+        most.
+    """
+    if mode not in MODES:
+        raise ValueError('mode must be one of {}.'.format(', '.join(MODES)))
+    if mode == 'asyncio':
+        asyncio.run(_replay_async(
+            load_router(router_path),
+            lines,
+            write,
+            concurrency,
+            rate
+        ))
+        return
+    if mode == 'process':
+        executor = ProcessPoolExecutor(
+            concurrency,
+            initializer=_init_process,
+            initargs=(router_path,)
+        )
+        submit = executor.submit
+        handle = _handle_line_in_process
+    else:
+        executor = ThreadPoolExecutor(concurrency)
+        router = load_router(router_path)
+
+        def submit(handle, index, line):
+            return executor.submit(handle, router, index, line)
+
+        handle = handle_line
+    with executor:
+        # Results are written in order, so at most two events per worker are
+        # pending, to keep workers busy while the oldest one finishes.
+        pending = collections.deque()
+        for index, line in _pace(lines, rate):
+            pending.append(submit(handle, index, line))
+            if len(pending) >= 2 * concurrency:
+                write(pending.popleft().result())
+        while pending:
+            write(pending.popleft().result())
+
+
+async def _replay_async(router, lines, write, concurrency, rate):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    start = loop.time()
+
+    async def handle(index, line):
+        async with semaphore:
+            return await handle_line_async(router, index, line)
+
+    pending = collections.deque()
+    for count, (index, line) in enumerate(lines):
+        if rate:
+            delay = start + count / rate - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        pending.append(asyncio.ensure_future(handle(index, line)))
+        if len(pending) >= 2 * concurrency:
+            write(await pending.popleft())
+    while pending:
+        write(await pending.popleft())
+
+
+def _pace(lines, rate):
+    if not rate:
+        yield from lines
+        return
+    start = time.monotonic()
+    for count, item in enumerate(lines):
+        delay = start + count / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        yield item
+
+
+def _init_process(router_path):
+    global _process_router
+    _process_router = load_router(router_path)
+
+
+def _handle_line_in_process(index, line):
+    return handle_line(_process_router, index, line)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m omnibot_receiver.replay',
+        description=(
+            'Replay a JSONL capture of omnibot events through a router, and '
+            'write the response and latency of each event as JSONL.'
+        )
+    )
+    parser.add_argument(
+        'router',
+        help='The import path of the OmnibotRouter, as module:name.'
+    )
+    parser.add_argument(
+        'input',
+        help='The JSONL file of events to replay, or - for stdin.'
+    )
+    parser.add_argument(
+        '--output',
+        default='-',
+        help='The JSONL file to write results to, or - for stdout.'
+    )
+    parser.add_argument('--mode', choices=MODES, default='thread')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument(
+        '--rate',
+        type=float,
+        help='The number of events to start per second, at most.'
+    )
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    if args.input == '-':
+        input_file = sys.stdin.buffer
+    else:
+        input_file = open(args.input, 'rb')
+    if args.output == '-':
+        output_file = sys.stdout.buffer
+    else:
+        output_file = open(args.output, 'wb')
+    latencies = []
+    errors = 0
+
+    def write(result):
+        nonlocal errors
+        latencies.append(result['latency_ms'])
+        errors += result['error'] is not None
+        output_file.write(codec.dumps(result) + b'\n')
+
+    start = time.perf_counter()
+    try:
+        replay(
+            args.router,
+            iter_lines(input_file),
+            write,
+            mode=args.mode,
+            concurrency=args.concurrency,
+            rate=args.rate,
+        )
+    finally:
+        if input_file is not sys.stdin.buffer:
+            input_file.close()
+        if output_file is not sys.stdout.buffer:
+            output_file.close()
+        else:
+            output_file.flush()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    if latencies:
+        sys.stderr.write(
+            'Replayed {} events ({} errors) in {:.2f}s, {:.1f} events/s, '
+            'p50 {:.2f}ms, p99 {:.2f}ms\n'.format(
+                len(latencies),
+                errors,
+                elapsed,
+                len(latencies) / elapsed,
+                latencies[len(latencies) // 2],
+                latencies[min(int(len(latencies) * 0.99),
+                              len(latencies) - 1)],
+            )
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
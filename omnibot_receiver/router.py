@@ -2,7 +2,57 @@
 .. module:: router
    :synopsis: A module for omnibot routing utilities.
 """
+from collections import namedtuple
 import re
+import time
+from types import MappingProxyType
+
+from omnibot_receiver import codec
+from omnibot_receiver.batch import handle_events
+from omnibot_receiver.cache import LRUCache
+from omnibot_receiver.coalesce import CoalescedRoute
+from omnibot_receiver.deferred import DeferredRoute
+from omnibot_receiver.dispatch import (
+    AdaptiveMatcher,
+    CombinedMatcher,
+    LinearMatcher,
+    LiteralMatcher,
+    LiteralPrefixMatcher,
+    SubstringFilterMatcher,
+)
+from omnibot_receiver.executor import (
+    DeadlineRoute,
+    WrappedRoute,
+    call_route_async,
+    wrap_route,
+)
+from omnibot_receiver.explain import explain_match
+from omnibot_receiver.memoize import MemoizedRoute, get_result_cache
+from omnibot_receiver.metrics import InstrumentedRoute
+from omnibot_receiver.middleware import Middleware
+
+_NOT_CACHED = object()
+
+MessageRoute = namedtuple('MessageRoute', ['pattern', 'help', 'view_function'])
+MessageRoute.__doc__ = """
+A route registered with an OmnibotMessageRouter.
+
+Attributes:
+
+    pattern (_sre.SRE_Pattern): The compiled regex of the route's rule.
+    help (RouteHelp): The help documentation of the route.
+    view_function (function): The function to call for matching messages.
+"""
+
+RouteHelp = namedtuple('RouteHelp', ['title', 'description'])
+RouteHelp.__doc__ = """
+The help documentation of a message route.
+
+Attributes:
+
+    title (str): The rule of the route.
+    description (str): The help text the route was registered with.
+"""
 
 
 class OmnibotRouter(object):
@@ -39,18 +89,105 @@ class OmnibotRouter(object):
               message = request.get_json()
               ret = router.handle_message(message)
               return jsonify(ret)
+
+    Routes can also be ``async def`` functions. To await them, route events
+    from an asyncio application with
+    :func:`omnibot_receiver.router.OmnibotRouter.handle_event_async()`:
+
+    .. code-block:: python
+
+        @message_router.route('status <service>')
+        async def status(message, service):
+            ret = {'actions': []}
+            ret['actions'].append({
+                'action': 'chat.postMessage',
+                'kwargs': {'text': await fetch_status(service)}
+            })
+            return ret
+
+        ret = await router.handle_event_async(event)
+
+    Once every route is registered, the router can be frozen, which also
+    freezes the message and interactive routers. See
+    :func:`omnibot_receiver.router.OmnibotRouter.freeze()`.
+
+    Events that omnibot redelivers, while a slow route is still running or
+    after it responded, can be deduplicated, so that routes run once per
+    event; see :class:`omnibot_receiver.dedup.Deduplicator`:
+
+    .. code-block:: python
+
+        router = OmnibotRouter(
+            message_router=message_router,
+            interactive_router=interactive_router,
+            deduplicator=Deduplicator()
+        )
     """
 
-    def __init__(self, message_router=None, interactive_router=None):
+    def __init__(
+        self,
+        message_router=None,
+        interactive_router=None,
+        deduplicator=None,
+    ):
         """
         Init function for OmnibotRouter.
 
+        Args:
+
+            message_router (OmnibotMessageRouter): The router of message and
+            reaction events.
+            interactive_router (OmnibotInteractiveRouter): The router of
+            interactive component events.
+            deduplicator (Deduplicator): If set, the deduplicator that
+            handle_event and handle_event_async route events through.
+
         Returns:
 
             An instance of OmnibotRouter
         """
+        self._plan = None
+        self.middleware = Middleware()
+        self._handler = None
         self.message_router = message_router
         self.interactive_router = interactive_router
+        self.deduplicator = deduplicator
+
+    @property
+    def message_router(self):
+        return self._message_router
+
+    @message_router.setter
+    def message_router(self, message_router):
+        _check_not_frozen(self._plan is not None)
+        self._message_router = message_router
+
+    @property
+    def interactive_router(self):
+        return self._interactive_router
+
+    @interactive_router.setter
+    def interactive_router(self, interactive_router):
+        _check_not_frozen(self._plan is not None)
+        self._interactive_router = interactive_router
+
+    def freeze(self):
+        """
+        Freeze this router, and the message and interactive routers it routes
+        to, into an immutable
+        :class:`omnibot_receiver.router.EventDispatchPlan`. Frozen routers
+        dispatch every event through their plan, and raise a
+        RouterFrozenError if routes are registered after freezing. Freeze
+        once, after all routes are registered (for instance, before a
+        prefork server forks its workers).
+
+        Returns:
+
+            The EventDispatchPlan of this router.
+        """
+        if self._plan is None:
+            self._plan = EventDispatchPlan(self)
+        return self._plan
 
     def handle_event(self, event):
         """
@@ -84,13 +221,208 @@ class OmnibotRouter(object):
                     }
                 ]}
         """
+        if self.deduplicator is not None:
+            return self.deduplicator.handle(event, self._handle_event)
+        return self._handle_event(event)
+
+    def _handle_event(self, event):
+        if self._handler is not None:
+            return self._handler(event)
+        return self._dispatch_event(event)
+
+    def _dispatch_event(self, event):
+        if self._plan is not None:
+            return self._plan.handle_event(event)
+        return self._get_event_handler(event)(event)
+
+    async def handle_event_async(self, event):
+        """
+        For the given event, route the event to the relevant configured router
+        and to the registered function that matches the event in that router.
+        Routes defined with ``async def`` are awaited, while other routes are
+        called directly, in the event loop.
+
+        Args:
+
+            event (dict): An event sent by omnibot.
+
+        Returns:
+
+            A dict with an `actions` attribute that contains a list of slack
+            actions to be returned to omnibot. See
+            :func:`omnibot_receiver.router.OmnibotRouter.handle_event()`.
+        """
+        if self.deduplicator is not None:
+            return await self.deduplicator.handle_async(
+                event,
+                self._handle_event_async
+            )
+        return await self._handle_event_async(event)
+
+    async def _handle_event_async(self, event):
+        if self._handler is not None:
+            return await self._handler.call_async(event)
+        return await self._dispatch_event_async(event)
+
+    async def _dispatch_event_async(self, event):
+        if self._plan is not None:
+            return await self._plan.handle_event_async(event)
+        return await self._get_event_handler(event, asynchronous=True)(event)
+
+    def before(self, hook):
+        """
+        Register a hook to call with every event handled by handle_event and
+        handle_event_async, before it's routed; see
+        :class:`omnibot_receiver.middleware.Middleware`. Hooks of this
+        router run around the routing of every event, so routes can't opt
+        out of them; register hooks with the message and interactive routers
+        for per-route hooks. Can be used as a decorator.
+        """
+        return self._add_hook(self.middleware.before_hooks, hook)
+
+    def after(self, hook):
+        """
+        Register a hook to call with every event and its response, once
+        it's routed; see
+        :func:`omnibot_receiver.router.OmnibotRouter.before()`.
+        """
+        return self._add_hook(self.middleware.after_hooks, hook)
+
+    def around(self, hook):
+        """
+        Register a hook to wrap the routing of every event; see
+        :func:`omnibot_receiver.router.OmnibotRouter.before()`.
+        """
+        return self._add_hook(self.middleware.around_hooks, hook)
+
+    def _add_hook(self, hooks, hook):
+        _check_not_frozen(self._plan is not None)
+        hooks.append(hook)
+        self._handler = self.middleware.compose(_EventHandler(self))
+        return hook
+
+    def handle_raw(self, body):
+        """
+        Route an event from the raw body of a request from omnibot, and
+        return the raw body of the response. JSON is decoded and encoded with
+        the fastest available backend; see :mod:`omnibot_receiver.codec`.
+
+        .. code-block:: python
+
+            @app.route('/api/v1/bot', methods=['POST'])
+            def bot():
+                return Response(
+                    router.handle_raw(request.get_data()),
+                    mimetype='application/json'
+                )
+
+        Args:
+
+            body (bytes): The JSON encoded event sent by omnibot.
+
+        Returns:
+
+            The JSON encoded response, as bytes; see
+            :func:`omnibot_receiver.router.OmnibotRouter.handle_event()`.
+        """
+        return codec.dumps(self.handle_event(codec.loads(body)))
+
+    async def handle_raw_async(self, body):
+        """
+        Route an event from the raw body of a request from omnibot, awaiting
+        async routes; see
+        :func:`omnibot_receiver.router.OmnibotRouter.handle_raw()`.
+        """
+        return codec.dumps(await self.handle_event_async(codec.loads(body)))
+
+    def resolve_event(self, event):
+        """
+        For the given event, find the registered function that should handle
+        it, without calling it.
+
+        Args:
+
+            event (dict): An event sent by omnibot.
+
+        Returns:
+
+            A tuple of (view_function, kwargs); the event is handled by
+            calling ``view_function(event, **kwargs)``.
+        """
+        if self._plan is not None:
+            return self._plan.resolve_event(event)
+        return self._get_event_handler(event, resolve=True)(event)
+
+    def handle_events(
+        self,
+        events,
+        executor=None,
+        max_workers=None,
+        as_completed=False,
+    ):
+        """
+        Route a batch of events, running their routes concurrently on a
+        thread pool. Routes are resolved for the whole batch before any of
+        them runs. Routes defined with ``async def`` are run to completion on
+        an event loop of their worker. Errors are captured per event, rather
+        than aborting the batch. If the router has a deduplicator, events of
+        the batch are deduplicated too, and if it has hooks (see
+        :func:`omnibot_receiver.router.OmnibotRouter.before()`), each event
+        is routed through them, as by handle_event.
+
+        .. code-block:: python
+
+            for result in router.handle_events(events, max_workers=8):
+                if result.error:
+                    logger.error('Event failed', exc_info=result.error)
+                else:
+                    send_to_omnibot(result.response)
+
+        Args:
+
+            events (iterable): Events sent by omnibot.
+
+        Keyword Args:
+
+            executor (concurrent.futures.Executor): The executor to run
+            routes on. By default, a ThreadPoolExecutor is created for the
+            batch, and shut down once the batch is done.
+            max_workers (int): The max_workers of the ThreadPoolExecutor that
+            is created when no executor is given.
+            as_completed (bool): Whether to return an iterator over results as
+            they complete, rather than a list in the order of the events.
+
+        Returns:
+
+            A list (or an iterator, if as_completed is set) of
+            :class:`omnibot_receiver.batch.EventResult`.
+        """
+        return handle_events(
+            self,
+            events,
+            executor=executor,
+            max_workers=max_workers,
+            as_completed=as_completed,
+        )
+
+    def _get_event_handler(self, event, asynchronous=False, resolve=False):
         omnibot_payload_type = event.get('omnibot_payload_type')
         if (self.message_router and
                 omnibot_payload_type in {'message', 'reaction'}):
-            return self.message_router.handle_message(event)
+            if resolve:
+                return self.message_router._get_plan().resolve_message
+            if asynchronous:
+                return self.message_router.handle_message_async
+            return self.message_router.handle_message
         elif (self.interactive_router and
               omnibot_payload_type == 'interactive_component'):
-            return self.interactive_router.handle_interactive_component(event)
+            if resolve:
+                return self.interactive_router._resolve_event
+            if asynchronous:
+                return (
+                    self.interactive_router.handle_interactive_component_async
+                )
+            return self.interactive_router.handle_interactive_component
         else:
             raise UnsupportedPayloadError(
                 'Payload type currently unsupported'
@@ -236,9 +568,50 @@ class OmnibotMessageRouter(object):
 
         ret = message_router.handle_message(message)
         return jsonify(ret)
+
+    Bots with a large number of routes can enable compiled dispatch, which
+    merges all of the routes of a match type into a single regex, so that
+    finding a route takes a single regex call, rather than one call per
+    registered route:
+
+    .. code-block:: python
+
+        message_router = OmnibotMessageRouter(
+            help='This bot is used for pings and pongs.',
+            compiled_dispatch=True
+        )
+
+    Bots that see the same messages over and over can also cache route
+    matches. The cache is keyed by match type and message args, and is
+    cleared whenever the routes change; its counters are available through
+    ``message_router.match_cache.stats()``:
+
+    .. code-block:: python
+
+        message_router = OmnibotMessageRouter(
+            help='This bot is used for pings and pongs.',
+            match_cache_size=1024
+        )
+
+    Once all routes are registered, the router can be frozen into an
+    immutable :class:`omnibot_receiver.router.MessageDispatchPlan`; see
+    :func:`omnibot_receiver.router.OmnibotMessageRouter.freeze()`.
     """
 
-    def __init__(self, help='', help_as_default=True):
+    def __init__(
+        self,
+        help='',
+        help_as_default=True,
+        compiled_dispatch=False,
+        match_cache_size=None,
+        timeout=None,
+        timeout_response=None,
+        metrics=None,
+        profiler=None,
+        adaptive_regex=False,
+        literal_prefilter=False,
+        timeout_pool=None,
+    ):
         """
         Init function for OmnibotMessageRouter.
 
@@ -248,20 +621,119 @@ class OmnibotMessageRouter(object):
             help message header text.
             help_as_default (bool): Whether or not the bot will use the help
             route as a default fallback, if a default route isn't set.
+            compiled_dispatch (bool): Whether or not to merge the routes of
+            each match type into a single regex for matching. This makes
+            regex lookups a constant factor faster, but their cost still
+            grows with the number of routes. See
+            :class:`omnibot_receiver.dispatch.CombinedMatcher`.
+            match_cache_size (int): If set, the number of route matches to
+            keep in a :class:`omnibot_receiver.cache.LRUCache`.
+            timeout (float): If set, the number of seconds to wait for routes
+            registered without a timeout of their own, including the default
+            route; see
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.add_message_rule()`.
+            timeout_response (dict): The response to return when such routes
+            exceed the timeout.
+            metrics (RouteMetrics): If set, the
+            :class:`omnibot_receiver.metrics.RouteMetrics` to record the
+            match time, handler time, calls, errors and response sizes of
+            each route, and fallbacks, to.
+            profiler (MatchProfiler): If set, the
+            :class:`omnibot_receiver.explain.MatchProfiler` to explain a
+            sample of the messages resolved by the router with. When a match
+            cache is used, only messages missing from it are sampled.
+            adaptive_regex (bool): Whether to periodically reorder the regex
+            routes that are disjoint from every other regex route, so that
+            the most frequently matched ones are tried first; see
+            :class:`omnibot_receiver.dispatch.AdaptiveMatcher`. Mark routes
+            as disjoint with the ``disjoint`` route option. Regex routes are
+            matched one pattern at a time in this mode, even with
+            compiled_dispatch set.
+            literal_prefilter (bool): Whether to only try the regex routes
+            whose required literal text appears in the message, found with
+            a single scan of the message; see
+            :class:`omnibot_receiver.dispatch.SubstringFilterMatcher`.
+            Messages that contain none of the literals are only matched
+            against the routes without one. Ignored for regex routes if
+            adaptive_regex is set.
+            timeout_pool (concurrent.futures.Executor): If set, the thread
+            pool to run routes with a timeout on, rather than the shared
+            pool (see :func:`omnibot_receiver.executor.get_thread_pool`).
+            Routes that exceed their timeout keep a thread until they
+            finish, so size it for the number of messages handled at once,
+            plus the routes expected to overrun.
 
         Returns:
 
             An instance of OmnibotMessageRouter
         """
-        self.help_message = help
-        self.help_as_default = help_as_default
+        self._plan = None
+        self._metrics = metrics
+        self._profiler = profiler
+        self._frozen = False
+        self._help_message = help
+        self._help_as_default = help_as_default
         self.help_route = None
         self.default_route = None
+        self.compiled_dispatch = compiled_dispatch
+        self.adaptive_regex = adaptive_regex
+        self.literal_prefilter = literal_prefilter
+        self.timeout = timeout
+        self.timeout_response = timeout_response
+        self.timeout_pool = timeout_pool
         self.routes = {
             'command': [],
             'regex': [],
             'reaction': [],
         }
+        self._matchers = {}
+        self.middleware = Middleware()
+        self._middleware_exempt = set()
+        self._disjoint = set()
+        if match_cache_size:
+            self.match_cache = LRUCache(maxsize=match_cache_size)
+        else:
+            self.match_cache = None
+
+    @property
+    def help_message(self):
+        return self._help_message
+
+    @help_message.setter
+    def help_message(self, help_message):
+        _check_not_frozen(self._frozen)
+        self._help_message = help_message
+        self._plan = None
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        _check_not_frozen(self._frozen)
+        self._metrics = metrics
+        self._routes_changed()
+
+    @property
+    def profiler(self):
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        _check_not_frozen(self._frozen)
+        self._profiler = profiler
+        self._routes_changed()
+
+    @property
+    def help_as_default(self):
+        return self._help_as_default
+
+    @help_as_default.setter
+    def help_as_default(self, help_as_default):
+        _check_not_frozen(self._frozen)
+        self._help_as_default = help_as_default
+        self._routes_changed()
 
     @staticmethod
     def _get_route_pattern(route):
@@ -287,11 +759,13 @@ class OmnibotMessageRouter(object):
         register a help command to route to this function.
         """
         def decorator(f):
+            _check_not_frozen(self._frozen)
             if self.help_route:
                 raise RouteAlreadyDefinedError(
                     'A help route has already been set.'
                 )
             self.help_route = f
+            self._routes_changed()
             return f
 
         return decorator
@@ -302,18 +776,124 @@ class OmnibotMessageRouter(object):
         another registered route, it'll fall back to this route. Only a single
         route can be defined as a default; setting two defaults will result in
         a RouteAlreadyDefinedError being raised.
+
+        Keyword Args:
+
+            executor, timeout, timeout_response, deferred, ack_response,
+            middleware: See
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.add_message_rule()`
         """
         def decorator(f):
+            _check_not_frozen(self._frozen)
             if self.default_route:
                 raise RouteAlreadyDefinedError(
                     'A default route has already been set.'
                 )
-            self.default_route = f
+            if not kwargs.pop('middleware', True):
+                self._middleware_exempt.add(('default', None))
+            self.default_route = _wrap_route(self, f, **kwargs)
+            self._routes_changed()
             return f
 
         return decorator
 
-    def add_message_rule(self, rule, match_type, route_func, help=''):
+    def before(self, hook):
+        """
+        Register a hook to call with messages before their route, including
+        the default and help routes; see
+        :class:`omnibot_receiver.middleware.Middleware`. Routes registered
+        with ``middleware=False`` skip the hooks. Can be used as a decorator.
+        """
+        return self._add_hook(self.middleware.before_hooks, hook)
+
+    def after(self, hook):
+        """
+        Register a hook to call with messages and the response of their
+        route; see
+        :func:`omnibot_receiver.router.OmnibotMessageRouter.before()`.
+        """
+        return self._add_hook(self.middleware.after_hooks, hook)
+
+    def around(self, hook):
+        """
+        Register a hook to wrap the routes of messages; see
+        :func:`omnibot_receiver.router.OmnibotMessageRouter.before()`.
+        """
+        return self._add_hook(self.middleware.around_hooks, hook)
+
+    def _add_hook(self, hooks, hook):
+        _check_not_frozen(self._frozen)
+        hooks.append(hook)
+        # Routes are composed with the hooks when their matcher is built.
+        self._routes_changed()
+        return hook
+
+    def _routes_changed(self, match_type=None):
+        """
+        Drop any state derived from the registered routes.
+
+        Args:
+
+            match_type (str): The match type whose routes changed, or None if
+            the change affects every match type.
+        """
+        if match_type is None:
+            self._matchers.clear()
+        else:
+            # The matcher for this match type is rebuilt on the next lookup.
+            self._matchers.pop(match_type, None)
+        self._plan = None
+        if self.match_cache is not None:
+            self.match_cache.clear()
+
+    def freeze(self):
+        """
+        Freeze this router into an immutable
+        :class:`omnibot_receiver.router.MessageDispatchPlan`, with every
+        matcher built, the fallback route resolved and the help rendered.
+        A frozen router dispatches every message through its plan, and
+        raises a RouterFrozenError if routes are registered after freezing.
+
+        Returns:
+
+            The MessageDispatchPlan of this router.
+        """
+        if not self._frozen:
+            self.routes = MappingProxyType({
+                match_type: tuple(routes)
+                for match_type, routes in self.routes.items()
+            })
+            self._plan = MessageDispatchPlan(self)
+            self._frozen = True
+        return self._plan
+
+    def _get_plan(self):
+        """
+        Get the dispatch plan for the current routes, building it if the
+        routes changed since it was last built.
+        """
+        plan = self._plan
+        if plan is None:
+            plan = MessageDispatchPlan(self)
+            self._plan = plan
+        return plan
+
+    def add_message_rule(
+        self,
+        rule,
+        match_type,
+        route_func,
+        help='',
+        executor=None,
+        timeout=None,
+        timeout_response=None,
+        deferred=False,
+        ack_response=None,
+        coalesce=False,
+        cache=None,
+        middleware=True,
+        disjoint=False,
+    ):
         """
         Register a function to be called for messages matching the given rule.
 
@@ -337,6 +917,46 @@ class OmnibotMessageRouter(object):
             help (str): Help text for this route, to be included with the help
             docs generated from
             :func:`omnibot_receiver.router.OmnibotMessageRouter.get_help()`
+            executor: Where to run this route; see
+            :func:`omnibot_receiver.executor.wrap_route`. With ``'process'``,
+            the route runs on a process pool, for CPU-bound routes, and the
+            router waits for its response.
+            timeout (float): If set, the number of seconds to wait for the
+            route. Once exceeded, the timeout response is returned, and the
+            route finishes in the background (or is cancelled, if it's async
+            and handled through the async entry points). Defaults to the
+            timeout of the router.
+            timeout_response (dict): The response to return when the route
+            exceeds its timeout. Defaults to the timeout response of the
+            router, or to an empty list of actions.
+            deferred: If set, the route is run in the background, after the
+            acknowledgement response is returned, and its response is
+            delivered to the sink of the pool it runs on. True to use the
+            shared pool (see
+            :func:`omnibot_receiver.deferred.get_deferred_pool`), or an
+            instance of :class:`omnibot_receiver.deferred.DeferredPool`.
+            ack_response (dict): The response to return for deferred routes.
+            Defaults to an empty list of actions.
+            coalesce: If set, concurrent calls of the route with the same
+            arguments are coalesced into one call, whose response is copied
+            to the others, with the channel and thread_ts of their messages
+            patched in; see :class:`omnibot_receiver.coalesce.CoalescedRoute`.
+            True, or a function of the message whose result must also be
+            equal for calls to be coalesced. Collapsed calls are counted; see
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.get_collapsed_counts()`.
+            cache: If set, the responses of the route are cached by the
+            arguments parsed from the message, and copies of them are
+            returned while they're fresh. A number of seconds to keep
+            responses for, or a :class:`omnibot_receiver.memoize.ResultCache`,
+            which can also key responses by the message, and be invalidated.
+            Only use it for routes whose response doesn't depend on the
+            message otherwise.
+            middleware (bool): Whether to run the hooks of the router around
+            this route; see
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.before()`.
+            disjoint (bool): Whether no message that matches this route can
+            match another route of its match type. With adaptive_regex set,
+            disjoint regex routes are reordered by how often they match.
 
         Usage:
 
@@ -358,18 +978,38 @@ class OmnibotMessageRouter(object):
                 help='Responds to pings'
             )
         """
-        help_text = '{}:{}'.format(rule, help)
-
+        _check_not_frozen(self._frozen)
         route_pattern = self._get_route_pattern(rule)
-        for _pattern, _, _ in self.routes[match_type]:
-            if route_pattern == _pattern:
+        for route in self.routes[match_type]:
+            if route_pattern == route.pattern:
                 raise RouteAlreadyDefinedError(
                     '{} is already defined for match type {}.'.format(
                         rule,
                         match_type
                     )
                 )
-        self.routes[match_type].append((route_pattern, help_text, route_func))
+        self.routes[match_type].append(
+            MessageRoute(
+                route_pattern,
+                RouteHelp(rule, help),
+                _wrap_route(
+                    self,
+                    route_func,
+                    executor=executor,
+                    timeout=timeout,
+                    timeout_response=timeout_response,
+                    deferred=deferred,
+                    ack_response=ack_response,
+                    coalesce=coalesce,
+                    cache=cache,
+                )
+            )
+        )
+        if not middleware:
+            self._middleware_exempt.add((match_type, rule))
+        if disjoint:
+            self._disjoint.add((match_type, rule))
+        self._routes_changed(match_type)
 
     def route(self, rule, **kwargs):
         """
@@ -392,6 +1032,35 @@ class OmnibotMessageRouter(object):
             help (str): Help text for this route, to be included with the help
             docs generated from
             :func:`omnibot_receiver.router.OmnibotMessageRouter.get_help()`
+            executor: Where to run this route; see
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.add_message_rule()`
+            timeout (float): The time budget of this route, in seconds.
+            timeout_response (dict): The response to return when the route
+            exceeds its timeout.
+            deferred: Whether to run this route in the background.
+            ack_response (dict): The response to return for deferred routes.
+            coalesce: Whether to coalesce concurrent calls of this route.
+            cache: Whether, and for how long, to cache the responses of this
+            route.
+            middleware (bool): Whether to run the hooks of the router around
+            this route.
+            disjoint (bool): Whether no message matching this route can match
+            another route of its match type.
+
+        Usage:
+
+        .. code-block:: python
+
+            @message_router.route('report <id>', executor='process')
+            def report(message, id):
+                # render a large report, without holding the GIL of the
+                # router's process
+
+            @message_router.route('deploy <service>', timeout=2.5)
+            def deploy(message, service):
+                # deploy the service, and post to the channel once done; if
+                # it takes longer than 2.5 seconds, an empty list of actions
+                # is returned to omnibot in the meantime
         """
 
         def decorator(f):
@@ -400,11 +1069,75 @@ class OmnibotMessageRouter(object):
                 kwargs.pop('match_type', 'command'),
                 f,
                 help=kwargs.pop('help', ''),
+                executor=kwargs.pop('executor', None),
+                timeout=kwargs.pop('timeout', None),
+                timeout_response=kwargs.pop('timeout_response', None),
+                deferred=kwargs.pop('deferred', False),
+                ack_response=kwargs.pop('ack_response', None),
+                coalesce=kwargs.pop('coalesce', False),
+                cache=kwargs.pop('cache', None),
+                middleware=kwargs.pop('middleware', True),
+                disjoint=kwargs.pop('disjoint', False),
             )
             return f
 
         return decorator
 
+    def get_timeout_counts(self):
+        """
+        Get the number of times each route with a timeout exceeded it.
+
+        Returns:
+
+            A dict of (match_type, rule) to count, for every route with a
+            timeout; the default route is counted under ('default', None).
+        """
+        return _count_wrapped(self._iter_routes(), DeadlineRoute, 'timeouts')
+
+    def get_collapsed_counts(self):
+        """
+        Get the number of calls of each coalesced route that were collapsed
+        into a running call; see
+        :func:`omnibot_receiver.router.OmnibotMessageRouter.add_message_rule()`.
+
+        Returns:
+
+            A dict of (match_type, rule) to count, for every coalesced route.
+        """
+        return _count_wrapped(
+            self._iter_routes(),
+            CoalescedRoute,
+            'collapsed'
+        )
+
+    def get_cache_stats(self):
+        """
+        Get the counters of the response cache of each cached route.
+
+        Returns:
+
+            A dict of (match_type, rule) to the stats of the route's
+            :class:`omnibot_receiver.memoize.ResultCache`.
+        """
+        return _get_cache_stats(self._iter_routes())
+
+    def invalidate_caches(self):
+        """
+        Remove every cached response of the routes of this router.
+        """
+        _invalidate_caches(self._iter_routes())
+
+    def _iter_routes(self):
+        """
+        Iterate over (match_type, rule) keys and functions of every route,
+        including the default route, keyed ('default', None).
+        """
+        for match_type, routes in self.routes.items():
+            for route in routes:
+                yield (match_type, route.help.title), route.view_function
+        if self.default_route is not None:
+            yield ('default', None), self.default_route
+
     def _get_route_match(self, text, match_type):
         """
         For the given text and match type, find and return parsed arguments
@@ -416,12 +1149,81 @@ class OmnibotMessageRouter(object):
             match_type (str): The match type to use for finding routes (see
             :func:`omnibot_receiver.router.OmnibotMessageRouter.route()`)
         """
-        for route_pattern, _, view_function in self.routes[match_type]:
-            m = route_pattern.match(text)
-            if m:
-                return m.groupdict(), view_function
+        return self._get_matcher(match_type).match(text)
 
-        return None
+    def explain(self, text, match_type):
+        """
+        Explain how the routes of a match type match the given text: every
+        pattern is tried, and timed, and the route that wins is reported.
+
+        .. code-block:: python
+
+            explanation = message_router.explain('deploy api', 'command')
+            # The rule of the winning route, such as 'deploy <service>'
+            explanation.winner
+            # The rule of the slowest pattern
+            max(explanation.attempts, key=lambda a: a.seconds).rule
+
+        Args:
+
+            text (str): The text to match against.
+            match_type (str): The match type of the routes to try.
+
+        Returns:
+
+            A :class:`omnibot_receiver.explain.MatchExplanation`.
+        """
+        return explain_match(self.routes[match_type], text, match_type)
+
+    def _get_matcher(self, match_type):
+        matcher = self._matchers.get(match_type)
+        if matcher is None:
+            matcher = self._build_matcher(match_type)
+        return matcher
+
+    def _build_matcher(self, match_type):
+        routes = [
+            (
+                route.pattern,
+                _compose_route(
+                    self,
+                    (match_type, route.help.title),
+                    route.view_function
+                )
+            )
+            for route in self.routes[match_type]
+        ]
+        if self.compiled_dispatch:
+            matcher_class = CombinedMatcher
+        else:
+            matcher_class = LinearMatcher
+        if match_type == 'regex' and self.adaptive_regex:
+            matcher = AdaptiveMatcher(
+                routes,
+                disjoint=[
+                    (match_type, route.help.title) in self._disjoint
+                    for route in self.routes[match_type]
+                ]
+            )
+        elif match_type == 'regex' and self.literal_prefilter:
+            matcher = SubstringFilterMatcher(
+                routes,
+                fallback_class=matcher_class
+            )
+        elif match_type == 'command':
+            # Commands are mostly literal verbs, so they're indexed by their
+            # literal prefixes.
+            matcher = LiteralPrefixMatcher(
+                routes,
+                fallback_class=matcher_class
+            )
+        elif match_type == 'reaction':
+            # Reactions are mostly exact emoji names.
+            matcher = LiteralMatcher(routes, fallback_class=matcher_class)
+        else:
+            matcher = matcher_class(routes)
+        self._matchers[match_type] = matcher
+        return matcher
 
     def get_help(self, message, **kwargs):
         """
@@ -457,35 +1259,31 @@ class OmnibotMessageRouter(object):
                     }]
                 }
         """
+        # The help is rendered once per change of the routes; every caller
+        # gets its own copy, so the rendered help can't be modified.
+        return _copy_help(self._get_plan().help)
+
+    def _render_help(self):
         ret_action = {
             'action': 'chat.postMessage',
             'kwargs': {'text': self.help_message, 'attachments': []}
         }
         ret = {'actions': [ret_action]}
-        if self.routes['command']:
-            fields = []
-            for _, help_text, _ in self.routes['command']:
-                action, text = help_text.split(':', 1)
-                fields.append({
-                    'title': action,
-                    'value': text,
-                    'short': False
-                })
-            ret_action['kwargs']['attachments'].append({
-                'title': 'Commands:',
-                'fields': fields
-            })
-        if self.routes['regex']:
+        for match_type, title in (
+            ('command', 'Commands:'),
+            ('regex', 'Regex matches:'),
+        ):
+            if not self.routes[match_type]:
+                continue
             fields = []
-            for _, help_text, _ in self.routes['regex']:
-                action, text = help_text.split(':', 1)
+            for route in self.routes[match_type]:
                 fields.append({
-                    'title': action,
-                    'value': text,
+                    'title': route.help.title,
+                    'value': route.help.description,
                     'short': False
                 })
             ret_action['kwargs']['attachments'].append({
-                'title': 'Regex matches:',
+                'title': title,
                 'fields': fields
             })
         return ret
@@ -528,27 +1326,215 @@ class OmnibotMessageRouter(object):
                     }
                 ]}
         """
-        match_type = message['match_type']
-        args = message.get('args', '')
-        route_match = self._get_route_match(args, match_type)
+        return self._get_plan().handle_message(message)
+
+    async def handle_message_async(self, message):
+        """
+        For the given message, route the message to any routes registered that
+        match its attributes, and return a list of actions for omnibot. Routes
+        defined with ``async def`` are awaited, while other routes are called
+        directly, in the event loop.
+
+        Args:
+
+            message (dict): A message sent by omnibot.
+
+        Returns:
+
+            A dict with an `actions` attribute that contains a list of slack
+            actions to be returned to omnibot. See
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.handle_message()`.
+        """
+        return await self._get_plan().handle_message_async(message)
+
+
+def _copy_help(help):
+    """
+    Copy a help response rendered by OmnibotMessageRouter. Only the dicts and
+    lists of the help structure are copied, which is cheaper than rendering
+    the help again, or than a deepcopy.
+    """
+    action = help['actions'][0]
+    kwargs = action['kwargs']
+    return {'actions': [{
+        'action': action['action'],
+        'kwargs': {
+            'text': kwargs['text'],
+            'attachments': [
+                {
+                    'title': attachment['title'],
+                    'fields': [dict(field) for field in attachment['fields']],
+                }
+                for attachment in kwargs['attachments']
+            ],
+        },
+    }]}
+
+
+class _DispatchPlan(object):
+
+    __slots__ = ()
+
+    def _set(self, **attrs):
+        for name, value in attrs.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(
+            '{} is immutable.'.format(type(self).__name__)
+        )
+
+
+class MessageDispatchPlan(_DispatchPlan):
+
+    """
+    An immutable dispatch plan for the routes of an
+    :class:`omnibot_receiver.router.OmnibotMessageRouter`, with a matcher
+    built for every match type, the fallback for unmatched messages (the
+    default route, the help route, or none) decided up front, and the help
+    documentation rendered. Plans are created by
+    :func:`omnibot_receiver.router.OmnibotMessageRouter.freeze()`.
+    """
+
+    __slots__ = (
+        'routes',
+        'matchers',
+        'fallback',
+        'help',
+        'match_cache',
+        'metrics',
+        'profiler',
+    )
+
+    def __init__(self, router):
+        """
+        Init function for MessageDispatchPlan.
+
+        Args:
+
+            router (OmnibotMessageRouter): The router to build a plan for.
+
+        Returns:
+
+            An instance of MessageDispatchPlan
+        """
+        # No match, fall back to the default route, if defined
+        if router.default_route:
+            fallback = _compose_route(
+                router,
+                ('default', None),
+                router.default_route,
+                fallback='default'
+            )
+        elif router.help_as_default:
+            fallback = _compose_route(
+                router,
+                ('help', None),
+                router._get_help_func(),
+                fallback='help'
+            )
+        else:
+            fallback = None
+        self._set(
+            routes=MappingProxyType({
+                match_type: tuple(routes)
+                for match_type, routes in router.routes.items()
+            }),
+            matchers=MappingProxyType({
+                match_type: router._get_matcher(match_type)
+                for match_type in router.routes
+            }),
+            fallback=fallback,
+            help=router._render_help(),
+            match_cache=router.match_cache,
+            metrics=router.metrics,
+            profiler=router.profiler,
+        )
+
+    def resolve(self, text, match_type):
+        """
+        For the given text and match type, find the function that should
+        handle the message, falling back to the default or help routes, and
+        the arguments parsed for it.
+
+        Returns:
+
+            A tuple of (view_function, kwargs)
+        """
+        if self.match_cache is None:
+            resolved = self._resolve_uncached(text, match_type)
+        else:
+            key = (match_type, text)
+            resolved = self.match_cache.get(key, _NOT_CACHED)
+            if resolved is _NOT_CACHED:
+                resolved = self._resolve_uncached(text, match_type)
+                self.match_cache.set(key, resolved)
+        if resolved is None:
+            # No default route, raise an exception.
+            raise NoMatchedRouteError(
+                'No route "{}" for match_type "{}" and no default'
+                'route set.'
+                .format(text, match_type)
+            )
+        return resolved
+
+    def _resolve_uncached(self, text, match_type):
+        if self.profiler is not None and self.profiler.sample():
+            self.profiler.record(
+                explain_match(self.routes[match_type], text, match_type)
+            )
+        route_match = self.matchers[match_type].match(text)
         if route_match:
             kwargs, view_function = route_match
-            return view_function(message, **kwargs)
-        else:
-            # No match, fall back to the default route, if defined
-            if self.default_route:
-                return self.default_route(message)
-            else:
-                if self.help_as_default:
-                    help_func = self._get_help_func()
-                    return help_func(message)
-                else:
-                    # No default route, raise an exception.
-                    raise NoMatchedRouteError(
-                        'No route "{}" for match_type "{}" and no default'
-                        'route set.'
-                        .format(args, match_type)
-                    )
+            return view_function, kwargs
+        if self.fallback:
+            return self.fallback, {}
+        return None
+
+    def handle_message(self, message):
+        """
+        Route the message; see
+        :func:`omnibot_receiver.router.OmnibotMessageRouter.handle_message()`.
+        """
+        if self.metrics is not None:
+            match_time, view_function, kwargs = _resolve_timed(
+                self.metrics,
+                self.resolve_message,
+                message
+            )
+            return view_function.call_matched(match_time, message, kwargs)
+        view_function, kwargs = self.resolve_message(message)
+        return view_function(message, **kwargs)
+
+    async def handle_message_async(self, message):
+        """
+        Route the message, awaiting async routes; see
+        :func:`omnibot_receiver.router.OmnibotMessageRouter.handle_message_async()`.
+        """
+        if self.metrics is not None:
+            match_time, view_function, kwargs = _resolve_timed(
+                self.metrics,
+                self.resolve_message,
+                message
+            )
+            return await view_function.call_matched_async(
+                match_time,
+                message,
+                kwargs
+            )
+        view_function, kwargs = self.resolve_message(message)
+        return await call_route_async(view_function, message, **kwargs)
+
+    def resolve_message(self, message):
+        """
+        Find the function that should handle the given message, and the
+        arguments parsed for it.
+
+        Returns:
+
+            A tuple of (view_function, kwargs)
+        """
+        return self.resolve(message.get('args', ''), message['match_type'])
 
 
 class OmnibotInteractiveRouter(object):
@@ -638,16 +1624,64 @@ class OmnibotInteractiveRouter(object):
         return jsonify(ret)
     """
 
-    def __init__(self):
+    def __init__(self, timeout=None, timeout_response=None, metrics=None,
+                 timeout_pool=None):
         """
         Init function for OmnibotInteractiveRouter.
 
+        Args:
+
+            timeout (float): If set, the number of seconds to wait for routes
+            registered without a timeout of their own, including the default
+            route; see
+            :func:`omnibot_receiver.router.OmnibotInteractiveRouter.add_event_callback()`.
+            timeout_response (dict): The response to return when such routes
+            exceed the timeout.
+            metrics (RouteMetrics): If set, the
+            :class:`omnibot_receiver.metrics.RouteMetrics` to record the
+            metrics of each route to; see
+            :class:`omnibot_receiver.router.OmnibotMessageRouter`.
+            timeout_pool (concurrent.futures.Executor): If set, the thread
+            pool to run routes with a timeout on; see
+            :class:`omnibot_receiver.router.OmnibotMessageRouter`.
+
         Returns:
 
             An instance of OmnibotInteractiveRouter
         """
+        self.timeout = timeout
+        self.timeout_response = timeout_response
+        self.timeout_pool = timeout_pool
         self.default_route = None
-        self.routes = {'__all': []}
+        # Callbacks are indexed by event type, then by callback_id; callbacks
+        # that apply to all event types are stored under __all.
+        self._callbacks = {'__all': {}}
+        self.middleware = Middleware()
+        self._middleware_exempt = set()
+        self._metrics = metrics
+        self._plan = None
+        self._frozen = False
+
+    @property
+    def metrics(self):
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        _check_not_frozen(self._frozen)
+        self._metrics = metrics
+        self._plan = None
+
+    @property
+    def routes(self):
+        """
+        A read-only view of the registered routes, as a mapping of event type
+        to a tuple of (callback_id, function) tuples, in registration order.
+        """
+        return MappingProxyType({
+            event_type: tuple(callbacks.items())
+            for event_type, callbacks in self._callbacks.items()
+        })
 
     def set_default(self, **kwargs):
         """
@@ -655,13 +1689,23 @@ class OmnibotInteractiveRouter(object):
         another registered route, it'll fall back to this route. Only a single
         route can be defined as a default; setting two defaults will result in
         a RouteAlreadyDefinedError being raised.
+
+        Keyword Args:
+
+            executor, timeout, timeout_response, deferred, ack_response,
+            middleware: See
+            :func:`omnibot_receiver.router.OmnibotInteractiveRouter.add_event_callback()`
         """
         def decorator(f):
+            _check_not_frozen(self._frozen)
             if self.default_route:
                 raise RouteAlreadyDefinedError(
                     'A default route has already been set.'
                 )
-            self.default_route = f
+            if not kwargs.pop('middleware', True):
+                self._middleware_exempt.add(('default', None))
+            self.default_route = _wrap_route(self, f, **kwargs)
+            self._plan = None
             return f
 
         return decorator
@@ -671,6 +1715,13 @@ class OmnibotInteractiveRouter(object):
         callback_id,
         route_func,
         event_type=None,
+        executor=None,
+        timeout=None,
+        timeout_response=None,
+        deferred=False,
+        ack_response=None,
+        cache=None,
+        middleware=True,
     ):
         """
         Register a function to be called for messages matching the given rule.
@@ -681,11 +1732,32 @@ class OmnibotInteractiveRouter(object):
             event_type (str): The event type of interactive component, to match
             against.
             route_func (function): The function to call when serving this route
+            executor: Where to run this route; see
+            :func:`omnibot_receiver.executor.wrap_route`.
+            timeout (float): If set, the number of seconds to wait for the
+            route, so that events are acknowledged before omnibot retries
+            them. Once exceeded, the timeout response is returned, and the
+            route finishes in the background (or is cancelled, if it's async
+            and handled through the async entry points). Defaults to the
+            timeout of the router.
+            timeout_response (dict): The response to return when the route
+            exceeds its timeout. Defaults to the timeout response of the
+            router, or to an empty list of actions.
+            deferred: If set, the route is run in the background; see
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.add_message_rule()`.
+            ack_response (dict): The response to return for deferred routes.
+            Defaults to an empty list of actions.
+            cache: If set, the responses of the route are cached; see
+            :func:`omnibot_receiver.router.OmnibotMessageRouter.add_message_rule()`.
+            middleware (bool): Whether to run the hooks of the router around
+            this route; see
+            :func:`omnibot_receiver.router.OmnibotInteractiveRouter.before()`.
 
         Usage:
 
         .. code-block:: python
 
+            from omnibot_receiver.response import get_simple_response
             from omnibot_receiver.router import OmnibotInteractiveRouter
 
             interactive_router = OmnibotInteractiveRouter()
@@ -693,19 +1765,48 @@ class OmnibotInteractiveRouter(object):
             def ping(event):
                 # return some actions
 
-            interactive_router.add_event_callback('ping_callback', ping)
+            interactive_router.add_event_callback(
+                'ping_callback',
+                ping,
+                timeout=2.5,
+                timeout_response=get_simple_response(
+                    'Working on it...',
+                    ephemeral=True
+                )
+            )
 
         """
-        if event_type is None:
-            event_type = '__all'
-        if event_type not in self.routes:
-            self.routes[event_type] = []
-        for _callback_id, _ in self.routes[event_type]:
-            if callback_id == _callback_id:
-                raise RouteAlreadyDefinedError(
-                    '{} is already defined'.format(callback_id)
-                )
-        self.routes[event_type].append((callback_id, route_func))
+        _check_not_frozen(self._frozen)
+        if not middleware:
+            self._middleware_exempt.add((event_type, callback_id))
+        callbacks = self._callbacks.setdefault(
+            '__all' if event_type is None else event_type,
+            {}
+        )
+        if callback_id in callbacks:
+            raise RouteAlreadyDefinedError(
+                '{} is already defined'.format(callback_id)
+            )
+        view_function = _wrap_route(
+            self,
+            route_func,
+            executor=executor,
+            timeout=timeout,
+            timeout_response=timeout_response,
+            deferred=deferred,
+            ack_response=ack_response,
+            cache=cache,
+        )
+        callbacks[callback_id] = view_function
+        if self._plan is not None:
+            # Callbacks registered at runtime are added to the live plan,
+            # rather than rebuilding it, so registering stays O(1).
+            self._plan._add_callback(
+                self,
+                event_type,
+                callback_id,
+                view_function
+            )
 
     def route(self, callback_id, **kwargs):
         """
@@ -725,31 +1826,117 @@ class OmnibotInteractiveRouter(object):
                 callback_id,
                 f,
                 event_type=event_type,
+                executor=kwargs.pop('executor', None),
+                timeout=kwargs.pop('timeout', None),
+                timeout_response=kwargs.pop('timeout_response', None),
+                deferred=kwargs.pop('deferred', False),
+                ack_response=kwargs.pop('ack_response', None),
+                cache=kwargs.pop('cache', None),
+                middleware=kwargs.pop('middleware', True),
             )
             return f
 
         return decorator
 
-    def _get_route_match(self, callback_id, event_type):
+    def get_timeout_counts(self):
         """
-        For the given callback_id, find and return the function for a
-        registered route.
+        Get the number of times each route with a timeout exceeded it.
 
-        Args:
+        Returns:
 
-            text (str): The text to match against.
+            A dict of (event_type, callback_id) to count, for every route with
+            a timeout, where event_type is None for routes that match all
+            event types; the default route is counted under
+            ('default', None).
         """
-        # First check for a route based on the event_type.
-        for _callback_id, view_function in self.routes.get(event_type, []):
-            if callback_id == _callback_id:
-                return view_function
-        # If there isn't an event_type override for routes, look in the __all
-        # bucket.
-        for _callback_id, view_function in self.routes.get('__all'):
-            if callback_id == _callback_id:
-                return view_function
+        return _count_wrapped(self._iter_routes(), DeadlineRoute, 'timeouts')
 
-        return None
+    def get_cache_stats(self):
+        """
+        Get the counters of the response cache of each cached route.
+
+        Returns:
+
+            A dict of (event_type, callback_id) to the stats of the route's
+            :class:`omnibot_receiver.memoize.ResultCache`.
+        """
+        return _get_cache_stats(self._iter_routes())
+
+    def invalidate_caches(self):
+        """
+        Remove every cached response of the routes of this router.
+        """
+        _invalidate_caches(self._iter_routes())
+
+    def _iter_routes(self):
+        """
+        Iterate over (event_type, callback_id) keys and functions of every
+        route, including the default route, keyed ('default', None).
+        """
+        for event_type, callbacks in self._callbacks.items():
+            if event_type == '__all':
+                event_type = None
+            for callback_id, view_function in callbacks.items():
+                yield (event_type, callback_id), view_function
+        if self.default_route is not None:
+            yield ('default', None), self.default_route
+
+    def before(self, hook):
+        """
+        Register a hook to call with events before their route, including
+        the default route; see
+        :class:`omnibot_receiver.middleware.Middleware`. Routes registered
+        with ``middleware=False`` skip the hooks. Can be used as a decorator.
+        """
+        return self._add_hook(self.middleware.before_hooks, hook)
+
+    def after(self, hook):
+        """
+        Register a hook to call with events and the response of their route;
+        see :func:`omnibot_receiver.router.OmnibotInteractiveRouter.before()`.
+        """
+        return self._add_hook(self.middleware.after_hooks, hook)
+
+    def around(self, hook):
+        """
+        Register a hook to wrap the routes of events; see
+        :func:`omnibot_receiver.router.OmnibotInteractiveRouter.before()`.
+        """
+        return self._add_hook(self.middleware.around_hooks, hook)
+
+    def _add_hook(self, hooks, hook):
+        _check_not_frozen(self._frozen)
+        hooks.append(hook)
+        # Routes are composed with the hooks when the plan is built.
+        self._plan = None
+        return hook
+
+    def freeze(self):
+        """
+        Freeze this router into an immutable
+        :class:`omnibot_receiver.router.InteractiveDispatchPlan`. A frozen
+        router dispatches every event through its plan, and raises a
+        RouterFrozenError if callbacks are registered after freezing.
+
+        Returns:
+
+            The InteractiveDispatchPlan of this router.
+        """
+        if not self._frozen:
+            self._plan = InteractiveDispatchPlan(self)
+            self._frozen = True
+        return self._plan
+
+    def _get_plan(self):
+        """
+        Get the dispatch plan for the current callbacks, building it if the
+        callbacks changed since it was last built.
+        """
+        plan = self._plan
+        if plan is None:
+            plan = InteractiveDispatchPlan(self)
+            self._plan = plan
+        return plan
 
     def handle_interactive_component(self, event):
         """
@@ -783,22 +1970,386 @@ class OmnibotInteractiveRouter(object):
                     }
                 ]}
         """
-        callback_id = event.get('callback_id')
-        event_type = event.get('type')
-        view_function = self._get_route_match(callback_id, event_type)
-        if view_function:
-            return view_function(event)
+        return self._get_plan().handle_interactive_component(event)
+
+    async def handle_interactive_component_async(self, event):
+        """
+        For the given event, route the event to any routes registered that
+        match the callback id, and return a list of actions for omnibot.
+        Routes defined with ``async def`` are awaited, while other routes are
+        called directly, in the event loop.
+
+        Args:
+
+            event (dict): An interactive event sent by omnibot.
+
+        Returns:
+
+            A dict with an `actions` attribute that contains a list of slack
+            actions to be returned to omnibot. See the
+            handle_interactive_component function of
+            :class:`omnibot_receiver.router.OmnibotInteractiveRouter`.
+        """
+        return await self._get_plan().handle_interactive_component_async(
+            event
+        )
+
+    def _resolve_event(self, event):
+        return self._get_plan().resolve_interactive_component(event)
+
+
+class InteractiveDispatchPlan(_DispatchPlan):
+
+    """
+    An immutable dispatch plan for the callbacks of an
+    :class:`omnibot_receiver.router.OmnibotInteractiveRouter`, with event
+    type specific callbacks flattened into a single index keyed by
+    (event_type, callback_id). Plans are created by
+    :func:`omnibot_receiver.router.OmnibotInteractiveRouter.freeze()`.
+    """
+
+    __slots__ = (
+        'callbacks',
+        'all_callbacks',
+        'fallback',
+        'metrics',
+        '_callbacks',
+        '_all_callbacks',
+    )
+
+    def __init__(self, router):
+        """
+        Init function for InteractiveDispatchPlan.
+
+        Args:
+
+            router (OmnibotInteractiveRouter): The router to build a plan for.
+
+        Returns:
+
+            An instance of InteractiveDispatchPlan
+        """
+        callbacks = {}
+        all_callbacks = {}
+        for event_type, type_callbacks in router._callbacks.items():
+            if event_type == '__all':
+                event_type = None
+            for callback_id, view_function in type_callbacks.items():
+                key = (event_type, callback_id)
+                view_function = _compose_route(router, key, view_function)
+                if event_type is None:
+                    all_callbacks[callback_id] = view_function
+                else:
+                    callbacks[key] = view_function
+        fallback = router.default_route
+        if fallback is not None:
+            fallback = _compose_route(
+                router,
+                ('default', None),
+                fallback,
+                fallback='default'
+            )
+        self._set(
+            callbacks=MappingProxyType(callbacks),
+            all_callbacks=MappingProxyType(all_callbacks),
+            fallback=fallback,
+            metrics=router.metrics,
+            _callbacks=callbacks,
+            _all_callbacks=all_callbacks,
+        )
+
+    def _add_callback(self, router, event_type, callback_id, view_function):
+        """
+        Compose a callback registered on the (unfrozen) router after the plan
+        was built, and add it to the plan's index.
+        """
+        key = (event_type, callback_id)
+        view_function = _compose_route(router, key, view_function)
+        if event_type is None:
+            self._all_callbacks[callback_id] = view_function
         else:
-            # No match, fall back to the default route, if defined
-            if self.default_route:
-                return self.default_route(event)
-            else:
-                # No default route, raise an exception.
-                raise NoMatchedRouteError(
-                    'No route "{}" and no default route set.'.format(
-                        callback_id
-                    )
+            self._callbacks[key] = view_function
+
+    def handle_interactive_component(self, event):
+        """
+        Route the event; see the handle_interactive_component function of
+        :class:`omnibot_receiver.router.OmnibotInteractiveRouter`.
+        """
+        if self.metrics is not None:
+            match_time, view_function, kwargs = _resolve_timed(
+                self.metrics,
+                self.resolve_interactive_component,
+                event
+            )
+            return view_function.call_matched(match_time, event, kwargs)
+        view_function, kwargs = self.resolve_interactive_component(event)
+        return view_function(event, **kwargs)
+
+    async def handle_interactive_component_async(self, event):
+        """
+        Route the event, awaiting async routes; see the
+        handle_interactive_component_async function of
+        :class:`omnibot_receiver.router.OmnibotInteractiveRouter`.
+        """
+        if self.metrics is not None:
+            match_time, view_function, kwargs = _resolve_timed(
+                self.metrics,
+                self.resolve_interactive_component,
+                event
+            )
+            return await view_function.call_matched_async(
+                match_time,
+                event,
+                kwargs
+            )
+        view_function, kwargs = self.resolve_interactive_component(event)
+        return await call_route_async(view_function, event, **kwargs)
+
+    def resolve_interactive_component(self, event):
+        """
+        Find the function that should handle the given event.
+
+        Returns:
+
+            A tuple of (view_function, kwargs), where kwargs is always empty,
+            for consistency with
+            :func:`omnibot_receiver.router.MessageDispatchPlan.resolve_message()`.
+        """
+        callback_id = event.get('callback_id')
+        view_function = (
+            self.callbacks.get((event.get('type'), callback_id)) or
+            self.all_callbacks.get(callback_id)
+        )
+        return _resolve_interactive(view_function, self.fallback, event)
+
+
+def _resolve_interactive(view_function, default_route, event):
+    if view_function:
+        return view_function, {}
+    # No match, fall back to the default route, if defined
+    if default_route:
+        return default_route, {}
+    # No default route, raise an exception.
+    raise NoMatchedRouteError(
+        'No route "{}" and no default route set.'.format(
+            event.get('callback_id')
+        )
+    )
+
+
+class EventDispatchPlan(_DispatchPlan):
+
+    """
+    An immutable dispatch plan for an
+    :class:`omnibot_receiver.router.OmnibotRouter`, mapping each supported
+    omnibot payload type straight to the plan of the router that handles it.
+    Plans are created by
+    :func:`omnibot_receiver.router.OmnibotRouter.freeze()`.
+    """
+
+    __slots__ = ('handlers', 'async_handlers', 'resolvers')
+
+    def __init__(self, router):
+        """
+        Init function for EventDispatchPlan. Freezes the message and
+        interactive routers of the given router.
+
+        Args:
+
+            router (OmnibotRouter): The router to build a plan for.
+
+        Returns:
+
+            An instance of EventDispatchPlan
+        """
+        handlers = {}
+        async_handlers = {}
+        resolvers = {}
+        if router.message_router:
+            message_plan = router.message_router.freeze()
+            for payload_type in ('message', 'reaction'):
+                handlers[payload_type] = message_plan.handle_message
+                async_handlers[payload_type] = (
+                    message_plan.handle_message_async
                 )
+                resolvers[payload_type] = message_plan.resolve_message
+        if router.interactive_router:
+            interactive_plan = router.interactive_router.freeze()
+            handlers['interactive_component'] = (
+                interactive_plan.handle_interactive_component
+            )
+            async_handlers['interactive_component'] = (
+                interactive_plan.handle_interactive_component_async
+            )
+            resolvers['interactive_component'] = (
+                interactive_plan.resolve_interactive_component
+            )
+        self._set(
+            handlers=MappingProxyType(handlers),
+            async_handlers=MappingProxyType(async_handlers),
+            resolvers=MappingProxyType(resolvers),
+        )
+
+    def handle_event(self, event):
+        """
+        Route the event; see
+        :func:`omnibot_receiver.router.OmnibotRouter.handle_event()`.
+        """
+        return _get_payload_handler(self.handlers, event)(event)
+
+    async def handle_event_async(self, event):
+        """
+        Route the event, awaiting async routes; see
+        :func:`omnibot_receiver.router.OmnibotRouter.handle_event_async()`.
+        """
+        return await _get_payload_handler(self.async_handlers, event)(event)
+
+    def resolve_event(self, event):
+        """
+        Find the function that should handle the event; see
+        :func:`omnibot_receiver.router.OmnibotRouter.resolve_event()`.
+        """
+        return _get_payload_handler(self.resolvers, event)(event)
+
+
+def _get_payload_handler(handlers, event):
+    handler = handlers.get(event.get('omnibot_payload_type'))
+    if handler is None:
+        raise UnsupportedPayloadError(
+            'Payload type currently unsupported'
+        )
+    return handler
+
+
+class _EventHandler(WrappedRoute):
+
+    """
+    The routing of events by an OmnibotRouter, as a route function for its
+    middleware to wrap.
+    """
+
+    __slots__ = ('router',)
+
+    def __init__(self, router):
+        self.router = router
+
+    def __call__(self, event):
+        return self.router._dispatch_event(event)
+
+    async def call_async(self, event):
+        return await self.router._dispatch_event_async(event)
+
+
+def _wrap_route(router, route_func, executor=None, timeout=None,
+                timeout_response=None, deferred=False, ack_response=None,
+                coalesce=False, cache=None):
+    """
+    Wrap a route function according to its options, falling back to the
+    router-wide time budget. Deferred routes only get a timeout of their
+    own, since nobody waits for them; a router-wide timeout would hand the
+    timeout response to their sink in place of their response.
+    """
+    if timeout is None and not deferred:
+        timeout = router.timeout
+    if timeout_response is None:
+        timeout_response = router.timeout_response
+    view_function = wrap_route(
+        route_func,
+        executor=executor,
+        timeout=timeout,
+        timeout_response=timeout_response,
+        timeout_pool=router.timeout_pool,
+    )
+    if coalesce is True:
+        view_function = CoalescedRoute(view_function)
+    elif coalesce:
+        view_function = CoalescedRoute(view_function, coalesce)
+    if cache is not None:
+        view_function = MemoizedRoute(view_function, get_result_cache(cache))
+    if deferred is True:
+        view_function = DeferredRoute(view_function, None, ack_response)
+    elif deferred:
+        view_function = DeferredRoute(view_function, deferred, ack_response)
+    return view_function
+
+
+def _resolve_timed(metrics, resolve, event):
+    """
+    Resolve the route of an event, timing it, and counting events that
+    match no route.
+
+    Returns:
+
+        A tuple of (match_time, view_function, kwargs)
+    """
+    start = time.perf_counter()
+    try:
+        view_function, kwargs = resolve(event)
+    except NoMatchedRouteError:
+        metrics.record_no_match()
+        raise
+    return time.perf_counter() - start, view_function, kwargs
+
+
+def _compose_route(router, key, view_function, fallback=None):
+    """
+    Compose a route function with the hooks of its router, unless the route
+    opted out of them, and instrument it if the router records metrics.
+    """
+    if key not in router._middleware_exempt:
+        view_function = router.middleware.compose(view_function)
+    if router.metrics is not None:
+        view_function = InstrumentedRoute(
+            view_function,
+            key,
+            router.metrics,
+            fallback
+        )
+    return view_function
+
+
+def _find_wrapped(view_function, wrapper_class):
+    """
+    Find the layer of a wrapped route function that is an instance of the
+    given class, or None.
+    """
+    while isinstance(view_function, WrappedRoute):
+        if isinstance(view_function, wrapper_class):
+            return view_function
+        view_function = view_function.view_function
+    return None
+
+
+def _get_cache_stats(routes):
+    stats = {}
+    for key, view_function in routes:
+        memoized = _find_wrapped(view_function, MemoizedRoute)
+        if memoized is not None:
+            stats[key] = memoized.cache.stats()
+    return stats
+
+
+def _invalidate_caches(routes):
+    for _, view_function in routes:
+        memoized = _find_wrapped(view_function, MemoizedRoute)
+        if memoized is not None:
+            memoized.cache.invalidate()
+
+
+def _count_wrapped(routes, wrapper_class, attr):
+    counts = {}
+    for key, view_function in routes:
+        wrapped = _find_wrapped(view_function, wrapper_class)
+        if wrapped is not None:
+            counts[key] = getattr(wrapped, attr)
+    return counts
+
+
+def _check_not_frozen(frozen):
+    if frozen:
+        raise RouterFrozenError(
+            'Routes can not be changed after the router is frozen.'
+        )
 
 
 class RouteAlreadyDefinedError(Exception):
@@ -811,3 +2362,7 @@ class NoMatchedRouteError(Exception):
 
 class UnsupportedPayloadError(Exception):
     pass
+
+
+class RouterFrozenError(Exception):
+    pass
@@ -14,4 +14,9 @@ setup(
     maintainer='Lyft',
     maintainer_email='rlane@lyft.com',
     packages=find_packages(exclude=['tests*']),
+    python_requires='>=3.7',
+    extras_require={
+        'orjson': ['orjson'],
+        'ujson': ['ujson'],
+    },
 )
@@ -0,0 +1,199 @@
+import asyncio
+import io
+import json
+
+import pytest
+
+from omnibot_receiver.app import ASGIApp, WSGIApp
+from omnibot_receiver.router import (
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+    OmnibotRouter,
+)
+
+EVENT = {
+    'omnibot_payload_type': 'message',
+    'args': 'ping',
+    'match_type': 'command'
+}
+
+
+def _router():
+    message_router = OmnibotMessageRouter(help_as_default=False)
+    interactive_router = OmnibotInteractiveRouter()
+
+    @message_router.route('ping')
+    def ping(message):
+        return {'actions': [{'kwargs': {'text': 'pong ✓'}}]}
+
+    @interactive_router.route('ping')
+    async def interactive_ping(event):
+        return {'responses': []}
+
+    return OmnibotRouter(
+        message_router=message_router,
+        interactive_router=interactive_router,
+    )
+
+
+class _Stream(object):
+
+    def __init__(self, body, chunk_size):
+        self.body = io.BytesIO(body)
+        self.chunk_size = chunk_size
+
+    def read(self, size):
+        return self.body.read(min(size, self.chunk_size))
+
+
+class TestWSGIApp(object):
+
+    def _call(self, app, body, method='POST', length=None, stream=None):
+        if length is None:
+            length = str(len(body))
+        environ = {
+            'REQUEST_METHOD': method,
+            'CONTENT_LENGTH': length,
+            'wsgi.input': stream or io.BytesIO(body),
+        }
+        started = []
+        ret = app(environ, lambda status, headers: started.append(
+            (status, dict(headers))
+        ))
+        status, headers = started[0]
+        body = b''.join(ret)
+        assert headers['Content-Length'] == str(len(body))
+        assert headers['Content-Type'] == 'application/json'
+        return status, json.loads(body.decode('utf-8'))
+
+    def test_app(self):
+        app = WSGIApp(_router(), max_body_size=1024)
+        body = json.dumps(EVENT).encode('utf-8')
+
+        assert self._call(app, body) == (
+            '200 OK',
+            {'actions': [{'kwargs': {'text': 'pong ✓'}}]}
+        )
+        assert self._call(
+            app,
+            body,
+            stream=_Stream(body, 7)
+        )[0] == '200 OK'
+        assert self._call(app, body, method='GET')[0].startswith('405')
+        assert self._call(app, body, length='')[0].startswith('411')
+        assert self._call(app, body, length='-1')[0].startswith('411')
+        assert self._call(app, b' ' * 1025)[0].startswith('413')
+        assert self._call(app, b'{"args":')[0].startswith('400')
+        assert self._call(app, b'[]')[0].startswith('400')
+        assert self._call(app, body, length='100')[0] == '200 OK'
+        assert self._call(
+            app,
+            b'{"omnibot_payload_type":"unknown"}'
+        )[0].startswith('400')
+        status, ret = self._call(
+            app,
+            body.replace(b'"ping"', b'"unknown"')
+        )
+        assert status.startswith('404')
+        assert ret == {'error': 'No matched route.'}
+
+
+class TestASGIApp(object):
+
+    def _call(self, app, chunks, method='POST', headers=None):
+        messages = [
+            {'type': 'http.request', 'body': chunk, 'more_body': True}
+            for chunk in chunks
+        ]
+        messages.append({'type': 'http.request', 'body': b''})
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': method,
+            'headers': headers or [],
+        }
+        asyncio.run(app(scope, receive, send))
+        start, body = sent
+        assert dict(start['headers'])[b'content-length'] == str(
+            len(body['body'])
+        ).encode('ascii')
+        return start['status'], json.loads(body['body'].decode('utf-8'))
+
+    def test_app(self):
+        app = ASGIApp(_router(), max_body_size=1024)
+        body = json.dumps(EVENT).encode('utf-8')
+        chunks = [body[:10], body[10:20], body[20:]]
+
+        assert self._call(app, chunks) == (
+            200,
+            {'actions': [{'kwargs': {'text': 'pong ✓'}}]}
+        )
+        assert self._call(
+            app,
+            chunks,
+            headers=[(b'content-length', str(len(body)).encode('ascii'))]
+        )[0] == 200
+        assert self._call(
+            app,
+            [b'{"omnibot_payload_type":"interactive_component",',
+             b'"callback_id":"ping"}']
+        ) == (200, {'responses': []})
+        assert self._call(app, chunks, method='PUT')[0] == 405
+        assert self._call(app, [b' ' * 1025])[0] == 413
+        assert self._call(
+            app,
+            [],
+            headers=[(b'content-length', b'2048')]
+        )[0] == 413
+        assert self._call(
+            app,
+            chunks,
+            headers=[(b'content-length', b'-1')]
+        )[0] == 200
+        assert self._call(app, [b'not json'])[0] == 400
+        assert self._call(
+            app,
+            [body.replace(b'"ping"', b'"unknown"')]
+        )[0] == 404
+
+    def test_lifespan(self):
+        app = ASGIApp(_router())
+        messages = [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(app({'type': 'lifespan'}, receive, send))
+        assert sent == [
+            'lifespan.startup.complete',
+            'lifespan.shutdown.complete',
+        ]
+
+    def test_other_scopes(self):
+        app = ASGIApp(_router())
+        sent = []
+
+        async def receive():
+            return {'type': 'websocket.connect'}
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(app({'type': 'websocket', 'path': '/'}, receive, send))
+        assert sent == [{'type': 'websocket.close', 'code': 1008}]
+        with pytest.raises(ValueError):
+            asyncio.run(app({'type': 'webtransport'}, receive, send))
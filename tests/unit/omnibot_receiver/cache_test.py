@@ -0,0 +1,80 @@
+import pytest
+
+from omnibot_receiver.cache import LRUCache
+
+
+class TestLRUCache(object):
+
+    def test_get_and_set(self):
+        cache = LRUCache(maxsize=2)
+
+        assert cache.get('a') is None
+        assert cache.get('a', 'default') == 'default'
+        cache.set('a', 1)
+        assert cache.get('a') == 1
+        assert 'a' in cache
+        assert cache.stats() == {
+            'hits': 1,
+            'misses': 2,
+            'evictions': 0,
+            'expirations': 0,
+            'size': 1,
+            'maxsize': 2,
+        }
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert 'a' in cache
+        assert 'b' not in cache
+        assert 'c' in cache
+        assert cache.evictions == 1
+
+    def test_clear(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.get('a')
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.hits == 1
+
+    def test_ttl(self):
+        now = [0]
+        cache = LRUCache(maxsize=2, ttl=10, timer=lambda: now[0])
+        cache.set('a', 1)
+        now[0] = 5
+        cache.set('b', 2)
+        cache.set('c', 3)
+
+        assert 'a' not in cache
+        assert cache.get('b') == 2
+        now[0] = 14
+        assert 'b' in cache
+        assert cache.get('b') == 2
+        now[0] = 15
+        assert 'b' not in cache
+        assert cache.get('b') is None
+        assert cache.expirations == 1
+        assert cache.evictions == 1
+        cache.set('b', 4)
+        assert cache.get('b') == 4
+
+    def test_invalid_maxsize(self):
+        with pytest.raises(ValueError):
+            LRUCache(maxsize=0)
+
+    def test_delete_and_keys(self):
+        cache = LRUCache(maxsize=3, ttl=10)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.delete('b')
+        cache.delete('missing')
+
+        assert cache.keys() == ['a']
+        assert 'b' not in cache
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+
+from omnibot_receiver.coalesce import patch_response
+from omnibot_receiver.router import OmnibotMessageRouter
+
+
+def _reply(message, text):
+    return {'actions': [{
+        'action': 'chat.postMessage',
+        'kwargs': {
+            'channel': message['channel_id'],
+            'thread_ts': message.get('thread_ts') or message['ts'],
+            'text': text,
+        },
+    }]}
+
+
+class TestCoalescedRoute(object):
+
+    def test_patch_response(self, make_message):
+        leader = make_message('status api', channel_id='C1', ts='1.1')
+        follower = make_message(
+            'status api',
+            channel_id='C2',
+            ts='2.2',
+            thread_ts='2.0'
+        )
+        response = _reply(leader, 'C1')
+        response['actions'].append({'action': 'reactions.add'})
+
+        patch_response(response, leader, follower)
+        assert response['actions'][0]['kwargs'] == {
+            'channel': 'C2',
+            'thread_ts': '2.0',
+            'text': 'C1',
+        }
+        assert patch_response(None, leader, follower) is None
+
+    def test_concurrent_calls(self, make_message):
+        message_router = OmnibotMessageRouter()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        @message_router.route('status <service>', coalesce=True)
+        def status(message, service):
+            calls.append(message)
+            started.set()
+            release.wait()
+            return _reply(message, service)
+
+        messages = [
+            make_message(
+                'status api',
+                channel_id='C{}'.format(i),
+                ts='{}.1'.format(i)
+            )
+            for i in range(4)
+        ]
+        results = {}
+
+        def handle(message):
+            results[message['channel_id']] = message_router.handle_message(
+                message
+            )
+
+        threads = [
+            threading.Thread(target=handle, args=(message,))
+            for message in messages
+        ]
+        threads[0].start()
+        assert started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while message_router.get_collapsed_counts() != {
+            ('command', 'status <service>'): 3
+        }:
+            release.wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        for message in messages:
+            assert results[message['channel_id']] == _reply(message, 'api')
+        message = make_message('status web', channel_id='C1', ts='5.5')
+        assert message_router.handle_message(message) == _reply(
+            message,
+            'web'
+        )
+        assert len(calls) == 2
+
+    def test_key_async(self, make_message):
+        message_router = OmnibotMessageRouter()
+        calls = []
+
+        @message_router.route(
+            'oncall <team>',
+            coalesce=lambda message: message['channel_id']
+        )
+        async def oncall(message, team):
+            calls.append(message)
+            await asyncio.sleep(0.01)
+            return _reply(message, team)
+
+        messages = [
+            make_message('oncall infra', channel_id='C1', ts='1.1'),
+            make_message('oncall infra', channel_id='C1', ts='1.2'),
+            make_message('oncall infra', channel_id='C2', ts='1.3'),
+            make_message('oncall data', channel_id='C1', ts='1.4'),
+        ]
+
+        async def run():
+            return await asyncio.gather(*[
+                message_router.handle_message_async(message)
+                for message in messages
+            ])
+
+        results = asyncio.run(run())
+        assert len(calls) == 3
+        assert results == [
+            _reply(messages[0], 'infra'),
+            _reply(messages[1], 'infra'),
+            _reply(messages[2], 'infra'),
+            _reply(messages[3], 'data'),
+        ]
+        assert message_router.get_collapsed_counts() == {
+            ('command', 'oncall <team>'): 1
+        }
@@ -0,0 +1,28 @@
+import pytest
+
+from omnibot_receiver import codec
+
+
+class TestCodec(object):
+
+    def test_backends(self):
+        obj = {
+            'text': 'café <http://example.com|link>',
+            'actions': [{'action': 'chat.postMessage', 'kwargs': {}}],
+            'count': 1,
+            'ok': True,
+            'missing': None,
+        }
+        assert codec.backend is codec.get_backend()
+        assert 'json' in codec.BACKENDS
+        for name in codec.BACKENDS:
+            backend = codec.get_backend(name)
+            assert backend.name == name
+            body = backend.dumps(obj)
+            assert isinstance(body, bytes)
+            assert body == codec.get_backend('json').dumps(obj)
+            assert backend.loads(body) == obj
+            assert backend.loads(body.decode('utf-8')) == obj
+        assert codec.loads(codec.dumps(obj)) == obj
+        with pytest.raises(ValueError):
+            codec.get_backend('unknown')
@@ -0,0 +1,20 @@
+import pytest
+
+
+def _make_message(args, match_type='command', **fields):
+    message = {
+        'omnibot_payload_type': 'message',
+        'args': args,
+        'match_type': match_type,
+    }
+    message.update(fields)
+    return message
+
+
+@pytest.fixture
+def make_message():
+    """
+    A factory of message events, as sent by omnibot:
+    ``make_message(args, match_type='command', **fields)``.
+    """
+    return _make_message
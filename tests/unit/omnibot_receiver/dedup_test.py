@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+import pytest
+
+from omnibot_receiver.dedup import Deduplicator, get_event_key
+from omnibot_receiver.router import OmnibotMessageRouter, OmnibotRouter
+
+
+MESSAGE = {
+    'omnibot_payload_type': 'message',
+    'match_type': 'command',
+    'args': 'ping',
+    'channel_id': 'C123',
+    'user': 'U123',
+    'ts': '1.1',
+}
+
+
+class _DictStore(object):
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+class TestDeduplicator(object):
+
+    def test_get_event_key(self):
+        assert get_event_key({'event_id': 'Ev123', 'ts': '1.1'}) == 'Ev123'
+        assert get_event_key({'trigger_id': '123.456'}) == '123.456'
+        assert get_event_key(MESSAGE) == 'message:C123:1.1:U123:ping'
+        assert get_event_key({'callback_id': 'ping'}) is None
+
+    def test_router(self):
+        calls = []
+        message_router = OmnibotMessageRouter()
+        router = OmnibotRouter(
+            message_router=message_router,
+            deduplicator=Deduplicator(store=_DictStore())
+        )
+
+        @message_router.route('ping')
+        def ping(message):
+            calls.append(message)
+            if len(calls) == 1:
+                raise ValueError('failed')
+            return {'actions': ['pong']}
+
+        with pytest.raises(ValueError):
+            router.handle_event(MESSAGE)
+        ret = router.handle_event(MESSAGE)
+        assert ret == {'actions': ['pong']}
+        ret['actions'].append('mutated')
+        assert router.handle_event(MESSAGE) == {'actions': ['pong']}
+        assert asyncio.run(router.handle_event_async(MESSAGE)) == {
+            'actions': ['pong']
+        }
+        assert router.handle_event(dict(MESSAGE, ts='2.2')) == {
+            'actions': ['pong']
+        }
+        assert len(calls) == 3
+        assert router.deduplicator.stats() == {
+            'duplicates': 2,
+            'coalesced': 0,
+        }
+
+    def test_concurrent_duplicates(self):
+        deduplicator = Deduplicator(ttl=60)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def handler(event):
+            calls.append(event)
+            started.set()
+            release.wait()
+            return {'actions': ['pong']}
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    deduplicator.handle(MESSAGE, handler)
+                )
+            )
+            for _ in range(4)
+        ]
+        threads[0].start()
+        assert started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while deduplicator.coalesced < 3:
+            release.wait(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == [{'actions': ['pong']}] * 4
+        assert deduplicator.stats() == {'duplicates': 0, 'coalesced': 3}
+
+    def test_concurrent_duplicates_async(self):
+        deduplicator = Deduplicator()
+        calls = []
+
+        async def handler(event):
+            calls.append(event)
+            await asyncio.sleep(0.01)
+            return {'actions': ['pong']}
+
+        async def run():
+            return await asyncio.gather(*[
+                deduplicator.handle_async(MESSAGE, handler)
+                for _ in range(3)
+            ])
+
+        assert asyncio.run(run()) == [{'actions': ['pong']}] * 3
+        assert len(calls) == 1
+        assert deduplicator.coalesced == 2
+
+    def test_handle_events(self):
+        calls = []
+        message_router = OmnibotMessageRouter()
+        router = OmnibotRouter(
+            message_router=message_router,
+            deduplicator=Deduplicator()
+        )
+
+        @message_router.route('ping')
+        def ping(message):
+            calls.append(message)
+            return {'actions': ['pong']}
+
+        router.handle_event(MESSAGE)
+        results = router.handle_events(
+            [MESSAGE, dict(MESSAGE, ts='2.2'), MESSAGE],
+            max_workers=1
+        )
+        assert [result.response for result in results] == [
+            {'actions': ['pong']}
+        ] * 3
+        assert len(calls) == 2
+        assert router.deduplicator.duplicates == 2
@@ -0,0 +1,225 @@
+import asyncio
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import json
+import queue
+import threading
+import time
+
+import pytest
+
+from omnibot_receiver import deferred
+from omnibot_receiver.deferred import (
+    DeferredPool,
+    DeferredPoolFullError,
+    HTTPSink,
+    QueueSink,
+)
+from omnibot_receiver.router import (
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+    OmnibotRouter,
+)
+
+
+class TestDeferredRoute(object):
+
+    def test_message_route(self):
+        results = queue.Queue()
+        pool = DeferredPool(sink=QueueSink(results), max_workers=2)
+        message_router = OmnibotMessageRouter()
+        router = OmnibotRouter(message_router=message_router)
+
+        @message_router.route('report <id>', deferred=pool)
+        def report(message, id):
+            return {'actions': [id]}
+
+        @message_router.route('async report', deferred=pool)
+        async def async_report(message):
+            return {'actions': ['async']}
+
+        event = {
+            'omnibot_payload_type': 'message',
+            'args': 'report 1',
+            'match_type': 'command'
+        }
+        ret = router.handle_event(event)
+        assert ret == {'actions': []}
+        assert results.get(timeout=5) == (event, {'actions': ['1']})
+        ret['actions'].append('mutated')
+
+        event = dict(event, args='async report')
+        assert asyncio.run(router.handle_event_async(event)) == {
+            'actions': []
+        }
+        assert results.get(timeout=5) == (event, {'actions': ['async']})
+        pool.shutdown()
+
+    def test_shared_pool(self):
+        results = []
+        errors = []
+        done = threading.Event()
+
+        def sink(event, response):
+            results.append(response)
+
+        def error_sink(event, error):
+            errors.append(error)
+            done.set()
+
+        deferred.set_deferred_pool(
+            DeferredPool(sink=sink, error_sink=error_sink)
+        )
+        interactive_router = OmnibotInteractiveRouter()
+
+        @interactive_router.route(
+            'fail',
+            deferred=True,
+            ack_response={'responses': ['ack']}
+        )
+        def fail(event):
+            raise ValueError('failed')
+
+        ret = interactive_router.handle_interactive_component(
+            {'callback_id': 'fail'}
+        )
+        assert ret == {'responses': ['ack']}
+        assert done.wait(5)
+        assert results == []
+        assert isinstance(errors[0], ValueError)
+        deferred.get_deferred_pool().shutdown()
+        deferred.set_deferred_pool(None)
+
+    def test_backpressure(self):
+        release = threading.Event()
+        pool = DeferredPool(max_workers=1, max_pending=1, submit_timeout=0.05)
+        message_router = OmnibotMessageRouter()
+
+        @message_router.route('slow', deferred=pool)
+        def slow(message):
+            release.wait()
+
+        message = {'args': 'slow', 'match_type': 'command'}
+        message_router.handle_message(message)
+        message_router.handle_message(message)
+        with pytest.raises(DeferredPoolFullError):
+            message_router.handle_message(message)
+        release.set()
+        pool.shutdown()
+
+    def test_router_timeout_not_inherited(self):
+        results = queue.Queue()
+        pool = DeferredPool(sink=QueueSink(results))
+        message_router = OmnibotMessageRouter(
+            timeout=0.01,
+            timeout_response={'actions': ['working']}
+        )
+
+        @message_router.route('report', deferred=pool)
+        def report(message):
+            time.sleep(0.05)
+            return {'actions': ['report']}
+
+        message = {'args': 'report', 'match_type': 'command'}
+        assert message_router.handle_message(message) == {'actions': []}
+        assert results.get(timeout=5) == (message, {'actions': ['report']})
+        pool.shutdown()
+
+    def test_backpressure_async(self):
+        release = threading.Event()
+        pool = DeferredPool(max_workers=1, max_pending=0)
+        message_router = OmnibotMessageRouter()
+
+        @message_router.route('slow', deferred=pool)
+        def slow(message):
+            release.wait()
+
+        message = {'args': 'slow', 'match_type': 'command'}
+
+        async def run():
+            ticks = 0
+            await message_router.handle_message_async(message)
+            second = asyncio.ensure_future(
+                message_router.handle_message_async(message)
+            )
+            # The event loop keeps running while the second route waits for
+            # a slot in the pool.
+            while ticks < 5:
+                await asyncio.sleep(0.001)
+                ticks += 1
+            assert not second.done()
+            release.set()
+            return await second
+
+        assert asyncio.run(run()) == {'actions': []}
+        pool.shutdown()
+
+    def test_cancelled_submit_async(self):
+        release = threading.Event()
+        pool = DeferredPool(max_workers=1, max_pending=0)
+
+        def slow(message):
+            release.wait()
+
+        message = {'args': 'slow', 'match_type': 'command'}
+
+        async def run():
+            await pool.submit_async(slow, message, {})
+            waiting = asyncio.ensure_future(
+                pool.submit_async(slow, message, {})
+            )
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            release.set()
+            # The slot taken for the cancelled submission is given back.
+            for _ in range(500):
+                if pool._slots._value == 1:
+                    break
+                await asyncio.sleep(0.01)
+            assert pool._slots._value == 1
+
+        asyncio.run(run())
+        pool.shutdown()
+
+
+class TestHTTPSink(object):
+
+    def test_post(self):
+        posts = queue.Queue()
+
+        class StubHandler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                posts.put((self.path, self.headers['X-Token'], body))
+                self.send_response(200)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), StubHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            sink = HTTPSink(
+                'http://127.0.0.1:{}/actions'.format(server.server_port),
+                headers={'X-Token': 'token'},
+                get_body=lambda event, response: dict(
+                    response,
+                    channel=event['channel']
+                )
+            )
+            sink({'channel': 'C1'}, {'actions': []})
+            path, token, body = posts.get(timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        assert path == '/actions'
+        assert token == 'token'
+        assert json.loads(body.decode('utf-8')) == {
+            'actions': [],
+            'channel': 'C1',
+        }
@@ -0,0 +1,336 @@
+import pytest
+
+from omnibot_receiver.dispatch import (
+    AdaptiveMatcher,
+    CombinedMatcher,
+    LinearMatcher,
+    LiteralMatcher,
+    LiteralPrefixMatcher,
+    SubstringFilterMatcher,
+)
+from omnibot_receiver.router import OmnibotMessageRouter
+
+
+def _routes(*rules):
+    return [
+        (OmnibotMessageRouter._get_route_pattern(rule), rule)
+        for rule in rules
+    ]
+
+
+class TestCombinedMatcher(object):
+
+    def test_first_registered_route_wins(self):
+        matcher = CombinedMatcher(_routes('ping .*', 'ping <target>', 'ping'))
+
+        assert matcher.match('ping foo') == ({}, 'ping .*')
+        assert matcher.match('ping') == ({}, 'ping')
+        assert matcher.match('pong') is None
+
+    def test_captures_are_namespaced_per_route(self):
+        matcher = CombinedMatcher(
+            _routes('find <user>', '<a?> to <b>', 'deploy <user> <env>')
+        )
+
+        assert matcher.match('find testuser') == (
+            {'user': 'testuser'},
+            'find <user>',
+        )
+        assert matcher.match('1 to 2 to 3') == (
+            {'a': '1', 'b': '2 to 3'},
+            '<a?> to <b>',
+        )
+        assert matcher.match('deploy me now') == (
+            {'user': 'me', 'env': 'now'},
+            'deploy <user> <env>',
+        )
+
+    def test_unmergeable_patterns_keep_precedence(self):
+        routes = _routes(
+            'echo <text>',
+            r'(\w+) \1',
+            'hello hello',
+            'hello <name>',
+        )
+        matcher = CombinedMatcher(routes)
+
+        assert len(matcher.chunks) == 3
+        assert matcher.match('hello hello') == ({}, r'(\w+) \1')
+        assert matcher.match('hello you') == ({'name': 'you'}, 'hello <name>')
+        assert matcher.match('echo hi') == ({'text': 'hi'}, 'echo <text>')
+
+    def test_matches_linear_matcher(self):
+        routes = _routes(
+            'a|b',
+            '123.*abc',
+            r'\+1',
+            'find <user>',
+            '(a)?b(c)',
+            '<x?>-<y>',
+            '.*ping.*',
+        )
+        combined = CombinedMatcher(routes)
+        linear = LinearMatcher(routes)
+        texts = [
+            'a', 'ab', 'xb', 'b', '123 hello abc', '+1', 'find me',
+            'bc', 'abc', 'ping', 'a ping b', 'nothing', '', 'a\n', 'x-y-z',
+        ]
+
+        for text in texts:
+            assert combined.match(text) == linear.match(text)
+
+
+class TestLiteralPrefixMatcher(object):
+
+    def test_routes_are_indexed(self):
+        matcher = LiteralPrefixMatcher(_routes(
+            'ping',
+            r'\+1',
+            'deploy <service>',
+            'oncall <team?>',
+            'dep.*',
+            '<a> to <b>',
+        ))
+
+        assert sorted(matcher.literals) == ['+1', 'ping']
+        assert sorted(matcher.trie.children) == ['deploy', 'oncall']
+        assert [r[0] for r in matcher.trie.routes] == ['dep']
+        assert matcher.fallback_indexes == [5]
+
+    def test_literal_fast_path(self):
+        matcher = LiteralPrefixMatcher(_routes('ping', 'pong', '.*'))
+
+        assert matcher.match('pong') == ({}, 'pong')
+        assert matcher.match('other') == ({}, '.*')
+
+    def test_earlier_routes_take_precedence_over_literals(self):
+        matcher = LiteralPrefixMatcher(_routes(
+            'deploy .*',
+            '.*now',
+            'deploy now',
+            'deploy later',
+            'deploy <service> <env>',
+        ))
+
+        assert matcher.match('deploy now') == ({}, 'deploy .*')
+        assert matcher.match('rollback now') == ({}, '.*now')
+        assert matcher.match('deploy') is None
+
+    @pytest.mark.parametrize(
+        'fallback_class',
+        [LinearMatcher, CombinedMatcher]
+    )
+    def test_matches_linear_matcher(self, fallback_class):
+        routes = _routes(
+            'ping',
+            'ping me',
+            'a|b',
+            '.*later',
+            'deploy <service>',
+            'deploy <service> now',
+            'deploy now',
+            'deploy',
+            'oncall <team?>',
+            'oncall team-<team>',
+            'find <user>',
+            'find',
+            'find me now',
+            '<a?> to <b>',
+            'x+y',
+            'status',
+        )
+        matcher = LiteralPrefixMatcher(routes, fallback_class=fallback_class)
+        linear = LinearMatcher(routes)
+        texts = [
+            'ping', 'ping me', 'ping\n', 'ping me\n', 'a', 'b', 'ab',
+            'deploy', 'deploy ', 'deploy now', 'deploy api now',
+            'deploy api later', 'deploy now\n', 'oncall', 'oncall ',
+            'oncall team-infra', 'oncall infra', 'find', 'find me',
+            'find me now', '1 to 2', 'find me to you', 'xxy', 'status',
+            'status later', 'statuses', '', ' ', 'unknown',
+        ]
+
+        for text in texts:
+            assert matcher.match(text) == linear.match(text)
+
+
+class TestLiteralMatcher(object):
+
+    def test_routes_are_indexed(self):
+        matcher = LiteralMatcher(_routes(
+            'eyes',
+            r'\+1',
+            'white_check_mark',
+            'skin-tone-.*',
+        ))
+
+        assert sorted(matcher.literals) == ['+1', 'eyes', 'white_check_mark']
+        assert matcher.fallback_indexes == [3]
+        assert matcher.match('+1') == ({}, r'\+1')
+        assert matcher.match('skin-tone-2') == ({}, 'skin-tone-.*')
+        assert matcher.match('heart') is None
+
+    @pytest.mark.parametrize(
+        'fallback_class',
+        [LinearMatcher, CombinedMatcher]
+    )
+    def test_matches_linear_matcher(self, fallback_class):
+        routes = _routes(
+            'eyes',
+            'heart.*',
+            'heart',
+            'heart_eyes',
+            '.*_eyes',
+            'raised_eyes',
+            'tada\n',
+            'tada',
+        )
+        matcher = LiteralMatcher(routes, fallback_class=fallback_class)
+        linear = LinearMatcher(routes)
+        texts = [
+            'eyes', 'eyes\n', 'heart', 'heart_eyes', 'heartbeat',
+            'raised_eyes', 'tada', 'tada\n', 'tada\n\n', '', 'unknown',
+        ]
+
+        for text in texts:
+            assert matcher.match(text) == linear.match(text)
+
+
+class TestAdaptiveMatcher(object):
+
+    def test_disjoint_routes_are_reordered_by_hits(self):
+        matcher = AdaptiveMatcher(
+            _routes('.*deploy.*', '.*deploy api.*', '.*alpha.*', '.*beta.*'),
+            disjoint=[False, False, True, True],
+            reorder_interval=10
+        )
+        for _ in range(6):
+            assert matcher.match('beta') == ({}, '.*beta.*')
+        matcher.match('deploy api')
+        matcher.match('alpha')
+        matcher.match('deploy web')
+        # The tenth lookup reorders the routes.
+        assert matcher.match('deploy api') == ({}, '.*deploy.*')
+        assert [route[2] for route in matcher.order] == [
+            '.*beta.*',
+            '.*deploy.*',
+            '.*alpha.*',
+            '.*deploy api.*',
+        ]
+        # Counts are halved on reorder.
+        assert matcher.hits == [2, 0, 0, 3]
+        # Overlapping routes keep their precedence.
+        assert matcher.match_index('deploy api') == (0, {}, '.*deploy.*')
+
+    def test_disjoint_routes_are_found(self):
+        matcher = AdaptiveMatcher(
+            _routes('de.*', 'dea.*', 'dep <a>', 'status <a>', 'ping')
+        )
+        assert matcher.disjoint == [False, False, False, True, True]
+        matcher = AdaptiveMatcher(_routes('status <a>', '.*ping.*'))
+        assert matcher.disjoint == [False, False]
+
+    def test_matches_linear_matcher(self):
+        routes = _routes(
+            '.*deploy.*',
+            'deploy <service>',
+            'status <a>',
+            '.*ping.*',
+            'ping',
+        )
+        linear = LinearMatcher(routes)
+        adaptive = AdaptiveMatcher(
+            routes,
+            disjoint=[False, False, True, False, False],
+            reorder_interval=3
+        )
+        texts = ['status api', 'deploy api', 'ping', 'a ping', 'status x'] * 5
+        for text in texts:
+            assert adaptive.match(text) == linear.match(text)
+
+    def test_router(self):
+        router = OmnibotMessageRouter(adaptive_regex=True)
+        router.route('.*deploy.*', match_type='regex')(lambda message: 1)
+        router.route('.*hot.*', match_type='regex', disjoint=True)(
+            lambda message: 2
+        )
+        matcher = router._get_matcher('regex')
+        assert isinstance(matcher, AdaptiveMatcher)
+        assert matcher.disjoint == [False, True]
+        for _ in range(3):
+            router.handle_message({'args': 'hot', 'match_type': 'regex'})
+        matcher.reorder()
+        assert [route[0] for route in matcher.order] == [1, 0]
+
+
+class TestSubstringFilterMatcher(object):
+
+    def test_only_candidates_are_tried(self):
+        matcher = SubstringFilterMatcher(_routes(
+            '.*deploy <service>.*',
+            '.*foo.*bar.*',
+            '.*ushers.*',
+            '.*she.*',
+        ))
+
+        assert matcher.fallback.routes == []
+        assert sorted(
+            index for index, _, _ in matcher.automaton.scan('the ushers')
+        ) == [2, 3]
+        assert matcher.automaton.scan('nothing to see') == []
+        assert matcher.match('please deploy api') == (
+            {'service': 'api'},
+            '.*deploy <service>.*',
+        )
+        assert matcher.match('the ushers') == ({}, '.*ushers.*')
+        assert matcher.match('bar foo') is None
+
+    def test_routes_without_literals_keep_precedence(self):
+        matcher = SubstringFilterMatcher(
+            _routes('.*deploy.*', '<a> now', '.*now.*', '.*')
+        )
+
+        assert len(matcher.fallback.routes) == 1
+        assert matcher.match('deploy now') == ({}, '.*deploy.*')
+        assert matcher.match('go now') == ({'a': 'go'}, '<a> now')
+        assert matcher.match('now') == ({}, '.*now.*')
+        assert matcher.match('other') == ({}, '.*')
+
+    @pytest.mark.parametrize(
+        'fallback_class',
+        [LinearMatcher, CombinedMatcher]
+    )
+    def test_matches_linear_matcher(self, fallback_class):
+        routes = _routes(
+            '.*deploy.*',
+            '.*deploy <service> now',
+            '(?:ab)+cd',
+            'x(ab)?y',
+            '.*(?i:abc)x.*',
+            'a|bc',
+            '.*foo.*bar.*',
+            '<a?> to <b>',
+            'ping',
+            '.*',
+        )
+        matcher = SubstringFilterMatcher(routes, fallback_class=fallback_class)
+        linear = LinearMatcher(routes)
+        texts = [
+            'deploy', 'deploy api now', 'abcd', 'ababcd', 'xy', 'xaby',
+            'ABCx', 'abcX', 'a', 'bc', 'foo bar', 'bar foo', '1 to 2',
+            'ping', 'ping\n', '', 'unknown',
+        ]
+
+        for text in texts:
+            assert matcher.match(text) == linear.match(text)
+
+    def test_router(self):
+        router = OmnibotMessageRouter(literal_prefilter=True)
+        router.route('.*deploy <service>.*', match_type='regex')(
+            lambda message, service: service
+        )
+        assert isinstance(router._get_matcher('regex'), SubstringFilterMatcher)
+        assert router.handle_message({
+            'args': 'deploy api please',
+            'match_type': 'regex',
+        }) == 'api please'
@@ -0,0 +1,118 @@
+import pickle
+
+import pytest
+
+from omnibot_receiver.event import (
+    OmnibotEvent,
+    OmnibotInteractiveComponent,
+    OmnibotMessage,
+    get_channel_id,
+)
+from omnibot_receiver.router import (
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+    OmnibotRouter,
+)
+
+
+class TestOmnibotEvent(object):
+
+    def test_message(self):
+        payload = {
+            'omnibot_payload_type': 'message',
+            'match_type': 'command',
+            'args': 'find <@U123|test>',
+            'text': '<@UBOT> find <@U123|test> and <@W456>',
+            'channel_id': 'C123',
+            'user': 'U789',
+            'ts': '1.1',
+        }
+        message = OmnibotEvent.from_payload(payload)
+
+        assert isinstance(message, OmnibotMessage)
+        assert OmnibotEvent.from_payload(message) is message
+        assert message.payload_type == 'message'
+        assert message.match_type == 'command'
+        assert message.args == 'find <@U123|test>'
+        assert message.channel_id == 'C123'
+        assert message.user_id == 'U789'
+        assert message.thread_ts is None
+        assert message.reply_thread_ts == '1.1'
+        assert message.mentioned_user_ids == ('UBOT', 'U123', 'W456')
+        assert message.mentioned_user_ids is message.mentioned_user_ids
+
+        assert message == payload
+        assert message['args'] == payload['args']
+        assert message.get('missing', 'default') == 'default'
+        assert 'ts' in message
+        assert dict(message) == payload
+        assert len(message) == len(payload)
+        with pytest.raises(TypeError):
+            message['args'] = 'mutated'
+        with pytest.raises(AttributeError):
+            message.extra = 'extra'
+
+        unpickled = pickle.loads(pickle.dumps(message))
+        assert isinstance(unpickled, OmnibotMessage)
+        assert unpickled == message
+
+    def test_get_channel_id(self):
+        assert get_channel_id({'channel_id': 'C123'}) == 'C123'
+        assert get_channel_id({'channel': {'id': 'C456'}}) == 'C456'
+        assert get_channel_id({'channel': 'C789'}) is None
+        assert get_channel_id({}) is None
+
+    def test_interactive_component(self):
+        event = OmnibotEvent.from_payload({
+            'omnibot_payload_type': 'interactive_component',
+            'callback_id': 'ping',
+            'type': 'block_actions',
+            'channel': {'id': 'C123', 'name': 'general'},
+            'user': {'id': 'U123', 'name': 'test'},
+        })
+
+        assert isinstance(event, OmnibotInteractiveComponent)
+        assert event.callback_id == 'ping'
+        assert event.type == 'block_actions'
+        assert event.actions == []
+        assert event.channel_id == 'C123'
+        assert event.user_id == 'U123'
+
+        event = OmnibotEvent.from_payload({'omnibot_payload_type': 'other'})
+        assert type(event) is OmnibotEvent
+        assert event.channel_id is None
+
+    def test_routers(self):
+        message_router = OmnibotMessageRouter(match_cache_size=8)
+        interactive_router = OmnibotInteractiveRouter()
+        router = OmnibotRouter(
+            message_router=message_router,
+            interactive_router=interactive_router,
+        )
+
+        @message_router.route('echo <value>')
+        def echo(message, value):
+            return {'channel': message.channel_id, 'value': value}
+
+        @interactive_router.route('ping', event_type='block_actions')
+        def ping(event):
+            return {'callback_id': event.callback_id}
+
+        message = OmnibotEvent.from_payload({
+            'omnibot_payload_type': 'message',
+            'match_type': 'command',
+            'args': 'echo test',
+            'channel_id': 'C123',
+        })
+        event = OmnibotEvent.from_payload({
+            'omnibot_payload_type': 'interactive_component',
+            'callback_id': 'ping',
+            'type': 'block_actions',
+        })
+        for _ in range(2):
+            assert router.handle_event(message) == {
+                'channel': 'C123',
+                'value': 'test',
+            }
+            assert router.handle_event(event) == {'callback_id': 'ping'}
+            router.freeze()
@@ -0,0 +1,266 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import os
+import threading
+import time
+
+import pytest
+
+from omnibot_receiver import executor
+from omnibot_receiver.response import get_simple_response
+from omnibot_receiver.router import (
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+)
+
+
+def report(message, id):
+    return {'id': id, 'text': message['args'], 'pid': os.getpid()}
+
+
+async def async_report(message, id):
+    return {'id': id, 'pid': os.getpid()}
+
+
+def interactive_report(event):
+    return {'callback_id': event['callback_id'], 'pid': os.getpid()}
+
+
+class TestExecutorRoute(object):
+
+    def setup_method(self):
+        executor.set_process_pool(ProcessPoolExecutor(max_workers=1))
+
+    def teardown_method(self):
+        executor.shutdown_process_pool()
+
+    def test_message_route(self):
+        message_router = OmnibotMessageRouter()
+        message_router.route('report <id>', executor='process')(report)
+        message_router.add_message_rule(
+            'async report <id>',
+            'command',
+            async_report,
+            executor='process'
+        )
+        message = {'args': 'report 1', 'match_type': 'command'}
+        async_message = {'args': 'async report 2', 'match_type': 'command'}
+
+        ret = message_router.handle_message(message)
+        assert ret['id'] == '1'
+        assert ret['text'] == 'report 1'
+        assert ret['pid'] != os.getpid()
+        ret = asyncio.run(message_router.handle_message_async(message))
+        assert ret['id'] == '1'
+        assert ret['pid'] != os.getpid()
+        ret = message_router.handle_message(async_message)
+        assert ret['id'] == '2'
+        assert ret['pid'] != os.getpid()
+
+    def test_interactive_route(self):
+        interactive_router = OmnibotInteractiveRouter()
+        interactive_router.route('report', executor='process')(
+            interactive_report
+        )
+        event = {'callback_id': 'report'}
+
+        ret = interactive_router.handle_interactive_component(event)
+        assert ret['callback_id'] == 'report'
+        assert ret['pid'] != os.getpid()
+
+    def test_executor_instance(self):
+        message_router = OmnibotMessageRouter()
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            message_router.add_message_rule(
+                'report <id>',
+                'command',
+                report,
+                executor=pool
+            )
+            ret = message_router.handle_message(
+                {'args': 'report 3', 'match_type': 'command'}
+            )
+        assert ret['id'] == '3'
+        assert ret['pid'] == os.getpid()
+
+    def test_invalid_routes(self):
+        message_router = OmnibotMessageRouter()
+
+        def local_report(message):
+            pass
+
+        with pytest.raises(ValueError):
+            message_router.add_message_rule(
+                'report',
+                'command',
+                local_report,
+                executor='process'
+            )
+        with pytest.raises(ValueError):
+            message_router.add_message_rule(
+                'report',
+                'command',
+                report,
+                executor='thread'
+            )
+
+
+class TestDeadlineRoute(object):
+
+    def test_message_route(self):
+        message_router = OmnibotMessageRouter(timeout=0.05)
+        release = threading.Event()
+        finished = threading.Event()
+
+        @message_router.route('slow')
+        def slow(message):
+            release.wait()
+            finished.set()
+            return {'actions': ['done']}
+
+        @message_router.route('fast', timeout=5, timeout_response={'a': []})
+        def fast(message):
+            return {'actions': ['fast']}
+
+        @message_router.set_default()
+        def default(message):
+            release.wait()
+
+        ret = message_router.handle_message(
+            {'args': 'slow', 'match_type': 'command'}
+        )
+        assert ret == {'actions': []}
+        ret['actions'].append('mutated')
+        ret = message_router.handle_message(
+            {'args': 'unknown', 'match_type': 'command'}
+        )
+        assert ret == {'actions': []}
+        assert message_router.handle_message(
+            {'args': 'fast', 'match_type': 'command'}
+        ) == {'actions': ['fast']}
+        assert message_router.get_timeout_counts() == {
+            ('command', 'slow'): 1,
+            ('command', 'fast'): 0,
+            ('default', None): 1,
+        }
+        release.set()
+        assert finished.wait(5)
+
+    def test_late_errors_are_logged(self, caplog):
+        message_router = OmnibotMessageRouter(timeout=0.05)
+        release = threading.Event()
+        failed = threading.Event()
+
+        @message_router.route('slow')
+        def slow(message):
+            release.wait()
+            failed.set()
+            raise ValueError('late')
+
+        assert message_router.handle_message(
+            {'args': 'slow', 'match_type': 'command'}
+        ) == {'actions': []}
+        release.set()
+        assert failed.wait(5)
+        for _ in range(100):
+            if caplog.records:
+                break
+            time.sleep(0.01)
+        assert [
+            record.exc_info[1].args for record in caplog.records
+        ] == [('late',)]
+
+    def test_timeout_pool(self):
+        pool = ThreadPoolExecutor(1, thread_name_prefix='timeout-pool')
+        message_router = OmnibotMessageRouter(timeout=0.2, timeout_pool=pool)
+        release = threading.Event()
+        started = threading.Event()
+
+        @message_router.route('slow', timeout=5)
+        def slow(message):
+            started.set()
+            release.wait()
+            return {'actions': ['slow']}
+
+        @message_router.route('fast')
+        def fast(message):
+            return {'actions': [threading.current_thread().name]}
+
+        def handle(args):
+            return message_router.handle_message(
+                {'args': args, 'match_type': 'command'}
+            )
+
+        with ThreadPoolExecutor(2) as callers:
+            slow_response = callers.submit(handle, 'slow')
+            assert started.wait(5)
+            fast_response = callers.submit(handle, 'fast')
+            # The fast route waits for the only thread of the pool, which
+            # doesn't count against its timeout.
+            time.sleep(0.3)
+            release.set()
+            assert slow_response.result() == {'actions': ['slow']}
+            assert fast_response.result()['actions'][0].startswith(
+                'timeout-pool'
+            )
+        assert message_router.get_timeout_counts() == {
+            ('command', 'slow'): 0,
+            ('command', 'fast'): 0,
+        }
+        pool.shutdown()
+
+    def test_interactive_route_async(self):
+        interactive_router = OmnibotInteractiveRouter()
+        response = get_simple_response('Working on it...', ephemeral=True)
+        cancelled = []
+
+        @interactive_router.route(
+            'slow',
+            timeout=0.05,
+            timeout_response=response
+        )
+        async def slow(event):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(event)
+                raise
+
+        @interactive_router.route('fast', event_type='block_actions')
+        async def fast(event):
+            return {'responses': []}
+
+        event = {'callback_id': 'slow'}
+        assert asyncio.run(
+            interactive_router.handle_interactive_component_async(event)
+        ) == response
+        assert cancelled == [event]
+        assert asyncio.run(
+            interactive_router.handle_interactive_component_async(
+                {'callback_id': 'fast', 'type': 'block_actions'}
+            )
+        ) == {'responses': []}
+        assert interactive_router.get_timeout_counts() == {
+            (None, 'slow'): 1,
+        }
+
+    def test_sync_route_async(self):
+        interactive_router = OmnibotInteractiveRouter(
+            timeout=0.05,
+            timeout_response={'responses': []}
+        )
+        release = threading.Event()
+
+        @interactive_router.route('slow')
+        def slow(event):
+            release.wait()
+
+        assert asyncio.run(
+            interactive_router.handle_interactive_component_async(
+                {'callback_id': 'slow'}
+            )
+        ) == {'responses': []}
+        release.set()
+        assert interactive_router.get_timeout_counts() == {
+            (None, 'slow'): 1,
+        }
@@ -0,0 +1,83 @@
+import itertools
+
+from omnibot_receiver.explain import MatchProfiler
+from omnibot_receiver.router import OmnibotMessageRouter
+
+
+def _get_message_router(profiler=None, match_cache_size=None):
+    message_router = OmnibotMessageRouter(
+        profiler=profiler,
+        match_cache_size=match_cache_size
+    )
+    for rule in ('.*deploy.*', '.*deploy api.*', '.*foo.*bar.*', 'never'):
+        message_router.route(rule, match_type='regex')(
+            lambda message: {'actions': []}
+        )
+    return message_router
+
+
+class TestExplain(object):
+
+    def test_explain(self):
+        message_router = _get_message_router()
+        explanation = message_router.explain('please deploy api', 'regex')
+        assert explanation.text == 'please deploy api'
+        assert explanation.match_type == 'regex'
+        assert explanation.winner == '.*deploy.*'
+        assert [
+            (attempt.rule, attempt.matched)
+            for attempt in explanation.attempts
+        ] == [
+            ('.*deploy.*', True),
+            ('.*deploy api.*', True),
+            ('.*foo.*bar.*', False),
+            ('never', False),
+        ]
+        assert all(attempt.seconds >= 0 for attempt in explanation.attempts)
+        assert message_router.explain('hi', 'regex').winner is None
+
+    def test_profiler(self, make_message):
+        profiler = MatchProfiler()
+        message_router = _get_message_router(profiler)
+        for args in ('deploy api', 'deploy web', 'foo and bar'):
+            message_router.handle_message(make_message(args, 'regex'))
+        report = profiler.report(top=2)
+        assert report.messages == 3
+        assert len(report.most_expensive) == 2
+        assert (
+            report.most_expensive[0].total_seconds >=
+            report.most_expensive[1].total_seconds
+        )
+        assert [stats.rule for stats in report.never_matched] == ['never']
+        stats = {
+            stats.rule: stats
+            for stats in profiler.report(top=10).most_expensive
+        }
+        assert (
+            stats['.*deploy api.*'].tries,
+            stats['.*deploy api.*'].matches,
+            stats['.*deploy api.*'].wins,
+        ) == (3, 1, 0)
+        assert stats['.*deploy.*'].wins == 2
+        assert stats['.*foo.*bar.*'].max_seconds > 0
+
+    def test_sampling_and_window(self, make_message):
+        samples = itertools.cycle([0.2, 0.7])
+        profiler = MatchProfiler(
+            sample_rate=0.5,
+            random=lambda: next(samples)
+        )
+        message_router = _get_message_router(profiler)
+        for _ in range(4):
+            message_router.handle_message(make_message('deploy api', 'regex'))
+        assert profiler.report(reset=True).messages == 2
+        report = profiler.report()
+        assert report.messages == 0
+        assert report.most_expensive == []
+
+    def test_match_cache_hits_are_not_sampled(self, make_message):
+        profiler = MatchProfiler()
+        message_router = _get_message_router(profiler, match_cache_size=8)
+        for _ in range(3):
+            message_router.handle_message(make_message('deploy api', 'regex'))
+        assert profiler.report().messages == 1
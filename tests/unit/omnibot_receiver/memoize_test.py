@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from omnibot_receiver.memoize import ResultCache
+from omnibot_receiver.router import (
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+)
+
+
+class TestMemoizedRoute(object):
+
+    def test_message_route(self, make_message):
+        message_router = OmnibotMessageRouter()
+        runbook_cache = ResultCache(
+            ttl=60,
+            maxsize=8,
+            key=lambda message: message['channel_id']
+        )
+        calls = []
+
+        @message_router.route('runbook <service>', cache=runbook_cache)
+        def runbook(message, service):
+            calls.append(service)
+            return {'actions': [{'kwargs': {'text': service}}]}
+
+        @message_router.route('owners <repo>', cache=60)
+        async def owners(message, repo):
+            calls.append(repo)
+            return {'actions': []}
+
+        runbook_api = make_message('runbook api', channel_id='C1')
+        runbook_web = make_message('runbook web', channel_id='C1')
+        ret = message_router.handle_message(runbook_api)
+        ret['actions'].append('mutated')
+        assert message_router.handle_message(runbook_api) == {
+            'actions': [{'kwargs': {'text': 'api'}}]
+        }
+        message_router.handle_message(
+            make_message('runbook api', channel_id='C2')
+        )
+        message_router.handle_message(runbook_web)
+        assert calls == ['api', 'api', 'web']
+
+        runbook_cache.invalidate(service='api')
+        message_router.handle_message(runbook_api)
+        message_router.handle_message(runbook_web)
+        assert calls == ['api', 'api', 'web', 'api']
+
+        for _ in range(2):
+            asyncio.run(message_router.handle_message_async(
+                make_message('owners core', channel_id='C1')
+            ))
+        assert calls == ['api', 'api', 'web', 'api', 'core']
+
+        stats = message_router.get_cache_stats()
+        assert stats[('command', 'runbook <service>')]['hits'] == 2
+        assert stats[('command', 'runbook <service>')]['misses'] == 4
+        assert stats[('command', 'runbook <service>')]['hit_rate'] == (
+            2 / 6
+        )
+        assert stats[('command', 'owners <repo>')]['hit_rate'] == 0.5
+        message_router.invalidate_caches()
+        message_router.handle_message(runbook_web)
+        assert calls[-1] == 'web'
+
+    def test_errors_and_timeouts_are_not_cached(self):
+        interactive_router = OmnibotInteractiveRouter()
+        calls = []
+
+        @interactive_router.route('fail', cache=60)
+        def fail(event):
+            calls.append(event)
+            raise ValueError('failed')
+
+        @interactive_router.route(
+            'slow',
+            cache=60,
+            timeout=0.01,
+            timeout_response={'responses': ['working']}
+        )
+        async def slow(event):
+            calls.append(event)
+            await asyncio.sleep(1)
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                interactive_router.handle_interactive_component(
+                    {'callback_id': 'fail'}
+                )
+            assert asyncio.run(
+                interactive_router.handle_interactive_component_async(
+                    {'callback_id': 'slow'}
+                )
+            ) == {'responses': ['working']}
+        assert len(calls) == 4
+        assert interactive_router.get_cache_stats()[(None, 'slow')][
+            'size'
+        ] == 0
+
+    def test_invalid_cache(self):
+        message_router = OmnibotMessageRouter()
+        with pytest.raises(ValueError):
+            message_router.add_message_rule(
+                'ping',
+                'command',
+                lambda message: None,
+                cache=True
+            )
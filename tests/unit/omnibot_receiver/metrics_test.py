@@ -0,0 +1,203 @@
+import asyncio
+import threading
+
+import pytest
+
+from omnibot_receiver.metrics import (
+    Histogram,
+    RouteMetrics,
+    format_prometheus,
+    format_statsd,
+)
+from omnibot_receiver.router import (
+    NoMatchedRouteError,
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+)
+
+
+def _get_message_router(metrics, help_as_default=False):
+    message_router = OmnibotMessageRouter(
+        help_as_default=help_as_default,
+        metrics=metrics
+    )
+
+    @message_router.route('echo <text>')
+    def echo(message, text):
+        return {'actions': [text]}
+
+    @message_router.route('fail')
+    def fail(message):
+        raise ValueError()
+
+    @message_router.route('.*deploy.*', match_type='regex')
+    async def deploy(message):
+        return {'actions': []}
+
+    return message_router
+
+
+class TestHistogram(object):
+
+    def test_observe(self):
+        histogram = Histogram((1, 10))
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+        assert histogram.counts == [2, 1, 1]
+        assert histogram.count == 4
+        assert histogram.sum == 56.5
+        assert histogram.quantile(0.5) == 1
+        assert histogram.quantile(0.75) == 10
+        assert histogram.quantile(0.99) == float('inf')
+        assert Histogram((1,)).quantile(0.5) is None
+
+
+class TestRouteMetrics(object):
+
+    def test_message_router(self, make_message):
+        metrics = RouteMetrics()
+        message_router = _get_message_router(metrics)
+        message_router.handle_message(make_message('echo hi'))
+        message_router.handle_message(make_message('echo there'))
+        with pytest.raises(ValueError):
+            message_router.handle_message(make_message('fail'))
+        with pytest.raises(NoMatchedRouteError):
+            message_router.handle_message(make_message('unknown'))
+        asyncio.run(message_router.handle_message_async(
+            make_message('please deploy', 'regex')
+        ))
+        snapshot = metrics.snapshot()
+        assert set(snapshot.routes) == {
+            ('command', 'echo <text>'),
+            ('command', 'fail'),
+            ('regex', '.*deploy.*'),
+        }
+        echo = snapshot.routes[('command', 'echo <text>')]
+        assert (echo.calls, echo.errors) == (2, 0)
+        assert echo.match_time.count == 2
+        assert echo.handler_time.count == 2
+        assert echo.response_bytes.sum == len(b'{"actions":["hi"]}') + len(
+            b'{"actions":["there"]}'
+        )
+        fail = snapshot.routes[('command', 'fail')]
+        assert (fail.calls, fail.errors) == (1, 1)
+        assert fail.response_bytes.count == 0
+        assert snapshot.routes[('regex', '.*deploy.*')].calls == 1
+        assert snapshot.fallbacks == {'default': 0, 'help': 0, 'no_match': 1}
+
+    def test_fallbacks(self, make_message):
+        metrics = RouteMetrics()
+        message_router = _get_message_router(metrics, help_as_default=True)
+        message_router.handle_message(make_message('unknown'))
+        assert metrics.snapshot().fallbacks['help'] == 1
+
+        @message_router.set_default()
+        def default(message):
+            return {'actions': []}
+
+        message_router.handle_message(make_message('unknown'))
+        snapshot = metrics.snapshot()
+        assert snapshot.fallbacks == {'default': 1, 'help': 1, 'no_match': 0}
+        assert snapshot.routes[('default', None)].calls == 1
+
+    def test_interactive_router(self):
+        metrics = RouteMetrics(response_sizes=False)
+        interactive_router = OmnibotInteractiveRouter(metrics=metrics)
+        interactive_router.route('approve', event_type='block_actions')(
+            lambda event: {'actions': []}
+        )
+        interactive_router.handle_interactive_component(
+            {'callback_id': 'approve', 'type': 'block_actions'}
+        )
+        with pytest.raises(NoMatchedRouteError):
+            interactive_router.handle_interactive_component(
+                {'callback_id': 'unknown'}
+            )
+        snapshot = metrics.snapshot()
+        stats = snapshot.routes[('block_actions', 'approve')]
+        assert stats.calls == 1
+        assert stats.response_bytes.count == 0
+        assert snapshot.fallbacks['no_match'] == 1
+
+    def test_threads_are_aggregated(self, make_message):
+        metrics = RouteMetrics()
+        message_router = _get_message_router(metrics)
+        message_router.freeze()
+
+        def handle():
+            for _ in range(50):
+                message_router.handle_message(make_message('echo hi'))
+
+        threads = [threading.Thread(target=handle) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        message_router.handle_message(make_message('echo hi'))
+        # The metrics of ended threads are merged into a single total.
+        assert len(metrics._thread_stats) == 1
+        stats = metrics.snapshot().routes[('command', 'echo <text>')]
+        assert stats.calls == 201
+        assert stats.handler_time.count == 201
+        for _ in range(50):
+            thread = threading.Thread(target=handle)
+            thread.start()
+            thread.join()
+        assert len(metrics._thread_stats) == 1
+        assert metrics.snapshot().routes[
+            ('command', 'echo <text>')
+        ].calls == 2701
+
+    def test_disabled(self):
+        message_router = _get_message_router(None)
+        _, view_function = message_router._get_route_match(
+            'echo hi',
+            'command'
+        )
+        assert view_function.__name__ == 'echo'
+
+    def test_flush(self, make_message):
+        snapshots = []
+        metrics = RouteMetrics(sink=snapshots.append)
+        message_router = _get_message_router(metrics)
+        message_router.handle_message(make_message('echo hi'))
+        assert metrics.flush() == snapshots[0]
+        assert snapshots[0].routes[('command', 'echo <text>')].calls == 1
+
+
+class TestExporters(object):
+
+    def test_format_statsd(self, make_message):
+        metrics = RouteMetrics()
+        message_router = _get_message_router(metrics)
+        message_router.handle_message(make_message('echo hi'))
+        first = metrics.snapshot()
+        lines = format_statsd(first, prefix='bot')
+        assert 'bot.route.command.echo_text.calls:1|c' in lines
+        assert 'bot.route.command.echo_text.errors:0|c' in lines
+        assert 'bot.route.command.echo_text.response_bytes:18.000|g' in lines
+        assert 'bot.fallback.no_match:0|c' in lines
+        message_router.handle_message(make_message('echo hi'))
+        message_router.handle_message(make_message('echo hi'))
+        lines = format_statsd(metrics.snapshot(), first, prefix='bot')
+        assert 'bot.route.command.echo_text.calls:2|c' in lines
+
+    def test_format_prometheus(self, make_message):
+        metrics = RouteMetrics()
+        message_router = _get_message_router(metrics)
+        message_router.handle_message(make_message('echo hi'))
+        text = format_prometheus(metrics.snapshot(), prefix='bot')
+        labels = 'type="command",route="echo <text>"'
+        assert '# TYPE bot_route_calls_total counter' in text
+        assert 'bot_route_calls_total{{{}}} 1'.format(labels) in text
+        assert '# TYPE bot_route_handler_seconds histogram' in text
+        assert (
+            'bot_route_response_bytes_bucket{{{},le="64"}} 1'.format(labels)
+            in text
+        )
+        assert (
+            'bot_route_handler_seconds_bucket{{{},le="+Inf"}} 1'.format(labels)
+            in text
+        )
+        assert 'bot_route_response_bytes_sum{{{}}} 18'.format(labels) in text
+        assert 'bot_fallbacks_total{kind="help"} 0' in text
@@ -0,0 +1,193 @@
+import asyncio
+
+import pytest
+
+from omnibot_receiver.middleware import Middleware, MiddlewareRoute
+from omnibot_receiver.router import (
+    OmnibotInteractiveRouter,
+    OmnibotMessageRouter,
+    OmnibotRouter,
+    RouterFrozenError,
+)
+
+
+def _component(callback_id):
+    return {
+        'omnibot_payload_type': 'interactive_component',
+        'callback_id': callback_id,
+        'type': 'block_actions',
+    }
+
+
+def _get_message_router(calls):
+    message_router = OmnibotMessageRouter(help_as_default=False)
+
+    @message_router.route('echo <text>')
+    def echo(message, text):
+        calls.append('echo')
+        return {'actions': [text]}
+
+    @message_router.route('health', middleware=False)
+    def health(message):
+        calls.append('health')
+        return {'actions': ['ok']}
+
+    @message_router.before
+    def deny(message):
+        calls.append('before')
+        if message['args'] == 'echo denied':
+            return {'actions': ['denied']}
+
+    @message_router.around
+    def outer(call_next, message, **kwargs):
+        calls.append('outer')
+        return call_next(message, **kwargs)
+
+    @message_router.around
+    def inner(call_next, message, **kwargs):
+        calls.append('inner')
+        return call_next(message, text=kwargs['text'].upper())
+
+    @message_router.after
+    def tag(message, response):
+        calls.append('after')
+        return {'actions': response['actions'] + ['tagged']}
+
+    return message_router
+
+
+class TestMiddleware(object):
+
+    def test_empty_chain(self):
+        def route(message):
+            pass
+
+        assert not Middleware()
+        assert Middleware().compose(route) is route
+        message_router = OmnibotMessageRouter()
+        message_router.route('ping')(route)
+        assert message_router._get_route_match('ping', 'command') == (
+            {},
+            route
+        )
+
+    def test_message_router(self, make_message):
+        calls = []
+        message_router = _get_message_router(calls)
+        assert message_router.handle_message(make_message('echo hi')) == {
+            'actions': ['HI', 'tagged']
+        }
+        assert calls == ['before', 'outer', 'inner', 'echo', 'after']
+        del calls[:]
+        assert message_router.handle_message(make_message('echo denied')) == {
+            'actions': ['denied', 'tagged']
+        }
+        assert calls == ['before', 'after']
+        del calls[:]
+        assert message_router.handle_message(make_message('health')) == {
+            'actions': ['ok']
+        }
+        assert calls == ['health']
+
+    def test_message_router_async(self, make_message):
+        calls = []
+        message_router = _get_message_router(calls)
+
+        @message_router.route('slow <text>')
+        async def slow(message, text):
+            await asyncio.sleep(0)
+            return {'actions': [text]}
+
+        @message_router.after
+        async def audit(message, response):
+            calls.append('audit')
+            return response
+
+        ret = asyncio.run(
+            message_router.handle_message_async(make_message('slow hi'))
+        )
+        assert ret == {'actions': ['HI', 'tagged']}
+        assert calls == ['before', 'outer', 'inner', 'after', 'audit']
+
+    def test_default_and_help_routes(self, make_message):
+        calls = []
+        message_router = OmnibotMessageRouter()
+        message_router.before(lambda message: calls.append(message['args']))
+        message_router.handle_message(make_message('unknown'))
+        assert calls == ['unknown']
+
+        @message_router.set_default(middleware=False)
+        def default(message):
+            return {'actions': []}
+
+        message_router.handle_message(make_message('other'))
+        assert calls == ['unknown']
+
+    def test_interactive_router(self):
+        calls = []
+        interactive_router = OmnibotInteractiveRouter()
+
+        @interactive_router.route('approve', event_type='block_actions')
+        def approve(event):
+            return {'actions': ['approved']}
+
+        @interactive_router.route('ping', middleware=False)
+        def ping(event):
+            return {'actions': ['pong']}
+
+        @interactive_router.after
+        def tag(event, response):
+            calls.append(event['callback_id'])
+            return {'actions': response['actions'] + ['tagged']}
+
+        assert interactive_router.handle_interactive_component(
+            _component('approve')
+        ) == {'actions': ['approved', 'tagged']}
+        assert interactive_router.handle_interactive_component(
+            _component('ping')
+        ) == {'actions': ['pong']}
+        assert calls == ['approve']
+        interactive_router.freeze()
+        assert interactive_router.handle_interactive_component(
+            _component('approve')
+        ) == {'actions': ['approved', 'tagged']}
+        with pytest.raises(RouterFrozenError):
+            interactive_router.before(tag)
+
+    def test_omnibot_router(self, make_message):
+        calls = []
+        message_router = _get_message_router(calls)
+        router = OmnibotRouter(message_router=message_router)
+
+        @router.around
+        def count(call_next, event):
+            calls.append('event')
+            return call_next(event)
+
+        health = make_message('health')
+        assert router.handle_event(health) == {'actions': ['ok']}
+        assert calls == ['event', 'health']
+        del calls[:]
+        ret = asyncio.run(router.handle_event_async(health))
+        assert ret == {'actions': ['ok']}
+        assert calls == ['event', 'health']
+        router.freeze()
+        assert router.handle_event(health) == {'actions': ['ok']}
+        with pytest.raises(RouterFrozenError):
+            router.before(count)
+        with pytest.raises(RouterFrozenError):
+            message_router.before(count)
+
+    def test_chain_is_composed_once(self):
+        message_router = OmnibotMessageRouter()
+        message_router.after(lambda message, response: response)
+
+        @message_router.route('ping')
+        def ping(message):
+            return {'actions': []}
+
+        _, first = message_router._get_route_match('ping', 'command')
+        _, second = message_router._get_route_match('ping', 'command')
+        assert isinstance(first, MiddlewareRoute)
+        assert first is second
+        assert first.view_function is ping
@@ -0,0 +1,110 @@
+import io
+import json
+
+import pytest
+
+from omnibot_receiver import replay
+from omnibot_receiver.router import OmnibotMessageRouter, OmnibotRouter
+
+message_router = OmnibotMessageRouter(help_as_default=False)
+router = OmnibotRouter(message_router=message_router)
+
+ROUTER_PATH = 'tests.unit.omnibot_receiver.replay_test:router'
+
+
+@message_router.route('echo <text>')
+def echo(message, text):
+    return {'actions': [text]}
+
+
+@message_router.route('slow <text>')
+async def slow(message, text):
+    return {'actions': [text]}
+
+
+def _line(args):
+    return json.dumps({
+        'omnibot_payload_type': 'message',
+        'match_type': 'command',
+        'args': args,
+    }).encode('utf-8') + b'\n'
+
+
+def _replay(lines, **kwargs):
+    results = []
+    replay.replay(
+        ROUTER_PATH,
+        replay.iter_lines(io.BytesIO(b''.join(lines))),
+        results.append,
+        **kwargs
+    )
+    return results
+
+
+class TestReplay(object):
+
+    def test_load_router(self):
+        assert replay.load_router(ROUTER_PATH) is router
+        assert replay.load_router(
+            'tests.unit.omnibot_receiver.replay_test.router'
+        ) is router
+        with pytest.raises(ValueError):
+            replay.load_router('router')
+
+    def test_iter_lines(self):
+        lines = list(replay.iter_lines(io.BytesIO(b'{}\n\n  \n[]\n')))
+        assert lines == [(0, b'{}\n'), (1, b'[]\n')]
+
+    @pytest.mark.parametrize('mode', replay.MODES)
+    def test_modes(self, mode):
+        lines = [_line('echo {}'.format(i)) for i in range(10)]
+        lines.append(_line('unknown'))
+        lines.append(b'not json\n')
+        if mode == 'asyncio':
+            lines.append(_line('slow async'))
+        results = _replay(lines, mode=mode, concurrency=3)
+        assert [result['index'] for result in results] == list(
+            range(len(lines))
+        )
+        assert [result['response'] for result in results[:10]] == [
+            {'actions': [str(i)]} for i in range(10)
+        ]
+        assert results[10]['response'] is None
+        assert results[10]['error'].startswith('NoMatchedRouteError: ')
+        assert results[11]['error'] is not None
+        if mode == 'asyncio':
+            assert results[12]['response'] == {'actions': ['async']}
+        assert all(result['latency_ms'] >= 0 for result in results)
+
+    def test_rate(self):
+        lines = [_line('echo hi')] * 5
+        results = _replay(lines, rate=1000)
+        assert len(results) == 5
+        results = _replay(lines, mode='asyncio', rate=1000)
+        assert len(results) == 5
+
+    def test_invalid_mode(self):
+        with pytest.raises(ValueError):
+            _replay([], mode='fiber')
+
+    def test_main(self, tmp_path, capsys):
+        input_path = tmp_path / 'events.jsonl'
+        output_path = tmp_path / 'results.jsonl'
+        input_path.write_bytes(_line('echo a') + _line('echo b'))
+        assert replay.main([
+            ROUTER_PATH,
+            str(input_path),
+            '--output',
+            str(output_path),
+            '--concurrency',
+            '2',
+        ]) == 0
+        results = [
+            json.loads(line)
+            for line in output_path.read_text().splitlines()
+        ]
+        assert [result['response'] for result in results] == [
+            {'actions': ['a']},
+            {'actions': ['b']},
+        ]
+        assert 'Replayed 2 events (0 errors)' in capsys.readouterr().err
@@ -1,3 +1,6 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from omnibot_receiver.router import (
@@ -5,7 +8,9 @@ from omnibot_receiver.router import (
     OmnibotInteractiveRouter,
     OmnibotRouter,
     RouteAlreadyDefinedError,
-    NoMatchedRouteError
+    RouterFrozenError,
+    NoMatchedRouteError,
+    UnsupportedPayloadError,
 )
 
 
@@ -254,6 +259,183 @@ class TestOmnibotMessageRouter(object):
 
         assert message_router.handle_message(message) == 'pong'
 
+    def test_compiled_dispatch(self):
+        message1 = {'args': 'find testuser', 'match_type': 'command'}
+        message2 = {'args': 'ping', 'match_type': 'command'}
+        message_router = OmnibotMessageRouter(
+            help_as_default=False,
+            compiled_dispatch=True
+        )
+
+        @message_router.route('find <user>', match_type='command')
+        def user_finder(message, user):
+            return 'found {}'.format(user)
+
+        @message_router.route('find .*', match_type='command')
+        def shadowed_finder(message):
+            return 'shadowed'
+
+        assert message_router.handle_message(message1) == 'found testuser'
+        with pytest.raises(NoMatchedRouteError):
+            message_router.handle_message(message2)
+
+        # Test the matcher is rebuilt when a rule is added
+        @message_router.route('ping', match_type='command')
+        def ping(message):
+            return 'pong'
+
+        assert message_router.handle_message(message2) == 'pong'
+
+    def test_match_cache(self):
+        message = {'args': 'find testuser', 'match_type': 'command'}
+        unknown_message = {'args': 'unknown', 'match_type': 'command'}
+        message_router = OmnibotMessageRouter(
+            help_as_default=False,
+            match_cache_size=2
+        )
+
+        @message_router.route('find <user>', match_type='command')
+        def user_finder(message, user):
+            return 'found {}'.format(user)
+
+        assert message_router.handle_message(message) == 'found testuser'
+        assert message_router.handle_message(message) == 'found testuser'
+        with pytest.raises(NoMatchedRouteError):
+            message_router.handle_message(unknown_message)
+        # Test negative entries are cached too
+        with pytest.raises(NoMatchedRouteError):
+            message_router.handle_message(unknown_message)
+        assert message_router.match_cache.stats() == {
+            'hits': 2,
+            'misses': 2,
+            'evictions': 0,
+            'expirations': 0,
+            'size': 2,
+            'maxsize': 2,
+        }
+
+        # Test the cache is cleared when the routes change
+        @message_router.set_default()
+        def default(message):
+            return 'default message'
+
+        assert len(message_router.match_cache) == 0
+        assert message_router.handle_message(
+            unknown_message
+        ) == 'default message'
+
+        @message_router.route('unknown', match_type='command')
+        def known(message):
+            return 'known'
+
+        assert message_router.handle_message(unknown_message) == 'known'
+
+    def test_freeze(self):
+        message = {'args': 'find testuser', 'match_type': 'command'}
+        unknown_message = {'args': 'unknown', 'match_type': 'command'}
+        message_router = OmnibotMessageRouter(help='example message')
+
+        @message_router.route('find <user>', match_type='command')
+        def user_finder(message, user):
+            return 'found {}'.format(user)
+
+        plan = message_router.freeze()
+
+        assert message_router.freeze() is plan
+        assert plan.fallback == message_router.get_help
+        assert plan.handle_message(message) == 'found testuser'
+        assert message_router.handle_message(message) == 'found testuser'
+        assert message_router.handle_message(
+            unknown_message
+        ) == plan.help
+        with pytest.raises(RouterFrozenError):
+            message_router.add_message_rule('ping', 'command', user_finder)
+        with pytest.raises(RouterFrozenError):
+            @message_router.set_default()
+            def default(message):
+                pass
+        with pytest.raises(RouterFrozenError):
+            message_router.help_as_default = False
+        with pytest.raises(TypeError):
+            message_router.routes['command'] = []
+        with pytest.raises(AttributeError):
+            plan.fallback = None
+
+    def test_help_as_default_change(self):
+        message = {'args': 'unknown', 'match_type': 'command'}
+        message_router = OmnibotMessageRouter(help='example message')
+        message_router.handle_message(message)
+
+        message_router.help_as_default = False
+
+        with pytest.raises(NoMatchedRouteError):
+            message_router.handle_message(message)
+
+    def test_get_help_is_cached(self):
+        message = {'args': 'help', 'match_type': 'command'}
+        message_router = OmnibotMessageRouter(help='example message')
+
+        @message_router.route(
+            'set <key>:<value>',
+            match_type='command',
+            help='Set a value.'
+        )
+        def set_value(message, key, value):
+            pass
+
+        route = message_router.routes['command'][0]
+        assert route.help.title == 'set <key>:<value>'
+        assert route.help.description == 'Set a value.'
+
+        ret = message_router.get_help(message)
+        attachments = ret['actions'][0]['kwargs']['attachments']
+        assert attachments[0]['fields'][0]['title'] == 'set <key>:<value>'
+        # Test modifying the returned help doesn't modify the cached help
+        attachments.pop()
+        assert message_router.get_help(message) != ret
+
+        # Test the help is rendered again when the routes change
+        @message_router.route('.*test.*', match_type='regex')
+        def text_regex(message):
+            pass
+
+        message_router.help_message = 'new message'
+        ret = message_router.get_help(message)
+        assert ret['actions'][0]['kwargs']['text'] == 'new message'
+        assert len(ret['actions'][0]['kwargs']['attachments']) == 2
+
+    def test_handle_message_async(self):
+        message1 = {'args': 'find testuser', 'match_type': 'command'}
+        message2 = {'args': 'ping', 'match_type': 'command'}
+        message3 = {'args': 'unknown', 'match_type': 'command'}
+        message_router = OmnibotMessageRouter(help='example message')
+
+        @message_router.route('find <user>', match_type='command')
+        async def user_finder(message, user):
+            await asyncio.sleep(0)
+            return 'found {}'.format(user)
+
+        @message_router.route('ping', match_type='command')
+        def ping(message):
+            return 'pong'
+
+        async def handle_messages():
+            return await asyncio.gather(
+                message_router.handle_message_async(message1),
+                message_router.handle_message_async(message2),
+                message_router.handle_message_async(message3),
+            )
+
+        found, pong, help = asyncio.run(handle_messages())
+        assert found == 'found testuser'
+        assert pong == 'pong'
+        assert help == message_router.get_help(message3)
+
+        message_router.freeze()
+        assert asyncio.run(
+            message_router.handle_message_async(message1)
+        ) == 'found testuser'
+
 
 class TestOmnibotInteractiveRouter(object):
 
@@ -312,6 +494,59 @@ class TestOmnibotInteractiveRouter(object):
         assert interactive_router.handle_interactive_component(event1) == '123'
         assert interactive_router.handle_interactive_component(event2) == '345'
 
+    def test_routes_view(self):
+        interactive_router = OmnibotInteractiveRouter()
+
+        def ping(event):
+            return 'pong'
+
+        for i in range(1000):
+            interactive_router.add_event_callback('ping{}'.format(i), ping)
+        interactive_router.add_event_callback(
+            'ping0',
+            ping,
+            event_type='block_actions'
+        )
+
+        routes = interactive_router.routes
+        assert len(routes['__all']) == 1000
+        assert routes['__all'][0] == ('ping0', ping)
+        assert routes['block_actions'] == (('ping0', ping),)
+        with pytest.raises(TypeError):
+            routes['__all'] = []
+        assert interactive_router.handle_interactive_component(
+            {'callback_id': 'ping999', 'type': 'block_actions'}
+        ) == 'pong'
+
+    def test_register_while_dispatching(self):
+        interactive_router = OmnibotInteractiveRouter()
+        calls = []
+        interactive_router.before(lambda event: calls.append(event) and None)
+
+        def ping(event):
+            return event['callback_id']
+
+        plan = None
+        for i in range(100):
+            interactive_router.add_event_callback(
+                'ping{}'.format(i),
+                ping,
+                event_type='block_actions' if i % 2 else None,
+                middleware=bool(i % 3)
+            )
+            assert interactive_router.handle_interactive_component({
+                'callback_id': 'ping{}'.format(i),
+                'type': 'block_actions',
+            }) == 'ping{}'.format(i)
+            # The live plan is extended, rather than rebuilt.
+            assert plan is None or interactive_router._get_plan() is plan
+            plan = interactive_router._get_plan()
+        assert len(calls) == 66
+        assert interactive_router.handle_interactive_component({
+            'callback_id': 'ping0',
+            'type': 'dialog_submission',
+        }) == 'ping0'
+
     def test_default_route(self):
         event = {'callback_id': 'unknown'}
         interactive_router = OmnibotInteractiveRouter()
@@ -335,6 +570,68 @@ class TestOmnibotInteractiveRouter(object):
             event
         ) == 'default message'
 
+    def test_freeze(self):
+        event1 = {'callback_id': 'ping'}
+        event2 = {'callback_id': 'ping', 'type': 'dialog_submission'}
+        event3 = {'callback_id': 'unknown'}
+        interactive_router = OmnibotInteractiveRouter()
+
+        @interactive_router.route('ping')
+        def ping(event):
+            return 'pong'
+
+        @interactive_router.route('ping', event_type='dialog_submission')
+        def dialog_ping(event):
+            return 'dialog_pong'
+
+        plan = interactive_router.freeze()
+
+        assert interactive_router.freeze() is plan
+        assert interactive_router.handle_interactive_component(
+            event1
+        ) == 'pong'
+        assert interactive_router.handle_interactive_component(
+            event2
+        ) == 'dialog_pong'
+        with pytest.raises(NoMatchedRouteError):
+            interactive_router.handle_interactive_component(event3)
+        with pytest.raises(RouterFrozenError):
+            interactive_router.add_event_callback('pong', ping)
+        with pytest.raises(RouterFrozenError):
+            @interactive_router.set_default()
+            def default(event):
+                pass
+
+    def test_handle_interactive_component_async(self):
+        event1 = {'callback_id': 'ping'}
+        event2 = {'callback_id': 'unknown'}
+        interactive_router = OmnibotInteractiveRouter()
+
+        @interactive_router.route('ping')
+        async def ping(event):
+            await asyncio.sleep(0)
+            return 'pong'
+
+        assert asyncio.run(
+            interactive_router.handle_interactive_component_async(event1)
+        ) == 'pong'
+        with pytest.raises(NoMatchedRouteError):
+            asyncio.run(
+                interactive_router.handle_interactive_component_async(event2)
+            )
+
+        @interactive_router.set_default()
+        def default(event):
+            return 'default message'
+
+        interactive_router.freeze()
+        assert asyncio.run(
+            interactive_router.handle_interactive_component_async(event1)
+        ) == 'pong'
+        assert asyncio.run(
+            interactive_router.handle_interactive_component_async(event2)
+        ) == 'default message'
+
 
 class TestOmnibotRouter(object):
 
@@ -365,3 +662,236 @@ class TestOmnibotRouter(object):
 
         assert router.handle_event(event1) == 'message pong'
         assert router.handle_event(event2) == 'interactive pong'
+
+    def test_freeze(self):
+        message_router = OmnibotMessageRouter()
+        interactive_router = OmnibotInteractiveRouter()
+        router = OmnibotRouter(message_router=message_router)
+        event1 = {
+            'omnibot_payload_type': 'reaction',
+            'args': 'eyes',
+            'match_type': 'reaction'
+        }
+        event2 = {
+            'omnibot_payload_type': 'interactive_component',
+            'callback_id': 'ping'
+        }
+
+        @message_router.route('eyes', match_type='reaction')
+        def message_eyes(event):
+            return 'eyes'
+
+        router.freeze()
+
+        assert router.handle_event(event1) == 'eyes'
+        with pytest.raises(UnsupportedPayloadError):
+            router.handle_event(event2)
+        with pytest.raises(RouterFrozenError):
+            router.interactive_router = interactive_router
+        with pytest.raises(RouterFrozenError):
+            message_router.add_message_rule('ping', 'command', message_eyes)
+
+    def test_handle_event_async(self):
+        message_router = OmnibotMessageRouter()
+        interactive_router = OmnibotInteractiveRouter()
+        router = OmnibotRouter(
+            message_router=message_router,
+            interactive_router=interactive_router,
+        )
+        event1 = {
+            'omnibot_payload_type': 'message',
+            'args': 'ping',
+            'match_type': 'command'
+        }
+        event2 = {
+            'omnibot_payload_type': 'interactive_component',
+            'callback_id': 'ping'
+        }
+        event3 = {'omnibot_payload_type': 'unknown'}
+
+        @interactive_router.route('ping')
+        async def interactive_ping(event):
+            return 'interactive pong'
+
+        @message_router.route('ping')
+        async def message_ping(event):
+            return 'message pong'
+
+        for _ in range(2):
+            assert asyncio.run(
+                router.handle_event_async(event1)
+            ) == 'message pong'
+            assert asyncio.run(
+                router.handle_event_async(event2)
+            ) == 'interactive pong'
+            with pytest.raises(UnsupportedPayloadError):
+                asyncio.run(router.handle_event_async(event3))
+            router.freeze()
+
+    def test_handle_events(self):
+        message_router = OmnibotMessageRouter(help_as_default=False)
+        interactive_router = OmnibotInteractiveRouter()
+        router = OmnibotRouter(
+            message_router=message_router,
+            interactive_router=interactive_router,
+        )
+        events = [
+            {
+                'omnibot_payload_type': 'message',
+                'args': 'echo {}'.format(i),
+                'match_type': 'command'
+            }
+            for i in range(20)
+        ]
+        events.append({
+            'omnibot_payload_type': 'interactive_component',
+            'callback_id': 'ping'
+        })
+        events.append({
+            'omnibot_payload_type': 'message',
+            'args': 'fail',
+            'match_type': 'command'
+        })
+        events.append({
+            'omnibot_payload_type': 'message',
+            'args': 'unknown',
+            'match_type': 'command'
+        })
+        events.append({'omnibot_payload_type': 'unknown'})
+
+        @message_router.route('echo <value>')
+        def message_echo(event, value):
+            return value
+
+        @message_router.route('fail')
+        def message_fail(event):
+            raise ValueError('failed')
+
+        @interactive_router.route('ping')
+        def interactive_ping(event):
+            return 'interactive pong'
+
+        for _ in range(2):
+            results = router.handle_events(events, max_workers=4)
+            assert [result.index for result in results] == list(
+                range(len(events))
+            )
+            assert [result.response for result in results[:21]] == [
+                str(i) for i in range(20)
+            ] + ['interactive pong']
+            assert all(result.error is None for result in results[:21])
+            assert results[21].event is events[21]
+            assert isinstance(results[21].error, ValueError)
+            assert isinstance(results[22].error, NoMatchedRouteError)
+            assert isinstance(results[23].error, UnsupportedPayloadError)
+
+            streamed = router.handle_events(
+                iter(events),
+                executor=ThreadPoolExecutor(max_workers=2),
+                as_completed=True
+            )
+            assert sorted(
+                (result.index, result.response, type(result.error))
+                for result in streamed
+            ) == [
+                (result.index, result.response, type(result.error))
+                for result in results
+            ]
+            router.freeze()
+
+    def test_handle_events_async_routes(self, recwarn):
+        message_router = OmnibotMessageRouter(help_as_default=False)
+        router = OmnibotRouter(message_router=message_router)
+
+        @message_router.route('echo <value>')
+        async def message_echo(event, value):
+            await asyncio.sleep(0)
+            return value
+
+        @message_router.route('slow <value>', timeout=5)
+        async def message_slow(event, value):
+            await asyncio.sleep(0)
+            return value
+
+        @message_router.route('fail')
+        async def message_fail(event):
+            raise ValueError('failed')
+
+        results = router.handle_events([
+            {
+                'omnibot_payload_type': 'message',
+                'args': args,
+                'match_type': 'command'
+            }
+            for args in ('echo a', 'slow b', 'fail')
+        ], max_workers=2)
+        assert [result.response for result in results] == ['a', 'b', None]
+        assert isinstance(results[2].error, ValueError)
+        assert not [
+            warning for warning in recwarn
+            if 'never awaited' in str(warning.message)
+        ]
+
+    def test_handle_events_hooks(self):
+        message_router = OmnibotMessageRouter(help_as_default=False)
+        router = OmnibotRouter(message_router=message_router)
+        calls = []
+
+        @router.before
+        def before(event):
+            calls.append(('before', event['args']))
+
+        @router.after
+        def after(event, response):
+            calls.append(('after', response))
+            return response
+
+        @message_router.route('echo <value>')
+        def message_echo(event, value):
+            return value
+
+        @message_router.route('async echo <value>')
+        async def async_message_echo(event, value):
+            return value
+
+        results = router.handle_events([
+            {
+                'omnibot_payload_type': 'message',
+                'args': args,
+                'match_type': 'command'
+            }
+            for args in ('echo a', 'async echo b', 'unknown')
+        ], max_workers=1)
+        assert [result.response for result in results] == ['a', 'b', None]
+        assert isinstance(results[2].error, NoMatchedRouteError)
+        assert calls == [
+            ('before', 'echo a'),
+            ('after', 'a'),
+            ('before', 'async echo b'),
+            ('after', 'b'),
+            ('before', 'unknown'),
+        ]
+
+    def test_handle_raw(self):
+        message_router = OmnibotMessageRouter()
+        router = OmnibotRouter(message_router=message_router)
+
+        @message_router.route('ping')
+        def message_ping(event):
+            return {'actions': [{'kwargs': {'text': event['args']}}]}
+
+        @message_router.route('async ping')
+        async def async_message_ping(event):
+            return {'actions': []}
+
+        body = (
+            b'{"omnibot_payload_type":"message","args":"ping",'
+            b'"match_type":"command"}'
+        )
+        assert router.handle_raw(body) == (
+            b'{"actions":[{"kwargs":{"text":"ping"}}]}'
+        )
+        body = body.replace(b'"ping"', b'"async ping"')
+        assert asyncio.run(router.handle_raw_async(body)) == (
+            b'{"actions":[]}'
+        )